@@ -0,0 +1,350 @@
+"""bench_chat_load.py: synthetic chat traffic through the real bot handlers
+
+Drives the handlers in scripts/prosper_slackbot.py and
+scripts/prosper_discordbot.py with fake message objects while upstream calls
+are answered by an in-process stub, then reports throughput and latency
+percentiles per command.  Run from the repo root:
+
+    python benchmarks/bench_chat_load.py --bot=slack --messages=2000 --rate=200 \\
+        --mix=stock:70,news:20,coin:10 --zipf=1.2 --latency-ms=50
+
+Latency is open-loop: measured from when a message was *scheduled* to arrive,
+so queueing behind slow handlers shows up in the numbers.
+
+"""
+from os import path
+from collections import defaultdict
+import asyncio
+import bisect
+import concurrent.futures
+import itertools
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+from plumbum import cli
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(HERE, '..'))
+sys.path[:0] = [ROOT, path.join(ROOT, 'scripts')]
+
+import prosper_bots.caching as caching
+import prosper_bots.connections as connections
+import prosper_bots.metrics as metrics
+import prosper_bots.upstream as upstream
+
+PROGNAME = 'bench_chat_load'
+STOCK_UNIVERSE = [
+    'MU', 'INTC', 'AMD', 'NVDA', 'AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOG', 'FB',
+    'NFLX', 'BABA', 'SNAP', 'TWTR', 'F', 'GE', 'T', 'BAC', 'XOM', 'WMT',
+]
+COIN_UNIVERSE = ['BTC', 'ETH', 'LTC', 'XRP', 'BCH', 'DOGE', 'XMR', 'DASH']
+COIN_CHANNEL = 'C0COINS'
+STOCK_CHANNEL = 'C0STOCKS'
+
+class StubSource(object):
+    """answers datareader calls with synthetic frames after a fixed delay
+
+    Args:
+        latency (float): seconds each upstream call takes
+        seed (int, optional): random seed for price moves
+
+    """
+    def __init__(self, latency=0.0, seed=1234):
+        import pandas as pd
+        self.pd = pd
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.calls = defaultdict(int)
+
+    def __str__(self):
+        return 'StubSource(latency={}s)'.format(self.latency)
+
+    def _price(self, ticker):
+        return round(10 + (zlib.crc32(ticker.encode()) % 5000) / 10.0, 2)
+
+    def get_quote_rh(self, ticker_list, logger=None, **kwargs):
+        self.calls['get_quote_rh'] += 1
+        time.sleep(self.latency)
+        return self.pd.DataFrame([{
+            'symbol': ticker,
+            'name': '{} Holdings Inc. Common Stock'.format(ticker),
+            'pe_ratio': 20.0,
+            'change_pct': '{:+.2%}'.format(self.rng.uniform(-0.05, 0.05)),
+            'current_price': self._price(ticker),
+            'updated_at': '2018-01-19T21:00:00Z',
+        } for ticker in ticker_list])
+
+    def get_quote_cc(self, coin_list, currency='USD', to_yahoo=False, logger=None, **kwargs):
+        self.calls['get_quote_cc'] += 1
+        time.sleep(self.latency)
+        return self.pd.DataFrame([{
+            'symbol': coin,
+            'name': coin.title() + 'coin',
+            'last': self._price(coin) * 10,
+            'change_pct': '{:+.2%}'.format(self.rng.uniform(-0.1, 0.1)),
+        } for coin in coin_list]).set_index('symbol', drop=False)
+
+    def company_news_rh(self, ticker, logger=None, **kwargs):
+        self.calls['company_news_rh'] += 1
+        time.sleep(self.latency)
+        titles = ['{} beats estimates'.format(ticker), '{} misses badly'.format(ticker),
+                  '{} announces dividend'.format(ticker), '{} faces lawsuit'.format(ticker)]
+        return self.pd.DataFrame([{
+            'title': title,
+            'url': 'https://news.example.com/{}/{}'.format(ticker, index),
+            'published_at': self.pd.Timestamp('2018-01-19'),
+        } for index, title in enumerate(titles)])
+
+
+class FakeSlackClient(object):
+    """the slice of ``slackbot.slackclient.SlackClient`` handlers read"""
+    channels = {STOCK_CHANNEL: {'name': 'stocks'}, COIN_CHANNEL: {'name': 'coins'}}
+    users = {'U0BENCH': {'name': 'benchuser'}}
+    login_data = {'team': {'name': 'bench', 'id': 'T0BENCH'}}
+
+class FakeSlackMessage(object):
+    """``slackbot.dispatcher.Message`` stand-in that collects replies"""
+    client = FakeSlackClient()
+
+    def __init__(self, channel, text):
+        self._client = self.client
+        self._body = {'channel': channel, 'user': 'U0BENCH', 'text': text, 'team': 'T0BENCH'}
+        self.replies = []
+
+    def send(self, text):
+        self.replies.append(text)
+
+class FakeDiscordBot(object):
+    """``discord.ext.commands.Bot`` stand-in that collects replies"""
+    shard_id = None
+    servers = []
+
+    def __init__(self):
+        self.replies = []
+
+    async def say(self, text):
+        self.replies.append(text)
+
+class FakeDiscordContext(object):
+    """``discord.ext.commands.Context`` stand-in"""
+    class _Named(object):
+        def __init__(self, name):
+            self.name = name
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.message = type('Message', (object,), {
+            'author': self._Named('benchuser'),
+            'server': self._Named('bench'),
+            'channel': self._Named('stocks'),
+        })()
+
+
+def weighted_picker(items, weights, rng):
+    """pick from ``items`` proportionally to ``weights``
+
+    Args:
+        items (:obj:`list`): things to pick from
+        weights (:obj:`list`): relative weight per item
+        rng (:obj:`random.Random`): seeded generator
+
+    Returns:
+        (:obj:`callable`): ``pick() -> item``
+
+    """
+    cumulative = list(itertools.accumulate(weights))
+    return lambda: items[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+
+def zipf_picker(universe, exponent, rng):
+    """pick tickers with a zipf-like popularity skew (most popular first)"""
+    weights = [1.0 / (rank ** exponent) for rank in range(1, len(universe) + 1)]
+    return weighted_picker(universe, weights, rng)
+
+def parse_mix(mix_str):
+    """``stock:70,news:20`` -> [('stock', 70.0), ('news', 20.0)]"""
+    mix = []
+    for part in mix_str.split(','):
+        name, _, weight = part.partition(':')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+def build_traffic(count, mix, zipf, seed):
+    """generate the (command, ticker) stream
+
+    Args:
+        count (int): messages to generate
+        mix (:obj:`list`): output of ``parse_mix``
+        zipf (float): ticker popularity skew
+        seed (int): random seed
+
+    Returns:
+        (:obj:`list`): (command, ticker) pairs
+
+    """
+    rng = random.Random(seed)
+    pick_stock = zipf_picker(STOCK_UNIVERSE, zipf, rng)
+    pick_coin = zipf_picker(COIN_UNIVERSE, zipf, rng)
+    pick_command = weighted_picker(
+        [name for name, _ in mix], [weight for _, weight in mix], rng
+    )
+
+    traffic = []
+    for _ in range(count):
+        command = pick_command()
+        ticker = pick_coin() if command == 'coin' else pick_stock()
+        traffic.append((command, ticker))
+    return traffic
+
+def percentile(samples, pct):
+    """nearest-rank percentile of an already-sorted list"""
+    if not samples:
+        return float('nan')
+    rank = max(int(round(pct / 100.0 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def slack_runner(bot_module):
+    """map command names to calls into the slack handlers"""
+    def run(command, ticker):
+        if command == 'stock':
+            message = FakeSlackMessage(STOCK_CHANNEL, '$' + ticker)
+            bot_module.generic_stock_info(message, ticker)
+        elif command == 'coin':
+            message = FakeSlackMessage(COIN_CHANNEL, '$' + ticker)
+            bot_module.generic_stock_info(message, ticker)
+        elif command == 'news':
+            message = FakeSlackMessage(STOCK_CHANNEL, 'news ' + ticker)
+            bot_module.stock_news(message, ticker)
+        else:
+            message = FakeSlackMessage(STOCK_CHANNEL, 'version')
+            bot_module.which_prosperbot(message)
+        return message.replies
+    return run
+
+def discord_runner(bot_module, loop):
+    """map command names to calls into the discord command callbacks"""
+    def run(command, ticker):
+        context = FakeDiscordContext(FakeDiscordBot())
+        if command == 'coin':
+            coro = bot_module.coin.callback(context, ticker)
+        elif command in ('stock', 'news'):
+            coro = bot_module.price.callback(context, ticker)
+        else:
+            coro = bot_module.version.callback(context)
+        loop.run_until_complete(coro)
+        return context.bot.replies
+    return run
+
+
+class BenchChatLoad(cli.Application):
+    """synthetic chat load against the real handlers"""
+    PROGNAME = PROGNAME
+
+    bot = cli.SwitchAttr('--bot', cli.Set('slack', 'discord', 'both'), default='both')
+    messages = cli.SwitchAttr('--messages', int, default=1000, help='messages per bot')
+    rate = cli.SwitchAttr('--rate', float, default=0.0, help='messages/sec (0 = flat out)')
+    mix = cli.SwitchAttr('--mix', str, default='stock:70,news:20,coin:10',
+                         help='command weights: stock,news,coin,version')
+    zipf = cli.SwitchAttr('--zipf', float, default=1.1, help='ticker popularity skew')
+    latency_ms = cli.SwitchAttr('--latency-ms', float, default=50.0, help='stub upstream latency')
+    threads = cli.SwitchAttr('--threads', int, default=10,
+                             help='slack handler threads (slackbot WorkerPool default)')
+    seed = cli.SwitchAttr('--seed', int, default=1234)
+    recording = cli.SwitchAttr(
+        '--recording', cli.ExistingFile, default=None,
+        help='replay this upstream recording instead of the synthetic stub'
+    )
+    error_rate = cli.SwitchAttr('--error-rate', float, default=0.0,
+                                help='recorded upstream: odds a call fails')
+
+    def drive(self, name, run_func, traffic, threads):
+        """replay ``traffic`` through ``run_func`` and print the report"""
+        latencies = defaultdict(list)
+        outcomes = defaultdict(lambda: defaultdict(int))
+        interval = 1.0 / self.rate if self.rate else 0.0
+
+        def one(scheduled, command, ticker):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                replies = run_func(command, ticker)
+                outcome = 'replied' if replies else 'silent'
+            except Exception:
+                outcome = 'error'
+            latencies[command].append(time.perf_counter() - scheduled)
+            outcomes[command][outcome] += 1
+
+        start = time.perf_counter()
+        if threads > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+                for index, (command, ticker) in enumerate(traffic):
+                    pool.submit(one, start + index * interval, command, ticker)
+        else:
+            for index, (command, ticker) in enumerate(traffic):
+                one(start + index * interval, command, ticker)
+        elapsed = time.perf_counter() - start
+
+        print('\n== {}: {} msgs in {:.2f}s -> {:.1f} msg/s'.format(
+            name, len(traffic), elapsed, len(traffic) / elapsed))
+        print('{:<8} {:>6} {:>8} {:>8} {:>8} {:>8}  {}'.format(
+            'command', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'outcomes'))
+        for command in sorted(latencies):
+            samples = sorted(latencies[command])
+            print('{:<8} {:>6} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}  {}'.format(
+                command, len(samples),
+                percentile(samples, 50) * 1000, percentile(samples, 95) * 1000,
+                percentile(samples, 99) * 1000, samples[-1] * 1000,
+                ' '.join('{}={}'.format(key, value) for key, value in sorted(outcomes[command].items()))
+            ))
+
+    def main(self):
+        """run the benchmark"""
+        global STOCK_UNIVERSE, COIN_UNIVERSE
+        if self.recording:
+            source = upstream.RecordedSource(
+                self.recording,
+                latency=self.latency_ms / 1000.0,
+                error_rate=self.error_rate,
+                seed=self.seed
+            )
+            STOCK_UNIVERSE = sorted(source.recording['get_quote_rh'])
+            COIN_UNIVERSE = sorted(source.recording['get_quote_cc']['USD'])
+        else:
+            source = StubSource(latency=self.latency_ms / 1000.0, seed=self.seed)
+        upstream.use_source(source)
+        traffic = build_traffic(self.messages, parse_mix(self.mix), self.zipf, self.seed)
+        cache_path = tempfile.mkdtemp(prefix='bench_chat_load')
+
+        try:
+            if self.bot in ('slack', 'both'):
+                import prosper_slackbot
+                prosper_slackbot.CONN = connections.build_connection('bench', source_path=cache_path)
+                connections.set_channel_mode(COIN_CHANNEL, 'coins', 'benchuser', prosper_slackbot.CONN)
+                caching.QUOTES.clear()
+                self.drive('slack', slack_runner(prosper_slackbot), traffic, self.threads)
+
+            if self.bot in ('discord', 'both'):
+                try:
+                    import prosper_discordbot
+                except ImportError as err:
+                    print('\n== discord: SKIPPED -- {}'.format(err))
+                else:
+                    prosper_discordbot.CONN = connections.build_connection(
+                        'bench_discord', source_path=cache_path)
+                    caching.QUOTES.clear()
+                    loop = asyncio.new_event_loop()
+                    # one event loop runs every discord handler, so no thread pool here
+                    self.drive('discord', discord_runner(prosper_discordbot, loop), traffic, 1)
+        finally:
+            shutil.rmtree(cache_path, ignore_errors=True)
+
+        print('\nupstream calls: {}'.format(dict(source.calls)))
+        print('\nper-stage breakdown:\n' + metrics.stats_report())
+
+if __name__ == '__main__':
+    BenchChatLoad.run()
@@ -0,0 +1,156 @@
+"""bench_memory.py: per-request allocation of quote/article handling, traced
+
+Each request builds a datareader-shaped frame (every layout pays for that),
+turns it into the object we cache and drops the frame.  ``tracemalloc``
+reports peak bytes allocated per request, bytes still held per cached
+entry once the frames are gone, and time per request.  "dict"/"frame" rows
+are how the bot used to keep quotes and feeds, "records" is
+``prosper_bots.records``.
+Run from the repo root:
+
+    python benchmarks/bench_memory.py --requests=2000
+
+"""
+from os import path
+import gc
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+
+from plumbum import cli
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(HERE, '..'))
+sys.path.insert(0, ROOT)
+
+import prosper_bots.records as records
+
+PROGNAME = 'bench_memory'
+ARTICLE_FIELDS = ['title', 'url', 'source', 'published_at', 'compound']
+
+def stock_frame(pd, ticker, index):
+    """``prosper.datareader.stocks.get_quote_rh()`` result for one ticker"""
+    return pd.DataFrame([{
+        'symbol': ticker,
+        'name': '{} Holdings Inc. Common Stock'.format(ticker),
+        'pe_ratio': 20.0 + index % 7,
+        'change_pct': '{:+.2%}'.format((index % 11 - 5) / 100.0),
+        'current_price': 10.0 + index % 500,
+        'updated_at': '2018-01-19T21:00:00Z',
+    }])
+
+def coin_frame(pd, ticker, index):
+    """``prosper.datareader.coins.get_quote_cc(to_yahoo=True)`` result for one coin"""
+    return pd.DataFrame([{
+        'symbol': ticker,
+        'name': ticker.title() + 'coin',
+        'more_info': '{} ({})'.format(ticker.title() + 'coin', ticker),
+        'last': 100.0 + index,
+        'change_pct': '{:+.2%}'.format((index % 11 - 5) / 100.0),
+        'open': 99.0 + index,
+        'high': 105.0 + index,
+        'low': 95.0 + index,
+        'volume': 0.5,
+        'market_capitalization': 1e9 + index,
+        'shares_outstanding': 21e6,
+        'float_shares': 16e6,
+        'stock_exchange': 'CCCAGG',
+        'timestamp': 1516395600 + index,
+        'datetime': pd.Timestamp(1516395600 + index, unit='s'),
+    }]).set_index('symbol', drop=False)
+
+def news_frame(pd, ticker, index, articles=20):
+    """vader-scored ``prosper.datareader.news.company_news_rh()`` feed"""
+    return pd.DataFrame([{
+        'title': '{} headline number {}'.format(ticker, article),
+        'url': 'https://news.example.com/{}/{}'.format(ticker, article),
+        'source': 'Example Wire',
+        'summary': 'Summary of story {} about {}. '.format(article, ticker) * 4,
+        'published_at': pd.Timestamp('2018-01-19') - pd.Timedelta(hours=article),
+        'neg': 0.1, 'neu': 0.8, 'pos': 0.1,
+        'compound': ((index + article) % 21 - 10) / 10.0,
+    } for article in range(articles)])
+
+LAYOUTS = [  # kind, layout, frame builder, frame -> cached object
+    ('stocks', 'dict', stock_frame, lambda frame: frame.loc[0].to_dict()),
+    ('stocks', 'records', stock_frame, lambda frame: records.StockQuote.from_frame(frame)[0]),
+    ('coins', 'dict', coin_frame, lambda frame: frame.iloc[0].to_dict()),
+    ('coins', 'records', coin_frame, lambda frame: records.CoinQuote.from_frame(frame)[0]),
+    ('news', 'frame', news_frame, lambda frame: frame),
+    ('news', 'dict', news_frame, lambda frame: frame[ARTICLE_FIELDS].to_dict('records')),
+    ('news', 'records', news_frame, records.Article.from_frame),
+]
+
+def trace_requests(build, convert, requests):
+    """build, convert and cache one frame per ticker under ``tracemalloc``
+
+    Args:
+        build (:obj:`callable`): ``build(pd, ticker, index)`` datareader frame
+        convert (:obj:`callable`): frame -> cached object
+        requests (int): distinct tickers
+
+    Returns:
+        (float): median peak bytes allocated per request
+        (float): bytes retained per cached entry
+
+    """
+    import pandas as pd
+
+    cache = {}
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peaks = []
+    for index in range(requests):
+        ticker = 'T{:05d}'.format(index)
+        if hasattr(tracemalloc, 'reset_peak'):  # python 3.9+
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        cache[ticker] = convert(build(pd, ticker, index))
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return statistics.median(peaks), retained / requests
+
+def time_requests(build, convert, requests):
+    """(float): seconds per request, untraced"""
+    import pandas as pd
+
+    cache = {}
+    start = time.perf_counter()
+    for index in range(requests):
+        ticker = 'T{:05d}'.format(index)
+        cache[ticker] = convert(build(pd, ticker, index))
+    return (time.perf_counter() - start) / requests
+
+
+class BenchMemory(cli.Application):
+    """trace per-request allocation of cached quotes and feeds"""
+    PROGNAME = PROGNAME
+
+    requests = cli.SwitchAttr(
+        '--requests',
+        int,
+        default=2000,
+        help='distinct tickers converted and cached per layout'
+    )
+
+    def main(self):
+        """run the benchmark"""
+        import pandas as pd
+
+        print('{:<8} {:<8} {:>12} {:>14} {:>12} {:>10}'.format(
+            'kind', 'layout', 'peak_kb/req', 'retained_b/req', 'pickle_b', 'us/req'))
+        for kind, layout, build, convert in LAYOUTS:
+            peak, retained = trace_requests(build, convert, self.requests)
+            elapsed = time_requests(build, convert, self.requests)
+            pickled = len(pickle.dumps(
+                convert(build(pd, 'T00000', 0)), protocol=pickle.HIGHEST_PROTOCOL))
+            print('{:<8} {:<8} {:>12.1f} {:>14.0f} {:>12} {:>10.1f}'.format(
+                kind, layout, peak / 1024, retained, pickled, elapsed * 1e6))
+
+if __name__ == '__main__':
+    BenchMemory.run()
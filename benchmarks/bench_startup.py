@@ -0,0 +1,111 @@
+"""bench_startup.py: measure cold-import cost of the bot entry points
+
+Each target is imported in a fresh interpreter so module caches don't hide
+regressions.  Run from the repo root:
+
+    python benchmarks/bench_startup.py --runs=5 --budget=1.5
+
+"""
+from os import path
+import statistics
+import subprocess
+import sys
+
+from plumbum import cli
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(HERE, '..'))
+SCRIPTS = path.join(ROOT, 'scripts')
+PROGNAME = 'bench_startup'
+
+TARGETS = [
+    'prosper_bots.commands',
+    'prosper_slackbot',
+    'prosper_discordbot',
+]
+HEAVY_MODULES = ['pandas', 'nltk', 'prosper.datareader']
+
+PROBE = '''
+import sys, time
+sys.path[:0] = [{root!r}, {scripts!r}]
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print('%f %s' % (elapsed, ','.join(heavy)))
+'''
+
+def time_import(target, python=sys.executable):
+    """import ``target`` in a fresh interpreter
+
+    Args:
+        target (str): module name to import
+        python (str, optional): interpreter to use
+
+    Returns:
+        (float): seconds spent importing
+        (:obj:`list`): heavy modules that got pulled in by the import
+
+    Raises:
+        RuntimeError: import failed in child process
+
+    """
+    probe = PROBE.format(root=ROOT, scripts=SCRIPTS, target=target, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [python, '-c', probe],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=ROOT,
+        universal_newlines=True
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    elapsed, _, heavy = proc.stdout.strip().partition(' ')
+    return float(elapsed), [name for name in heavy.split(',') if name]
+
+
+class BenchStartup(cli.Application):
+    """time cold imports of bot entry points"""
+    PROGNAME = PROGNAME
+
+    runs = cli.SwitchAttr(
+        '--runs',
+        int,
+        default=5,
+        help='fresh interpreters per target'
+    )
+    budget = cli.SwitchAttr(
+        '--budget',
+        float,
+        default=0.0,
+        help='fail if any median import exceeds this many seconds (0 = report only)'
+    )
+
+    def main(self):
+        """run the benchmark"""
+        failed = False
+        print('{:<24} {:>10} {:>10}  {}'.format('target', 'median_s', 'max_s', 'heavy imports'))
+        for target in TARGETS:
+            try:
+                samples = []
+                for _ in range(self.runs):
+                    elapsed, heavy = time_import(target)
+                    samples.append(elapsed)
+            except RuntimeError as err:
+                print('{:<24} SKIPPED -- {}'.format(target, err))
+                continue
+
+            median = statistics.median(samples)
+            print('{:<24} {:>10.3f} {:>10.3f}  {}'.format(
+                target, median, max(samples), ','.join(heavy) or '-'
+            ))
+            if self.budget and median > self.budget:
+                failed = True
+
+        if failed:
+            print('startup budget of {}s exceeded'.format(self.budget))
+            return 1
+
+if __name__ == '__main__':
+    BenchStartup.run()
@@ -0,0 +1,206 @@
+"""bench_storage.py: channel-mode/cooldown storage at production cardinalities
+
+Seeds each storage backend with ``--channels`` channel settings and
+``--cooldowns`` cooldown timers, then times the real
+``prosper_bots.connections`` calls against it.  Run from the repo root:
+
+    python benchmarks/bench_storage.py --channels=10000 --cooldowns=100000 --ops=50
+
+tinymongo re-reads (and on writes re-serializes) the whole JSON file on every
+call, so keep ``--ops`` modest for it at full cardinality.
+
+"""
+from os import path
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from plumbum import cli
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(HERE, '..'))
+sys.path.insert(0, ROOT)
+
+import prosper_bots.connections as connections
+
+PROGNAME = 'bench_storage'
+LOGGER = logging.getLogger(PROGNAME)
+LOGGER.addHandler(logging.NullHandler())
+LOGGER.propagate = False
+
+COOLDOWN_TIME = 30
+MODES = [mode.value for mode in connections.Modes]
+
+def seed_collection(db_conn, collection_name, docs):
+    """bulk-load documents without paying per-document write cost
+
+    Args:
+        db_conn (object): ``connections.build_connection()`` handle
+        collection_name (str): collection to fill
+        docs (:obj:`list`): documents to store
+
+    """
+    collection = db_conn[collection_name]
+    if isinstance(db_conn, connections.SQLiteDatabase):
+        collection.insert_many(docs)
+        return
+
+    # tinymongo.insert_many() rewrites the file once per document
+    collection.build_table()
+    for doc in docs:
+        doc['_id'] = uuid.uuid4().hex
+    collection.table.insert_multiple(docs)
+
+def seed_backend(db_conn, channels, cooldowns, seed=None):
+    """fill a backend with realistic channel settings and cooldown timers
+
+    Args:
+        db_conn (object): ``connections.build_connection()`` handle
+        channels (int): channel settings to store
+        cooldowns (int): cooldown timers to store (about half still live)
+        seed (int, optional): random seed
+
+    Returns:
+        (:obj:`list`): channel names
+        (:obj:`list`): cooldown element names
+
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    channel_names = ['C{:08d}'.format(index) for index in range(channels)]
+    element_names = ['STOCKS-{:06d}'.format(index) for index in range(cooldowns)]
+
+    seed_collection(db_conn, connections.CHANNEL_COLLECTION, [
+        {
+            'channel_name': channel_name,
+            'channel_mode': rng.choice(MODES),
+            'channel_set_time': '2018-01-01T00:00:00',
+            'user_name': 'benchuser',
+        } for channel_name in channel_names
+    ])
+    seed_collection(db_conn, connections.COOLDOWN_COLLECTION, [
+        {
+            'element_name': element_name,
+            'time': now - rng.uniform(0, COOLDOWN_TIME * 2),
+        } for element_name in element_names
+    ])
+    return channel_names, element_names
+
+def disk_size(folder):
+    """bytes used by every file in ``folder``"""
+    return sum(
+        path.getsize(path.join(folder, name)) for name in os.listdir(folder)
+        if path.isfile(path.join(folder, name))
+    )
+
+def percentile(samples, pct):
+    """nearest-rank percentile of an already-sorted list"""
+    if not samples:
+        return float('nan')
+    rank = max(int(round(pct / 100.0 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+def time_calls(func, args_list):
+    """time ``func(*args)`` for every entry in ``args_list``
+
+    Returns:
+        (:obj:`list`): sorted per-call seconds
+
+    """
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+class BenchStorage(cli.Application):
+    """time connections.py storage calls per backend"""
+    PROGNAME = PROGNAME
+
+    channels = cli.SwitchAttr(
+        '--channels',
+        int,
+        default=10000,
+        help='channel settings to seed'
+    )
+    cooldowns = cli.SwitchAttr(
+        '--cooldowns',
+        int,
+        default=100000,
+        help='cooldown timers to seed'
+    )
+    ops = cli.SwitchAttr(
+        '--ops',
+        int,
+        default=50,
+        help='timed calls per operation'
+    )
+    backends = cli.SwitchAttr(
+        '--backends',
+        str,
+        default=','.join(backend.value for backend in connections.Backends),
+        help='comma separated backends to compare'
+    )
+    seed = cli.SwitchAttr(
+        '--seed',
+        int,
+        default=1234,
+        help='random seed'
+    )
+
+    def bench_backend(self, backend, folder):
+        """seed one backend and time each operation"""
+        start = time.perf_counter()
+        db_conn = connections.build_connection(
+            'bench', source_path=folder, backend=backend, logger=LOGGER)
+        channel_names, element_names = seed_backend(
+            db_conn, self.channels, self.cooldowns, seed=self.seed)
+        seed_time = time.perf_counter() - start
+
+        rng = random.Random(self.seed)
+        results = [
+            ('check_channel_mode', time_calls(
+                lambda name: connections.check_channel_mode(name, db_conn, logger=LOGGER),
+                [(rng.choice(channel_names),) for _ in range(self.ops)]
+            )),
+            ('set_channel_mode', time_calls(
+                lambda name, mode: connections.set_channel_mode(
+                    name, mode, 'benchuser', db_conn, logger=LOGGER),
+                [(rng.choice(channel_names), rng.choice(MODES)) for _ in range(self.ops)]
+            )),
+            ('cooldown', time_calls(
+                lambda name: connections.cooldown(
+                    name, db_conn, cooldown_time=COOLDOWN_TIME, logger=LOGGER),
+                [(rng.choice(element_names),) for _ in range(self.ops)]
+            )),
+        ]
+
+        print('\n== {}: seeded {} channels + {} cooldowns in {:.1f}s, {:.1f} MB on disk'.format(
+            backend, self.channels, self.cooldowns, seed_time, disk_size(folder) / 1e6))
+        print('{:<20} {:>10} {:>9} {:>9} {:>9}'.format(
+            'operation', 'ops/s', 'p50_ms', 'p99_ms', 'max_ms'))
+        for name, samples in results:
+            print('{:<20} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+                name, len(samples) / sum(samples),
+                percentile(samples, 50) * 1000, percentile(samples, 99) * 1000,
+                samples[-1] * 1000
+            ))
+
+    def main(self):
+        """run the benchmark"""
+        for backend in self.backends.split(','):
+            folder = tempfile.mkdtemp(prefix='bench_storage')
+            try:
+                self.bench_backend(backend.strip(), folder)
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    BenchStorage.run()
@@ -0,0 +1,369 @@
+"""alerts.py: "tell me when $MU crosses 50" price alerts
+
+Notes:
+    each ticker keeps two sorted threshold lists.  ``above`` alerts fire once
+    price >= threshold, so everything left of ``bisect_right(above, price)``
+    fires; ``below`` alerts fire once price <= threshold, so everything from
+    ``bisect_left(below, price)`` on fires.  A polling tick is one batched quote
+    call per kind plus two bisects per ticker, however many alerts exist
+
+"""
+from os import path
+from datetime import datetime
+import bisect
+import math
+import threading
+import uuid
+
+from . import connections
+from . import metrics
+from . import tickstore
+from . import upstream
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+DIRECTIONS = ('above', 'below')
+BATCH_SIZE = 50  # tickers per upstream quote call
+PRICE_FIELDS = {'stocks': 'current_price', 'coins': 'last'}
+
+def new_alert(
+        kind,
+        ticker,
+        direction,
+        threshold,
+        channel,
+        user_name,
+        **extra
+):
+    """build an alert document
+
+    Args:
+        kind (str): ``stocks`` or ``coins``
+        ticker (str): ticker to watch
+        direction (str): ``above`` or ``below``
+        threshold (float): price to cross
+        channel (str): where to announce it
+        user_name (str): who asked
+        extra (dict): platform routing (``team_id``, ``shard_id``, ``user``...)
+
+    Returns:
+        (dict): alert document
+
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError('direction must be one of {}'.format(DIRECTIONS))
+    alert = {
+        'alert_id': uuid.uuid4().hex[:8],
+        'kind': kind,
+        'ticker': ticker.upper(),
+        'direction': direction,
+        'threshold': float(threshold),
+        'channel': channel,
+        'user_name': user_name,
+        'created': datetime.utcnow().isoformat(),
+    }
+    alert.update(extra)
+    return alert
+
+
+class _Thresholds(object):
+    """sorted ``(threshold, alert_id)`` pairs for one ticker and direction"""
+    def __init__(self):
+        self.values = []
+        self.alert_ids = []
+
+    def add(self, threshold, alert_id):
+        index = bisect.bisect_right(self.values, threshold)
+        self.values.insert(index, threshold)
+        self.alert_ids.insert(index, alert_id)
+
+    def remove(self, threshold, alert_id):
+        index = bisect.bisect_left(self.values, threshold)
+        while index < len(self.values) and self.values[index] == threshold:
+            if self.alert_ids[index] == alert_id:
+                del self.values[index]
+                del self.alert_ids[index]
+                return
+            index += 1
+
+    def pop_range(self, start, stop):
+        """remove and return alert ids in ``[start:stop]``"""
+        alert_ids = self.alert_ids[start:stop]
+        del self.values[start:stop]
+        del self.alert_ids[start:stop]
+        return alert_ids
+
+    def __len__(self):
+        return len(self.values)
+
+
+class AlertBook(object):
+    """every live alert, indexed for one-bisect-per-ticker evaluation"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.alerts = {}  # alert_id: alert
+        self._index = {}  # (kind, ticker): {direction: _Thresholds}
+
+    def add(self, alert):
+        """index an alert"""
+        with self._lock:
+            self.alerts[alert['alert_id']] = alert
+            by_direction = self._index.setdefault(
+                (alert['kind'], alert['ticker']),
+                {direction: _Thresholds() for direction in DIRECTIONS}
+            )
+            by_direction[alert['direction']].add(alert['threshold'], alert['alert_id'])
+
+    def remove(self, alert_id):
+        """drop an alert
+
+        Returns:
+            (dict): the alert, or None if unknown
+
+        """
+        with self._lock:
+            alert = self.alerts.pop(alert_id, None)
+            if alert is None:
+                return None
+            key = (alert['kind'], alert['ticker'])
+            by_direction = self._index[key]
+            by_direction[alert['direction']].remove(alert['threshold'], alert_id)
+            if not any(by_direction.values()):
+                del self._index[key]
+            return alert
+
+    def pop_triggered(self, kind, ticker, price):
+        """remove and return every alert ``price`` sets off
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            ticker (str): ticker quoted
+            price (float): current price
+
+        Returns:
+            (:obj:`list`): triggered alerts
+
+        """
+        if not math.isfinite(price):  # NaN compares false both ways and would fire everything
+            return []
+        key = (kind, ticker.upper())
+        with self._lock:
+            by_direction = self._index.get(key)
+            if by_direction is None:
+                return []
+            above, below = by_direction['above'], by_direction['below']
+            alert_ids = above.pop_range(0, bisect.bisect_right(above.values, price))
+            alert_ids += below.pop_range(bisect.bisect_left(below.values, price), len(below))
+            if not above and not below:
+                del self._index[key]
+            return [self.alerts.pop(alert_id) for alert_id in alert_ids]
+
+    def tickers(self):
+        """(:obj:`dict`): kind: tickers with live alerts"""
+        with self._lock:
+            by_kind = {}
+            for kind, ticker in self._index:
+                by_kind.setdefault(kind, []).append(ticker)
+            return by_kind
+
+    def for_channel(self, channel):
+        """(:obj:`list`): alerts announcing into ``channel``, oldest first"""
+        with self._lock:
+            alerts = [alert for alert in self.alerts.values() if alert['channel'] == channel]
+        return sorted(alerts, key=lambda alert: alert['created'])
+
+    def __len__(self):
+        return len(self.alerts)
+
+
+def _finite_price(price):
+    """(float): ``price``, or None when upstream sent null/NaN/inf"""
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    return price if math.isfinite(price) else None
+
+def fetch_prices(tickers_by_kind, currency='USD', logger=api_config.LOGGER):
+    """current prices for every watched ticker, batched per kind
+
+    Args:
+        tickers_by_kind (:obj:`dict`): kind: tickers (``AlertBook.tickers()``)
+        currency (str, optional): currency coins are quoted in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`dict`): ``(kind, ticker)``: price (tickers without a usable price left out)
+
+    """
+    fetchers = {
+        'stocks': lambda batch: upstream.get_quote_rh(batch, logger=logger),
+        'coins': lambda batch: upstream.get_quote_cc(
+            batch, currency=currency, to_yahoo=True, logger=logger),
+    }
+    prices = {}
+    for kind, tickers in tickers_by_kind.items():
+        tickers = sorted(tickers)
+        for start in range(0, len(tickers), BATCH_SIZE):
+            batch = tickers[start:start + BATCH_SIZE]
+            try:
+                quote_df = fetchers[kind](batch)
+            except Exception:
+                logger.warning('unable to fetch %s prices for %s', kind, batch, exc_info=True)
+                metrics.REGISTRY.error('alerts.fetch')
+                continue
+            for symbol, price in zip(quote_df['symbol'], quote_df[PRICE_FIELDS[kind]]):
+                price = _finite_price(price)
+                if price is None:  # e.g. robinhood's null extended-hours price
+                    logger.info('--no %s price for %s this tick', kind, symbol)
+                    metrics.REGISTRY.incr('alerts.no_price')
+                    continue
+                prices[(kind, str(symbol).upper())] = price
+                if kind == 'stocks' or currency == 'USD':
+                    tickstore.record(kind, symbol, price, logger=logger)
+    return prices
+
+
+class AlertEngine(object):
+    """keeps an ``AlertBook`` in sync with storage and fires alerts on a timer
+
+    Args:
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        notify (:obj:`callable`): ``notify(alert, price)`` announces a triggered alert
+        owns (:obj:`callable`, optional): ``owns(alert)``; False leaves it to another process
+        currency (str, optional): currency coin alerts are priced in
+        alert_collection (str, optional): collection alerts live in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            db_conn,
+            notify,
+            owns=None,
+            currency='USD',
+            alert_collection=connections.ALERT_COLLECTION,
+            logger=api_config.LOGGER
+    ):
+        self.db_conn = db_conn
+        self.notify = notify
+        self.owns = owns or (lambda alert: True)
+        self.currency = currency
+        self.alert_collection = alert_collection
+        self.logger = logger
+        self.book = AlertBook()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """index every stored alert this process owns
+
+        Returns:
+            (int): alerts loaded
+
+        """
+        loaded = 0
+        for alert in connections.find_alerts(
+                self.db_conn, alert_collection=self.alert_collection, logger=self.logger):
+            if self.owns(alert):
+                self.book.add(alert)
+                loaded += 1
+        self.logger.info('Loaded %s price alerts', loaded)
+        return loaded
+
+    def add(self, alert):
+        """persist and start watching an alert"""
+        connections.add_alert(
+            alert, self.db_conn, alert_collection=self.alert_collection, logger=self.logger)
+        self.book.add(alert)
+        metrics.REGISTRY.incr('alerts.created')
+
+    def cancel(self, alert_id, channel=None):
+        """stop watching an alert
+
+        Args:
+            alert_id (str): alert to cancel
+            channel (str, optional): only cancel if it belongs to this channel
+
+        Returns:
+            (dict): cancelled alert, or None if there was no such alert
+
+        """
+        alert = self.book.alerts.get(alert_id)
+        if alert is None or (channel is not None and alert['channel'] != channel):
+            return None
+        self.book.remove(alert_id)
+        connections.remove_alert(
+            alert_id, self.db_conn, alert_collection=self.alert_collection, logger=self.logger)
+        return alert
+
+    def poll_once(self):
+        """one tick: fetch watched prices, fire whatever crossed
+
+        Returns:
+            (int): alerts fired
+
+        """
+        tickers = self.book.tickers()
+        if not tickers:
+            return 0
+
+        with metrics.timer('alerts.poll'):
+            prices = fetch_prices(tickers, currency=self.currency, logger=self.logger)
+            fired = 0
+            for (kind, ticker), price in prices.items():
+                for alert in self.book.pop_triggered(kind, ticker, price):
+                    try:
+                        self.notify(alert, price)
+                    except Exception:
+                        self.logger.error('unable to announce alert %s', alert, exc_info=True)
+                        metrics.REGISTRY.error('alerts.notify')
+                        self.book.add(alert)  # still stored; try again next tick
+                        continue
+                    connections.remove_alert(
+                        alert['alert_id'], self.db_conn,
+                        alert_collection=self.alert_collection, logger=self.logger
+                    )
+                    fired += 1
+
+        if fired:
+            self.logger.info('--fired %s price alerts', fired)
+            metrics.REGISTRY.incr('alerts.fired', fired)
+        return fired
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.poll_once()
+            except Exception:  # pragma: no cover
+                self.logger.error('alert poll failed', exc_info=True)
+
+    def start(self, interval=30):
+        """load stored alerts and poll on a daemon thread every ``interval`` seconds"""
+        self.load()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name='price-alerts', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """stop the polling thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def describe(alert):
+    """one-line summary for listings: ``[id] MU above 50.00 (@user)``"""
+    return '[{}] {} {} {:,.2f} (@{})'.format(
+        alert['alert_id'], alert['ticker'], alert['direction'],
+        alert['threshold'], alert['user_name'])
+
+def announcement(alert, price):
+    """text posted when an alert fires"""
+    return '{} crossed {} {:,.2f} -- now {:,.2f} (alert {} for @{})'.format(
+        alert['ticker'], alert['direction'], alert['threshold'], price,
+        alert['alert_id'], alert['user_name'])
@@ -0,0 +1,116 @@
+"""articles.py: news articles stored and scored once, however many tickers mention them
+
+Notes:
+    ``caching.ARTICLES`` holds each article (sentiment included) under a hash
+    of its URL; ``caching.NEWS`` holds only the tuple of article ids in each
+    ticker's feed.  Overlapping feeds (one story under MU, INTC and AMD)
+    share one stored, scored copy, and a ticker's feed costs a few ids
+    instead of a DataFrame.  Both caches are shared across sharded workers
+    and snapshotted like the rest
+
+"""
+from os import path
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+from . import caching
+from . import market_hours
+from . import metrics
+from . import records
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+def article_id(url):
+    """stable id for an article, the same under every ticker that links it
+
+    Args:
+        url (str): article link
+
+    Returns:
+        (str): 16 hex characters
+
+    """
+    parts = urlsplit(str(url).strip())
+    canonical = urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+def _article_key(identifier):
+    return 'ARTICLE-{}'.format(identifier)
+
+def _feed_key(ticker):
+    return 'NEWS-{}'.format(ticker.upper())
+
+def feed(ticker):
+    """a ticker's cached articles
+
+    Args:
+        ticker (str): company ticker
+
+    Returns:
+        (:obj:`list`): ``records.Article``, or None when the feed (or any article in it) expired
+
+    """
+    identifiers = caching.NEWS.get(_feed_key(ticker))
+    if not isinstance(identifiers, tuple):  # missing, or a pre-article-store snapshot
+        return None
+    found = []
+    for identifier in identifiers:
+        article = caching.ARTICLES.get(_article_key(identifier))
+        if article is None:
+            return None
+        found.append(article)
+    return found
+
+def store_feed(
+        ticker,
+        news_df,
+        score,
+        ttl=None,
+        article_ttl=None,
+        logger=api_config.LOGGER
+):
+    """keep a freshly fetched feed, scoring only articles not already stored
+
+    Args:
+        ticker (str): company ticker
+        news_df (:obj:`pandas.DataFrame`): ``upstream.company_news_rh()`` feed
+        score (:obj:`callable`): ``score(news_df)`` adds a ``compound`` column
+        ttl (float, optional): seconds the ticker's feed lives (default ``STOCK_NEWS``)
+        article_ttl (float, optional): seconds each article lives (default ``ARTICLES``)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): ``records.Article``, in feed order
+
+    """
+    ttl = market_hours.STOCK_NEWS.ttl() if ttl is None else ttl
+    identifiers = [article_id(url) for url in news_df['url']]
+
+    articles = {}
+    unseen = []
+    for position, identifier in enumerate(identifiers):
+        if identifier in articles:
+            continue
+        article = caching.ARTICLES.get(_article_key(identifier))
+        if article is None:
+            unseen.append(position)
+            articles[identifier] = None
+        else:
+            articles[identifier] = article
+
+    if unseen:
+        scored_df = score(news_df.iloc[unseen].reset_index(drop=True))
+        for position, article in zip(unseen, records.Article.from_frame(scored_df)):
+            identifier = identifiers[position]
+            articles[identifier] = article
+            caching.ARTICLES.set(_article_key(identifier), article, ttl=article_ttl)
+    reused = len(identifiers) - len(unseen)
+    if reused:
+        metrics.REGISTRY.incr('news.articles_reused', reused)
+    logger.info('--%s articles for %s, %s newly scored', len(identifiers), ticker, len(unseen))
+
+    unique = tuple(sorted(set(identifiers), key=identifiers.index))
+    caching.NEWS.set(_feed_key(ticker), unique, ttl=ttl)
+    return [articles[identifier] for identifier in unique]
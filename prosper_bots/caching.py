@@ -0,0 +1,382 @@
+"""caching.py: in-memory expiring caches shared by bot commands"""
+from os import path
+import atexit
+import gzip
+import os
+import pickle
+import signal
+import threading
+import time
+
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+class TTLCache(object):
+    """key/value cache where every entry expires after a time-to-live
+
+    Notes:
+        entries are stored as ``(value, expire_time)`` pairs in ``store``.  Any
+        mapping works: a ``dict`` for one process, or a
+        ``multiprocessing.Manager().dict()`` to share across worker processes.
+        With ``max_entries``, a full cache drops expired entries and then the
+        ones closest to expiring, a tenth at a time so overflow isn't paid per set
+
+    Args:
+        default_ttl (float, optional): seconds an entry lives unless told otherwise
+        store (:obj:`dict`, optional): backing mapping
+        lock (:obj:`threading.RLock`, optional): lock guarding read-modify-write
+        clock (:obj:`callable`, optional): wall-clock source
+        max_entries (int, optional): size bound (None = unbounded)
+
+    """
+    def __init__(
+            self,
+            default_ttl=30,
+            store=None,
+            lock=None,
+            clock=time.time,
+            max_entries=None
+    ):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._store = {} if store is None else store
+        self._lock = threading.RLock() if lock is None else lock
+        self._clock = clock
+
+    def get(self, key, default=None):
+        """fetch a live value
+
+        Args:
+            key (str): cache key
+            default (any, optional): returned on miss/expired
+
+        Returns:
+            (any): cached value or ``default``
+
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            return default
+
+        value, expire_time = entry
+        if expire_time < self._clock():
+            self._store.pop(key, None)
+            return default
+
+        return value
+
+    def set(self, key, value, ttl=None):
+        """store a value
+
+        Args:
+            key (str): cache key
+            value (any): thing to cache (must pickle if store is shared)
+            ttl (float, optional): override ``default_ttl``
+
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        if self.max_entries and len(self._store) >= self.max_entries and key not in self._store:
+            self.evict()
+        self._store[key] = (value, self._clock() + ttl)
+
+    def evict(self):
+        """make room under ``max_entries``
+
+        Returns:
+            (int): number of entries dropped
+
+        """
+        with self._lock:
+            dropped = self.purge()
+            keep = int(self.max_entries * 0.9)
+            if len(self._store) > keep:
+                soonest = sorted(list(self._store.items()), key=lambda item: item[1][1])
+                for key, _ in soonest[:len(soonest) - keep]:
+                    self._store.pop(key, None)
+                    dropped += 1
+        return dropped
+
+    def touch(self, key, ttl=None):
+        """atomic check-and-set for cooldown-style gates
+
+        Args:
+            key (str): cache key
+            ttl (float, optional): override ``default_ttl``
+
+        Returns:
+            (bool): True if ``key`` was already live (caller should keep quiet)
+
+        """
+        with self._lock:
+            if self.get(key) is not None:
+                return True
+            self.set(key, True, ttl=ttl)
+            return False
+
+    def remaining(self, key):
+        """seconds until ``key`` expires
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            (float): time left to live (0 when missing/expired)
+
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            return 0.0
+        return max(entry[1] - self._clock(), 0.0)
+
+    def pop(self, key, default=None):
+        """remove and return an entry"""
+        entry = self._store.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def purge(self):
+        """drop every expired entry
+
+        Returns:
+            (int): number of entries dropped
+
+        """
+        now = self._clock()
+        expired = [key for key, (_, expire_time) in list(self._store.items()) if expire_time < now]
+        for key in expired:
+            self._store.pop(key, None)
+        return len(expired)
+
+    def dump(self):
+        """live entries, for ``save_snapshot()``
+
+        Returns:
+            (:obj:`dict`): key: ``(value, expire_time)``
+
+        """
+        now = self._clock()
+        return {
+            key: entry for key, entry in list(self._store.items()) if entry[1] >= now
+        }
+
+    def load(self, entries):
+        """adopt entries from ``dump()``, skipping any that have since expired
+
+        Args:
+            entries (:obj:`dict`): key: ``(value, expire_time)``
+
+        Returns:
+            (int): entries loaded
+
+        """
+        now = self._clock()
+        live = {key: entry for key, entry in entries.items() if entry[1] >= now}
+        self._store.update(live)
+        return len(live)
+
+    def clear(self):
+        """drop everything"""
+        self._store.clear()
+
+    def share(self, manager):
+        """move cache contents into a ``multiprocessing.Manager`` for worker processes
+
+        Args:
+            manager (:obj:`multiprocessing.managers.SyncManager`): running manager
+
+        """
+        shared_store = manager.dict(dict(self._store.items()))
+        self._store = shared_store
+        self._lock = manager.RLock()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._store)
+
+
+SNAPSHOT_DIR = path.join(HERE, 'cache')
+SNAPSHOT_PATH = path.join(SNAPSHOT_DIR, 'caches.pickle.gz')
+SNAPSHOT_CACHES = ('QUOTES', 'NEWS', 'ARTICLES', 'BAD_SYMBOLS')
+
+QUOTES = TTLCache(default_ttl=15)
+NEWS = TTLCache(default_ttl=300)  # ticker: article ids (see ``articles``)
+ARTICLES = TTLCache(default_ttl=6 * 3600, max_entries=5000)
+BAD_SYMBOLS = TTLCache(default_ttl=3600)
+COOLDOWNS = TTLCache(default_ttl=30)
+
+def share_caches(manager, logger=api_config.LOGGER):
+    """make the module-level caches visible to every worker process
+
+    Args:
+        manager (:obj:`multiprocessing.managers.SyncManager`): running manager
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`dict`): name: cache, for handing to worker processes
+
+    """
+    logger.info('Sharing caches across processes')
+    caches = {
+        'QUOTES': QUOTES,
+        'NEWS': NEWS,
+        'ARTICLES': ARTICLES,
+        'BAD_SYMBOLS': BAD_SYMBOLS,
+        'COOLDOWNS': COOLDOWNS,
+    }
+    for cache in caches.values():
+        cache.share(manager)
+    return caches
+
+def install_caches(caches):
+    """adopt caches handed down from a parent process
+
+    Args:
+        caches (:obj:`dict`): output of ``share_caches()``
+
+    """
+    globals().update(caches)
+
+def snapshot_path_for(config, app_name, logger=api_config.LOGGER):
+    """each app's own snapshot file under ``[ProsperBot] snapshot_path``
+
+    Notes:
+        the slack and discord bots share one config and may share a host;
+        one file per app keeps them from restoring (and overwriting) each
+        other's caches
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        app_name (str): bot name (``PROGNAME``)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): ``<snapshot_path>/<app_name>.caches.pickle.gz``
+
+    """
+    root = config.get_option('ProsperBot', 'snapshot_path', None, '') or SNAPSHOT_DIR
+    snapshot_path = path.join(root, '{}.caches.pickle.gz'.format(app_name))
+    logger.info('Cache snapshots for %s in %s', app_name, snapshot_path)
+    return snapshot_path
+
+def save_snapshot(
+        snapshot_path=SNAPSHOT_PATH,
+        names=SNAPSHOT_CACHES,
+        logger=api_config.LOGGER
+):
+    """write live cache entries to disk so a restart starts warm
+
+    Notes:
+        expire times are wall-clock, so a reload honors the original TTLs.
+        Written to a temp file then renamed: a crash mid-write keeps the old one
+
+    Args:
+        snapshot_path (str, optional): gzipped pickle to write
+        names (:obj:`tuple`, optional): module-level caches to include
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (int): entries written
+
+    """
+    snapshot = {
+        'saved': time.time(),
+        'caches': {name: globals()[name].dump() for name in names},
+    }
+    os.makedirs(path.dirname(snapshot_path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(snapshot_path, os.getpid())
+    with gzip.open(tmp_path, 'wb', compresslevel=1) as snapshot_fh:
+        pickle.dump(snapshot, snapshot_fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+    count = sum(len(entries) for entries in snapshot['caches'].values())
+    logger.info('Saved %s cache entries to %s', count, snapshot_path)
+    return count
+
+def load_snapshot(
+        snapshot_path=SNAPSHOT_PATH,
+        names=SNAPSHOT_CACHES,
+        logger=api_config.LOGGER
+):
+    """refill module-level caches from ``save_snapshot()``
+
+    Notes:
+        a missing or unreadable snapshot is not an error: the bot just starts cold
+
+    Args:
+        snapshot_path (str, optional): gzipped pickle to read
+        names (:obj:`tuple`, optional): caches to restore
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (int): entries restored
+
+    """
+    if not path.isfile(snapshot_path):
+        logger.info('No cache snapshot at %s', snapshot_path)
+        return 0
+
+    try:
+        with gzip.open(snapshot_path, 'rb') as snapshot_fh:
+            snapshot = pickle.load(snapshot_fh)
+    except Exception:
+        logger.warning('unable to read cache snapshot %s', snapshot_path, exc_info=True)
+        return 0
+
+    count = 0
+    for name in names:
+        count += globals()[name].load(snapshot['caches'].get(name, {}))
+    logger.info(
+        'Restored %s cache entries from %s (%.0fs old)',
+        count, snapshot_path, time.time() - snapshot['saved']
+    )
+    return count
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+def start_snapshots(
+        interval=300,
+        snapshot_path=SNAPSHOT_PATH,
+        logger=api_config.LOGGER
+):
+    """snapshot caches every ``interval`` seconds and on shutdown
+
+    Notes:
+        SIGTERM (``systemctl stop/restart``) normally skips ``atexit``; when
+        nothing else handles it, it's turned into a clean ``SystemExit``
+
+    Args:
+        interval (float, optional): seconds between snapshots (0 = only on shutdown)
+        snapshot_path (str, optional): gzipped pickle to write
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`threading.Thread`): periodic snapshotter, or None when ``interval`` is 0
+
+    """
+    def save():
+        try:
+            save_snapshot(snapshot_path, logger=logger)
+        except Exception:
+            logger.warning('unable to save cache snapshot', exc_info=True)
+
+    atexit.register(save)
+    if threading.current_thread() is threading.main_thread() and \
+            signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            save()
+
+    thread = threading.Thread(target=run, name='cache-snapshot', daemon=True)
+    thread.start()
+    return thread
@@ -2,15 +2,20 @@
 from os import path
 import platform
 
-from contexttimer import Timer
-
-import prosper.datareader.coins as coins
-import prosper.datareader.stocks as stocks
-import prosper.datareader.news as news
-import prosper.datareader.utils as pdr_utils
-
 from . import _version
+from . import alerts
+from . import articles
+from . import caching
 from . import connections
+from . import fx
+from . import history
+from . import market_hours
+from . import metrics
+from . import prefetch
+from . import records
+from . import symbols
+from . import tickstore
+from . import upstream
 from . import utils
 from . import exceptions
 from . import config as api_config
@@ -33,11 +38,158 @@ def version_info(app_name):
         platform=platform.node()
     )
 
+def fetch_stock_quote(ticker, logger=api_config.LOGGER):
+    """pull a fresh stock quote from upstream into ``caching.QUOTES``
+
+    Args:
+        ticker (str): company ticker
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`records.StockQuote`): quote fields
+
+    """
+    ticker = ticker.upper()
+    raw_data = upstream.get_quote_rh(ticker, logger=logger)
+    if raw_data.empty:
+        raise exceptions.EmptyQuoteReturned(ticker)
+    quote = records.StockQuote.from_frame(raw_data)[0]
+    caching.QUOTES.set('STOCKS-{}'.format(ticker), quote, ttl=market_hours.STOCK_QUOTES.ttl())
+    tickstore.record('stocks', ticker, quote['current_price'], quote.get('volume'), logger=logger)
+    return quote
+
+def fetch_coin_quote(ticker, currency='USD', logger=api_config.LOGGER):
+    """pull a fresh coin quote from upstream into ``caching.QUOTES``
+
+    Args:
+        ticker (str): coin ticker
+        currency (str, optional): currency to FOREX against
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`records.CoinQuote`): quote fields
+
+    """
+    if currency != fx.BASE and _fx_rate_known(currency, logger=logger):
+        base_quote = caching.QUOTES.get('COINS-{}{}'.format(ticker.upper(), fx.BASE))
+        if base_quote is None:
+            base_quote = fetch_coin_quote(ticker, currency=fx.BASE, logger=logger)
+        quote = fx.convert_quote(base_quote, fx.BASE, currency, logger=logger)
+    else:
+        raw_data = upstream.get_quote_cc(
+            [ticker],
+            logger=logger,
+            currency=currency,
+            to_yahoo=True
+        )
+        logger.debug(raw_data)
+        if ticker not in raw_data.index:
+            raise exceptions.EmptyQuoteReturned(ticker)
+        quote = records.CoinQuote.from_frame(raw_data.loc[[ticker]])[0]
+        if currency == 'USD':  # one history per coin, in the currency most asked for
+            tickstore.record('coins', ticker, quote['last'], quote.get('volume'), logger=logger)
+    caching.QUOTES.set(
+        'COINS-{}{}'.format(ticker.upper(), currency), quote, ttl=market_hours.COIN_QUOTES.ttl())
+    return quote
+
+def _fx_rate_known(currency, logger=api_config.LOGGER):
+    """(bool): coins can be converted into ``currency`` locally"""
+    try:
+        fx.rates([currency], logger=logger)
+    except Exception:
+        logger.info('--no fx rate for %s, quoting coins in it directly', currency)
+        return False
+    return True
+
+def coin_grid(tickers, currencies, logger=api_config.LOGGER):
+    """last price of every coin in every currency, from one base quote per coin
+
+    Args:
+        tickers (:obj:`list`): coin tickers
+        currencies (:obj:`list`): currencies wanted
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): coins (that could be quoted) x currencies
+        (:obj:`dict`): ticker: base currency ``records.CoinQuote``
+
+    """
+    import pandas as pd
+
+    tickers = [ticker.upper() for ticker in tickers]
+    currencies = [currency.upper() for currency in currencies]
+    quotes = {}
+    for ticker in tickers:
+        quote = caching.QUOTES.get('COINS-{}{}'.format(ticker, fx.BASE))
+        if quote is not None:
+            quotes[ticker] = quote
+
+    missing = [ticker for ticker in tickers if ticker not in quotes]
+    if missing:
+        quote_df = fetch_basket(missing, kind='coins', currency=fx.BASE, logger=logger)
+        for quote in records.CoinQuote.from_frame(quote_df):
+            ticker = str(quote['symbol']).upper()
+            quotes[ticker] = quote
+            caching.QUOTES.set(
+                'COINS-{}{}'.format(ticker, fx.BASE), quote, ttl=market_hours.COIN_QUOTES.ttl())
+
+    quoted = [ticker for ticker in tickers if ticker in quotes]
+    grid = fx.convert(
+        [quotes[ticker]['last'] for ticker in quoted], fx.BASE, currencies, logger=logger)
+    return pd.DataFrame(grid, index=quoted, columns=currencies), quotes
+
+def fetch_stock_news(ticker, logger=api_config.LOGGER):
+    """pull a fresh news feed into ``articles``, scoring only articles not seen before
+
+    Args:
+        ticker (str): company ticker
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): ``records.Article`` with ``compound`` scores
+
+    """
+    import prosper.datareader.utils as pdr_utils  # deferred: pulls in nltk
+
+    ticker = ticker.upper()
+    news_df = upstream.company_news_rh(ticker, logger=logger)
+    return articles.store_feed(
+        ticker,
+        news_df,
+        lambda unseen_df: pdr_utils.vader_sentiment(unseen_df, 'title', logger=logger),
+        ttl=market_hours.STOCK_NEWS.ttl(),
+        logger=logger
+    )
+
+def prefetch_jobs(currency='USD', news=False):
+    """what ``prefetch.Prefetcher`` keeps warm for hot tickers
+
+    Args:
+        currency (str, optional): currency coin quotes are asked in
+        news (bool, optional): also keep stock news feeds warm
+
+    Returns:
+        (:obj:`dict`): kind: ``(cache_name, key_template, refresh_func)`` list
+
+    """
+    def refresh_coin(ticker, logger=api_config.LOGGER):
+        return fetch_coin_quote(ticker, currency=currency, logger=logger)
+
+    jobs = {
+        'stocks': [('QUOTES', 'STOCKS-{}', fetch_stock_quote)],
+        'coins': [('QUOTES', 'COINS-{}' + currency, refresh_coin)],
+    }
+    if news:
+        jobs['stocks'].append(('NEWS', 'NEWS-{}', fetch_stock_news))
+    return jobs
+
 def generic_stock_info(
         ticker,
         db_conn,
         cooldown_time=30,
         info_mask=['name', 'current_price', 'change_pct'],
+        cooldown_cache=None,
+        cooldown_collection=connections.COOLDOWN_COLLECTION,
         logger=api_config.LOGGER
 ):
     """get generic stock information (company name, current price)
@@ -47,6 +199,8 @@ def generic_stock_info(
         db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
         cooldown_time (int, optional): anti-spam timeout
         info_mask (:obj:`list`, optional): what data to use from quote endpoint
+        cooldown_cache (:obj:`caching.TTLCache`, optional): shared cooldown timers
+        cooldown_collection (str, optional): cooldown namespace (per-workspace)
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
@@ -56,26 +210,48 @@ def generic_stock_info(
     ticker = ticker.upper()
     logger.info('Fetching stock info: %s', ticker)
 
-    if connections.cooldown(
+    valid, reason = symbols.check_ticker(ticker, 'stocks')
+    if not valid:
+        logger.info('--dropping %s ticker %s', reason, ticker)
+        return ''
+    prefetch.HOT.hit('stocks', ticker)
+
+    with metrics.timer('stock.cooldown'):
+        shush = connections.cooldown(
             'BASIC_STOCKS-{}'.format(ticker),
             db_conn,
             cooldown_time=cooldown_time,
+            cooldown_cache=cooldown_cache,
+            cooldown_collection=cooldown_collection,
             logger=logger
-    ):
+        )
+    if shush:
         logger.info('--called too quickly, shutting up')
+        metrics.REGISTRY.incr('stock.shushed')
         return ''
 
-    with Timer() as stock_info_timer:
-        try:
-            raw_data = stocks.get_quote_rh(ticker)
-            data = ' '.join(list(map(str, raw_data.loc[0, info_mask])))
-        except Exception:  # pragma: no cover
-            logger.warning('unable to fetch basic ticker info', exc_info=True)
-            data = ''
+    quote_key = 'STOCKS-{}'.format(ticker)
+    with metrics.timer('stock.fetch') as stock_info_timer:
+        quote = caching.QUOTES.get(quote_key)
+        if quote is None:
+            try:
+                quote = fetch_stock_quote(ticker, logger=logger)
+            except Exception as err:  # pragma: no cover
+                if symbols.is_bad_symbol_error(err):
+                    logger.info('--no such ticker %s: %r', ticker, err)
+                    symbols.remember_bad(ticker, 'stocks', logger=logger)
+                else:
+                    logger.warning('unable to fetch basic ticker info', exc_info=True)
+                metrics.REGISTRY.error('stock.fetch')
+        else:
+            logger.info('--using cached quote')
+            metrics.REGISTRY.incr('stock.cache_hit')
 
         logger.info('--basic stock quote timer: %s', stock_info_timer)
 
-    return data
+    if quote is None:
+        return ''
+    return _quote_text(quote, info_mask, logger=logger)
 
 def generic_coin_info(
         ticker,
@@ -83,6 +259,8 @@ def generic_coin_info(
         currency='USD',
         cooldown_time=30,
         info_mask=['name', 'last', 'change_pct'],
+        cooldown_cache=None,
+        cooldown_collection=connections.COOLDOWN_COLLECTION,
         logger=api_config.LOGGER
 ):
     """get generic coin information (current price)
@@ -90,44 +268,799 @@ def generic_coin_info(
     Args:
         ticker (str): coin ticker
         db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
-        currency (str): currenct to FOREX against
+        currency (str or :obj:`list`): currency (or currencies) to FOREX against
         cooldown_time (int, optional): anti-spam timeout
         info_mask (:obj:`list`, optional): what data to use from quote endpoint
+        cooldown_cache (:obj:`caching.TTLCache`, optional): shared cooldown timers
+        cooldown_collection (str, optional): cooldown namespace (per-workspace)
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
-        (str): {comany_name} {current_price} {change_pct}
+        (str): {comany_name} {current_price} {change_pct}; with several
+            currencies, ``last`` becomes ``{price} {currency}`` for each
 
     """
-    coin_ticker = ticker.upper() + currency
+    currencies = [currency] if isinstance(currency, str) else list(currency)
+    coin_ticker = ticker.upper() + ','.join(currencies)
     logger.info('Fetching coin info: %s', ticker)
 
-    if connections.cooldown(
+    valid, reason = symbols.check_ticker(ticker, 'coins')
+    if not valid:
+        logger.info('--dropping %s coin %s', reason, ticker)
+        return ''
+    prefetch.HOT.hit('coins', ticker)
+
+    with metrics.timer('coin.cooldown'):
+        shush = connections.cooldown(
             'BASIC_COINS-{}'.format(coin_ticker),
             db_conn,
             cooldown_time=cooldown_time,
+            cooldown_cache=cooldown_cache,
+            cooldown_collection=cooldown_collection,
             logger=logger
-    ):
+        )
+    if shush:
         logger.info('--called too quickly, shutting up')
+        metrics.REGISTRY.incr('coin.shushed')
         return ''
 
-    with Timer() as coin_info_timer:
+    quote_key = 'COINS-{}'.format(coin_ticker)
+    quote, prices = None, None
+    with metrics.timer('coin.fetch') as coin_info_timer:
         try:
-            raw_data = coins.get_quote_cc(
-                [ticker],
-                logger=logger,
-                currency=currency,
-                to_yahoo=True
-            )
-            logger.debug(raw_data)
-            data = ' '.join(list(map(str, raw_data.loc[ticker, info_mask])))
-        except Exception:
-            logger.warning('unable to fetch basic coin info: %s', coin_ticker, exc_info=True)
-            data = ''
+            if len(currencies) > 1:  # one quote, local FX (bad coins are remembered by the fetch)
+                grid, quotes = coin_grid([ticker], currencies, logger=logger)
+                quote = quotes.get(ticker.upper())
+                if quote is not None:
+                    prices = grid.loc[ticker.upper()]
+            else:
+                quote = caching.QUOTES.get(quote_key)
+                if quote is None:
+                    quote = fetch_coin_quote(ticker, currency=currencies[0], logger=logger)
+                else:
+                    logger.info('--using cached quote')
+                    metrics.REGISTRY.incr('coin.cache_hit')
+        except Exception as err:
+            if symbols.is_bad_symbol_error(err):
+                logger.info('--no such coin %s: %r', coin_ticker, err)
+                symbols.remember_bad(ticker, 'coins', logger=logger)
+            else:
+                logger.warning('unable to fetch basic coin info: %s', coin_ticker, exc_info=True)
+            metrics.REGISTRY.error('coin.fetch')
 
         logger.info('--basic coin quote timer: %s', coin_info_timer)
 
-        return data
+    if quote is None:
+        return ''
+    return _quote_text(quote, info_mask, prices=prices, logger=logger)
+
+def _quote_text(quote, info_mask, prices=None, logger=api_config.LOGGER):
+    """render the ``info_mask`` fields of a quote
+
+    Args:
+        quote (:obj:`records.Record`): quote to render
+        info_mask (:obj:`list`): fields wanted, in order
+        prices (:obj:`pandas.Series`, optional): currency: price, shown in place of ``last``
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): fields, space separated ('' if the mask names a field quotes don't keep)
+
+    """
+    def price_text(price):
+        return '{:.2f}'.format(price) if abs(price) >= 1 else '{:.6g}'.format(price)
+
+    fields = []
+    try:
+        for key in info_mask:
+            if key == 'last' and prices is not None:
+                fields.extend(
+                    '{} {}'.format(price_text(price), currency)
+                    for currency, price in prices.items()
+                )
+            else:
+                fields.append(str(quote[key]))
+    except KeyError:
+        logger.warning('quote has no field for info_mask %s', info_mask, exc_info=True)
+        return ''
+    return ' '.join(fields)
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+def sparkline(timestamps, prices, width=16):
+    """draw a price series as block characters, one per equal time bucket
+
+    Notes:
+        each bucket shows the last price at or before its end (``searchsorted``
+        over the whole series at once), so quiet stretches carry the previous
+        price forward instead of leaving gaps
+
+    Args:
+        timestamps (:obj:`numpy.ndarray`): sorted epoch seconds
+        prices (:obj:`numpy.ndarray`): price at each timestamp
+        width (int, optional): characters to draw
+
+    Returns:
+        (str): sparkline, or '' with fewer than 2 prices
+
+    """
+    import numpy as np
+
+    if len(prices) < 2 or width < 1:
+        return ''
+    edges = np.linspace(timestamps[0], timestamps[-1], width + 1)[1:]
+    closes = prices[np.searchsorted(timestamps, edges, side='right') - 1]
+
+    low, high = closes.min(), closes.max()
+    if high == low:
+        levels = np.full(width, len(SPARK_CHARS) // 2, dtype=int)
+    else:
+        levels = np.rint((closes - low) / (high - low) * (len(SPARK_CHARS) - 1)).astype(int)
+    return ''.join(SPARK_CHARS[level] for level in levels)
+
+def intraday_summary(
+        ticker,
+        kind='stocks',
+        currency='USD',
+        width=16,
+        logger=api_config.LOGGER
+):
+    """sparkline + session low/high from recorded ticks (no upstream call)
+
+    Notes:
+        stocks cover the session of the latest tick (from pre-market open),
+        coins the 24 hours before it.  Coins are only recorded in USD
+
+    Args:
+        ticker (str): ticker to summarize
+        kind (str, optional): ``stocks`` or ``coins``
+        currency (str, optional): currency the reply is quoted in
+        width (int, optional): sparkline characters
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): ``{sparkline} L {low} H {high}``, or '' without enough history
+
+    """
+    if tickstore.STORE is None or (kind == 'coins' and currency != 'USD'):
+        return ''
+
+    with metrics.timer('quote.sparkline'):
+        try:
+            ticks = tickstore.STORE.history(kind, ticker)
+            if len(ticks) < 2:
+                return ''
+            latest = ticks['timestamp'][-1]
+            since = market_hours.session_start(latest) if kind == 'stocks' else latest - 86400
+            ticks = ticks[ticks['timestamp'] >= since]
+            line = sparkline(ticks['timestamp'], ticks['price'], width=width)
+        except Exception:
+            logger.warning('unable to summarize history for %s', ticker, exc_info=True)
+            return ''
+
+    if not line:
+        return ''
+    return '{} L {:g} H {:g}'.format(line, ticks['price'].min(), ticks['price'].max())
+
+def ticker_suggestion(ticker, kind='stocks'):
+    """"did you mean" text for a ticker the symbol index doesn't know
+
+    Args:
+        ticker (str): requested ticker
+        kind (str, optional): ``stocks`` or ``coins``
+
+    Returns:
+        (str): suggestion, or '' when the ticker is fine/nothing is close
+
+    """
+    if symbols.check_ticker(ticker, kind) != (False, 'unknown'):
+        return ''
+
+    suggestions = symbols.suggest(ticker, kind)
+    if not suggestions:
+        return ''
+    return 'unknown ticker {} -- did you mean {}?'.format(
+        ticker.upper(), ' / '.join(suggestions))
+
+def _ticker_refusal(ticker, kind, reason):
+    """user-facing reason a ticker was refused"""
+    if reason == 'unknown':
+        return ticker_suggestion(ticker, kind) or 'unknown ticker {}'.format(ticker)
+    return 'unable to watch {}'.format(ticker)
+
+def set_price_alert(
+        engine,
+        ticker,
+        threshold,
+        channel,
+        user_name,
+        kind='stocks',
+        direction=None,
+        currency='USD',
+        max_per_channel=25,
+        logger=api_config.LOGGER,
+        **routing
+):
+    """watch a ticker and announce when it crosses ``threshold``
+
+    Args:
+        engine (:obj:`alerts.AlertEngine`): running alert engine
+        ticker (str): ticker to watch
+        threshold (str or float): price to cross
+        channel (str): where to announce it
+        user_name (str): who asked
+        kind (str, optional): ``stocks`` or ``coins``
+        direction (str, optional): ``above``/``below`` (default: whichever way
+            ``threshold`` is from the current price)
+        currency (str, optional): currency coins are priced in
+        max_per_channel (int, optional): anti-spam cap on live alerts per channel
+        logger (:obj:`logging.logger`, optional): logging handle
+        routing (dict): platform details stored with the alert (``team_id``...)
+
+    Returns:
+        (str): confirmation or why not
+
+    """
+    ticker = ticker.upper()
+    logger.info('Setting price alert: %s %s %s', ticker, direction or '', threshold)
+
+    valid, reason = symbols.check_ticker(ticker, kind)
+    if not valid:
+        return _ticker_refusal(ticker, kind, reason)
+
+    try:
+        threshold = float(str(threshold).replace(',', '').lstrip('$'))
+    except ValueError:
+        return 'unable to read price `{}`'.format(threshold)
+
+    if len(engine.book.for_channel(channel)) >= max_per_channel:
+        return 'this channel already has {} alerts -- cancel some first'.format(max_per_channel)
+
+    if direction is None:
+        try:
+            if kind == 'coins':
+                quote = fetch_coin_quote(ticker, currency=currency, logger=logger)
+            else:
+                quote = caching.QUOTES.get('STOCKS-{}'.format(ticker)) or \
+                    fetch_stock_quote(ticker, logger=logger)
+            price = float(quote[alerts.PRICE_FIELDS[kind]])
+        except Exception as err:
+            logger.warning('unable to price %s for alert', ticker, exc_info=True)
+            if symbols.is_bad_symbol_error(err):
+                symbols.remember_bad(ticker, kind, logger=logger)
+            return 'unable to get a price for {}'.format(ticker)
+        direction = 'above' if threshold > price else 'below'
+
+    alert = alerts.new_alert(kind, ticker, direction, threshold, channel, user_name, **routing)
+    engine.add(alert)
+    return 'OK, I will tell this channel when {} goes {} {:,.2f} (alert {})'.format(
+        ticker, direction, threshold, alert['alert_id'])
+
+def list_price_alerts(engine, channel):
+    """live alerts for a channel
+
+    Args:
+        engine (:obj:`alerts.AlertEngine`): running alert engine
+        channel (str): channel asking
+
+    Returns:
+        (str): one alert per line
+
+    """
+    channel_alerts = engine.book.for_channel(channel)
+    if not channel_alerts:
+        return 'no price alerts set here'
+    return '\n'.join(alerts.describe(alert) for alert in channel_alerts)
+
+def cancel_price_alert(engine, alert_id, channel, logger=api_config.LOGGER):
+    """stop watching an alert set in this channel
+
+    Args:
+        engine (:obj:`alerts.AlertEngine`): running alert engine
+        alert_id (str): id from ``list_price_alerts()``
+        channel (str): channel asking
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): confirmation or why not
+
+    """
+    logger.info('Cancelling price alert %s', alert_id)
+    alert = engine.cancel(alert_id.strip('[]'), channel=channel)
+    if alert is None:
+        return 'no alert {} in this channel'.format(alert_id)
+    return 'cancelled {}'.format(alerts.describe(alert))
+
+WATCHLIST_COLUMNS = {  # kind: (price column, reference price column)
+    'stocks': ('current_price', 'previous_close'),
+    'coins': ('last', 'open'),
+}
+def fetch_basket(tickers, kind='stocks', currency='USD', logger=api_config.LOGGER):
+    """quote a whole basket in one upstream call (one by one if the batch fails)
+
+    Args:
+        tickers (:obj:`list`): tickers to quote
+        kind (str, optional): ``stocks`` or ``coins``
+        currency (str, optional): currency coins are priced in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): one row per ticker that could be quoted
+
+    """
+    import pandas as pd  # deferred: keep bot startup light
+
+    quote_currency = currency
+    if kind == 'coins' and currency != fx.BASE and _fx_rate_known(currency, logger=logger):
+        quote_currency = fx.BASE  # quote once in the base currency, convert below
+
+    def fetch(batch):
+        if kind == 'coins':
+            return upstream.get_quote_cc(
+                batch, currency=quote_currency, to_yahoo=True, logger=logger)
+        return upstream.get_quote_rh(batch, logger=logger)
+
+    try:
+        quote_df = fetch(tickers).reset_index(drop=True)
+    except Exception:
+        logger.warning('batched quote failed, retrying one at a time', exc_info=True)
+        frames = []
+        for ticker in tickers:
+            try:
+                frame = fetch([ticker])
+                if frame.empty:
+                    raise exceptions.EmptyQuoteReturned(ticker)
+            except Exception as err:
+                if symbols.is_bad_symbol_error(err):
+                    symbols.remember_bad(ticker, kind, logger=logger)
+                continue
+            frames.append(frame)
+        quote_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    if not quote_df.empty and (kind == 'stocks' or quote_currency == 'USD'):
+        volumes = quote_df['volume'] if 'volume' in quote_df else [None] * len(quote_df)
+        for symbol, price, volume in zip(
+                quote_df['symbol'], quote_df[WATCHLIST_COLUMNS[kind][0]], volumes):
+            tickstore.record(kind, symbol, price, volume, logger=logger)
+    if not quote_df.empty and quote_currency != currency:
+        quote_df = fx.convert_frame(quote_df, quote_currency, currency, logger=logger)
+    return quote_df
+
+def basket_table(quote_df, kind='stocks'):
+    """price and change for every row of ``fetch_basket()``
+
+    Notes:
+        change is against the previous close (stocks) or the day's open (coins)
+
+    Args:
+        quote_df (:obj:`pandas.DataFrame`): quotes from ``fetch_basket()``
+        kind (str, optional): ``stocks`` or ``coins``
+
+    Returns:
+        (:obj:`pandas.DataFrame`): ``symbol``, ``price``, ``change``, ``change_pct``
+
+    """
+    price_column, reference_column = WATCHLIST_COLUMNS[kind]
+    table = quote_df[['symbol']].copy()
+    table['symbol'] = table['symbol'].astype(str).str.upper()
+    table['price'] = quote_df[price_column].astype(float)
+    table['change'] = table['price'] - quote_df[reference_column].astype(float)
+    table['change_pct'] = table['change'] / (table['price'] - table['change']) * 100
+    return table
+
+def render_basket(table, tickers):
+    """aligned ranking of ``tickers`` out of a (possibly larger) ``basket_table()``
+
+    Args:
+        table (:obj:`pandas.DataFrame`): output of ``basket_table()``
+        tickers (:obj:`list`): tickers to show
+
+    Returns:
+        (str): aligned table, best performer first
+
+    """
+    tickers = [ticker.upper() for ticker in tickers]
+    table = table[table['symbol'].isin(tickers)].copy()
+    table['rank'] = table['change_pct'].rank(ascending=False, method='min').astype(int)
+    table = table.sort_values(['rank', 'symbol'])
+
+    lines = ['{:>2} {:<6} {:>10} {:>9} {:>8}'.format('#', 'TICKER', 'PRICE', 'CHG', 'CHG%')]
+    for row in table.itertuples(index=False):
+        lines.append('{:>2} {:<6} {:>10,.2f} {:>+9,.2f} {:>+7.2f}%'.format(
+            row.rank, row.symbol, row.price, row.change, row.change_pct))
+
+    missing = sorted(set(tickers) - set(table['symbol']))
+    if missing:
+        lines.append('no quote: {}'.format(', '.join(missing)))
+    return '\n'.join(lines)
+
+def watchlist_snapshot(
+        tickers,
+        kind='stocks',
+        currency='USD',
+        logger=api_config.LOGGER
+):
+    """one ranked table for a basket of tickers
+
+    Args:
+        tickers (:obj:`list`): tickers to quote
+        kind (str, optional): ``stocks`` or ``coins``
+        currency (str, optional): currency coins are priced in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): aligned table, best performer first
+
+    """
+    logger.info('Building %s watchlist snapshot: %s', kind, tickers)
+    with metrics.timer('watchlist.fetch'):
+        quote_df = fetch_basket(tickers, kind=kind, currency=currency, logger=logger)
+    if quote_df.empty:
+        return 'unable to quote {}'.format(', '.join(tickers))
+
+    with metrics.timer('watchlist.table'):
+        return render_basket(basket_table(quote_df, kind=kind), tickers)
+
+def _short_number(value):
+    """``1144602331.0`` -> ``1.14B``"""
+    for threshold, suffix in ((1e12, 'T'), (1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+        if abs(value) >= threshold:
+            return '{:.3g}{}'.format(value / threshold, suffix)
+    return '{:.3g}'.format(value)
+
+def coin_movers_table(universe, currency='USD', logger=api_config.LOGGER):
+    """24h change and 24h traded value per coin, from one raw CryptoCompare quote
+
+    Notes:
+        yahoo-style coin quotes only keep ``LASTVOLUME`` (the size of the
+        last trade).  The raw quote's ``VOLUME24HOURTO`` is the day's traded
+        value in the quote currency, which compares across coins
+
+    Args:
+        universe (:obj:`list`): coin tickers
+        currency (str, optional): currency volume is reported in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): ``symbol``, ``change_pct``, ``volume``
+
+    """
+    import pandas as pd  # deferred: keep bot startup light
+
+    quote_currency = currency
+    if currency != fx.BASE and _fx_rate_known(currency, logger=logger):
+        quote_currency = fx.BASE  # quote once in the base currency, convert below
+
+    raw_df = upstream.get_quote_cc(
+        universe, currency=quote_currency, to_yahoo=False, logger=logger)
+    table = pd.DataFrame({
+        'symbol': raw_df['FROMSYMBOL'].astype(str).str.upper(),
+        'change_pct': raw_df['CHANGEPCT24HOUR'].astype(float),
+        'volume': raw_df['VOLUME24HOURTO'].astype(float),
+    })
+    if quote_currency != currency:
+        table['volume'] *= fx.rates([currency], base=quote_currency, logger=logger)[0]
+    return table
+
+def market_movers(
+        universe,
+        kind='coins',
+        currency='USD',
+        count=5,
+        ttl=60,
+        logger=api_config.LOGGER
+):
+    """top gainers, losers and volume across a fixed universe, from one bulk quote
+
+    Notes:
+        the rendered board is cached for ``ttl`` seconds, so a busy channel
+        asking "what's moving" costs one upstream call per ``ttl``.  Coins
+        rank on 24h traded value in ``currency``, stocks on the day's share volume
+
+    Args:
+        universe (:obj:`list`): tickers to rank
+        kind (str, optional): ``stocks`` or ``coins``
+        currency (str, optional): currency coins are priced in
+        count (int, optional): rows per column
+        ttl (float, optional): seconds to reuse the board
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): aligned gainers/losers/volume board
+
+    """
+    universe = sorted(set(
+        ticker.upper() for ticker in universe if symbols.check_ticker(ticker.upper(), kind)[0]
+    ))
+    if not universe:
+        return 'no {} universe configured for movers'.format(kind)
+
+    board_key = 'MOVERS-{}-{}-{}-{}'.format(kind, currency, count, ','.join(universe))
+    board = caching.QUOTES.get(board_key)
+    if board is not None:
+        metrics.REGISTRY.incr('movers.cache_hit')
+        return board
+
+    logger.info('Ranking %s movers across %s tickers', kind, len(universe))
+    with metrics.timer('movers.fetch'):
+        if kind == 'coins':
+            try:
+                table = coin_movers_table(universe, currency=currency, logger=logger)
+            except Exception:
+                logger.warning('unable to quote coin movers', exc_info=True)
+                table = None
+            volume_title = 'VOL24H {}'.format(currency)
+        else:
+            quote_df = fetch_basket(universe, kind=kind, currency=currency, logger=logger)
+            table = None if quote_df.empty else basket_table(quote_df, kind=kind)
+            if table is not None and 'volume' in quote_df:
+                table['volume'] = quote_df['volume'].astype(float)
+            volume_title = 'VOLUME'
+    if table is None or table.empty:
+        return 'unable to quote the {} universe'.format(kind)
+
+    with metrics.timer('movers.rank'):
+        change_text = '{:>+7.2f}%'.format
+        columns = [
+            ('GAINERS', table.nlargest(count, 'change_pct'), 'change_pct', change_text),
+            ('LOSERS', table.nsmallest(count, 'change_pct'), 'change_pct', change_text),
+        ]
+        if 'volume' in table and table['volume'].notnull().any():
+            columns.append((
+                volume_title, table.nlargest(count, 'volume'), 'volume',
+                lambda volume: '{:>8}'.format(_short_number(volume))
+            ))
+
+        lines = ['   '.join('{:<15}'.format(title) for title, _, _, _ in columns).rstrip()]
+        for rank in range(max(len(ranked) for _, ranked, _, _ in columns)):
+            cells = []
+            for _, ranked, field, render in columns:
+                if rank < len(ranked):
+                    row = ranked.iloc[rank]
+                    cells.append('{:<6} {}'.format(row['symbol'], render(row[field])))
+                else:
+                    cells.append(' ' * 15)
+            lines.append('   '.join(cells).rstrip())
+
+    board = '\n'.join(lines)
+    caching.QUOTES.set(board_key, board, ttl=ttl)
+    return board
+
+COMPARE_DAYS = 30
+MAX_COMPARE = 8  # tickers per compare table
+
+def parse_compare_args(args, default_days=COMPARE_DAYS, max_days=history.MAX_DAYS):
+    """split ``MU INTC AMD 30d`` into tickers and a session count
+
+    Args:
+        args (:obj:`list`): words after ``compare``
+        default_days (int, optional): sessions when none are given
+        max_days (int, optional): most sessions allowed
+
+    Returns:
+        (:obj:`list`): tickers (upper case, deduplicated, in order)
+        (int): sessions wanted
+
+    """
+    tickers = []
+    days = default_days
+    for arg in args:
+        arg = arg.strip().upper().lstrip('$')
+        if not arg:
+            continue
+        if arg.rstrip('D').isdigit() and arg[0].isdigit():
+            days = int(arg.rstrip('D'))
+        elif arg not in tickers:
+            tickers.append(arg)
+    return tickers, max(2, min(days, max_days))
+
+def compare(
+        tickers,
+        days=COMPARE_DAYS,
+        kind='stocks',
+        width=16,
+        as_of=None,
+        store=None,
+        logger=api_config.LOGGER
+):
+    """relative performance of several tickers over the last ``days`` sessions
+
+    Notes:
+        closes come from ``history.STORE`` (only missing sessions are
+        fetched); returns, drawdowns and the correlation matrix are computed
+        for every ticker at once.  Coins are compared in USD
+
+    Args:
+        tickers (:obj:`list`): tickers to compare
+        days (int, optional): sessions to look back
+        kind (str, optional): ``stocks`` or ``coins``
+        width (int, optional): sparkline characters (0 = none)
+        as_of (:obj:`datetime.date`, optional): last session (default last completed)
+        store (:obj:`history.HistoryStore`, optional): where closes are kept
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): aligned return/drawdown table plus correlations
+
+    """
+    import numpy as np
+
+    store = store or history.STORE
+    wanted = []
+    dropped = []
+    for ticker in tickers[:MAX_COMPARE]:
+        ticker = ticker.upper()
+        if symbols.check_ticker(ticker, kind)[0]:
+            wanted.append(ticker)
+        else:
+            dropped.append(ticker)
+    if not wanted:
+        return 'usage: compare TICKER [TICKER...] [30d]'
+
+    with metrics.timer('compare.history'):
+        closes = store.closes(kind, wanted, days, as_of=as_of, logger=logger)
+    dropped.extend(ticker for ticker in wanted if ticker not in closes)
+    tickers, session_days, prices = history.align(closes, wanted)
+    if len(session_days) < 2:
+        return 'not enough shared history for {}'.format(', '.join(wanted))
+
+    with metrics.timer('compare.stats'):
+        normalized, returns, drawdowns, correlation = history.performance(prices)
+
+    lines = ['{} sessions {} to {}'.format(
+        len(session_days),
+        np.datetime64(int(session_days[0]), 'D'),
+        np.datetime64(int(session_days[-1]), 'D')
+    )]
+    lines.append('{:<6} {:>8} {:>8}'.format('', 'RETURN', 'MAX DD'))
+    for column, ticker in enumerate(tickers):
+        spark = sparkline(session_days, normalized[:, column], width=min(width, len(session_days)))
+        lines.append('{:<6} {:>+7.2f}% {:>+7.2f}% {}'.format(
+            ticker, returns[column] * 100, drawdowns[column] * 100, spark).rstrip())
+
+    if len(tickers) > 1:
+        lines.append('')
+        lines.append('{:<6}'.format('CORR') + ''.join('{:>7}'.format(ticker) for ticker in tickers))
+        for row, ticker in enumerate(tickers):
+            lines.append('{:<6}'.format(ticker) + ''.join(
+                '{:>7.2f}'.format(value) for value in correlation[row]))
+    if dropped:
+        lines.append('no history for {}'.format(', '.join(dropped)))
+    return '\n'.join(lines)
+
+def update_watchlist(
+        channel_name,
+        action,
+        tickers,
+        user_name,
+        db_conn,
+        kind='stocks',
+        max_size=25,
+        watchlist_collection=connections.WATCHLIST_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """``add``/``remove``/``clear`` tickers on a channel's watchlist
+
+    Args:
+        channel_name (str): name of channel (guid > pretty-string)
+        action (str): ``add``, ``remove`` or ``clear``
+        tickers (:obj:`list`): tickers to add/remove (``$`` and commas ok)
+        user_name (str): who is changing the list
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        kind (str, optional): ``stocks`` or ``coins``
+        max_size (int, optional): most tickers a watchlist may hold
+        watchlist_collection (str, optional): collection watchlists live in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): new watchlist or why not
+
+    """
+    tickers = [
+        ticker.strip('$,').upper() for ticker in tickers if ticker.strip('$,')
+    ]
+    current = connections.get_watchlist(
+        channel_name, db_conn, watchlist_kind=kind,
+        watchlist_collection=watchlist_collection, logger=logger
+    )
+
+    if action == 'clear':
+        updated = []
+    elif action == 'remove':
+        updated = [ticker for ticker in current if ticker not in tickers]
+    elif action == 'add':
+        for ticker in tickers:
+            valid, reason = symbols.check_ticker(ticker, kind)
+            if not valid:
+                return _ticker_refusal(ticker, kind, reason)
+        updated = list(current)
+        for ticker in tickers:
+            if ticker not in updated:
+                updated.append(ticker)
+        if len(updated) > max_size:
+            return 'watchlists hold at most {} tickers'.format(max_size)
+    else:
+        return 'unknown watchlist action `{}` (add/remove/clear)'.format(action)
+
+    connections.set_watchlist(
+        channel_name, updated, user_name, db_conn, watchlist_kind=kind,
+        watchlist_collection=watchlist_collection, logger=logger
+    )
+    return 'watchlist: {}'.format(' '.join(updated) or '(empty)')
+
+def channel_watchlist(
+        channel_name,
+        db_conn,
+        kind='stocks',
+        currency='USD',
+        watchlist_collection=connections.WATCHLIST_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """snapshot table for a channel's saved watchlist
+
+    Args:
+        channel_name (str): name of channel (guid > pretty-string)
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        kind (str, optional): ``stocks`` or ``coins``
+        currency (str, optional): currency coins are priced in
+        watchlist_collection (str, optional): collection watchlists live in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): table, or how to start a watchlist
+
+    """
+    tickers = connections.get_watchlist(
+        channel_name, db_conn, watchlist_kind=kind,
+        watchlist_collection=watchlist_collection, logger=logger
+    )
+    if not tickers:
+        return 'no watchlist yet -- try `watchlist add MU INTC`'
+    return watchlist_snapshot(tickers, kind=kind, currency=currency, logger=logger)
+
+def update_digest(
+        channel_name,
+        action,
+        db_conn,
+        kind='stocks',
+        watchlist_collection=connections.WATCHLIST_COLLECTION,
+        digest_collection=connections.DIGEST_COLLECTION,
+        logger=api_config.LOGGER,
+        **routing
+):
+    """``on``/``off`` scheduled digests of a channel's watchlist
+
+    Args:
+        channel_name (str): name of channel (guid > pretty-string)
+        action (str): ``on`` or ``off``
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        kind (str, optional): digest the ``stocks`` or ``coins`` watchlist
+        watchlist_collection (str, optional): collection the channel's watchlist lives in
+        digest_collection (str, optional): collection subscriptions live in
+        logger (:obj:`logging.logger`, optional): logging handle
+        routing (dict): platform routing (``team_id``, ``shard_id``...)
+
+    Returns:
+        (str): confirmation
+
+    """
+    if action not in ('on', 'off'):
+        return 'unknown digest action `{}` (on/off)'.format(action)
+
+    connections.set_digest_subscription(
+        channel_name, action == 'on', db_conn, digest_kind=kind,
+        digest_collection=digest_collection, logger=logger,
+        watchlist_collection=watchlist_collection, **routing
+    )
+    if action == 'off':
+        return '{} digests off'.format(kind)
+
+    response = '{} digests on'.format(kind)
+    if not connections.get_watchlist(
+            channel_name, db_conn, watchlist_kind=kind,
+            watchlist_collection=watchlist_collection, logger=logger):
+        response += ' -- digests cover the watchlist: try `watchlist add MU INTC`'
+    return response
 
 def stock_news(
         ticker,
@@ -147,39 +1080,56 @@ def stock_news(
         str: additional info
 
     """
+    import prosper.datareader.utils as pdr_utils  # deferred: pulls in nltk
+
     #if isinstance(direction, str):
     #    direction = float(direction.split()[-1].replace('%', ''))
 
     logger.info('--fetching news')
-    with Timer() as stock_news_timer:
-        try:
-            news_df = news.company_news_rh(ticker, logger=logger)
-            news_df = pdr_utils.vader_sentiment(news_df, 'title', logger=logger)
-        except KeyError as err:
-            logger.warning('Blank feed found', exc_info=True)
-            return 'NO NEWS FOUND',''
-        except Exception as err:
-            logger.warning('unable to fetch news for ticker %s', ticker, exc_info=True)
-            return 'ERROR - UNABLE TO FETCH NEWS FOR {} - {}'.format(
-                ticker, repr(err)
-            ), ''
+    try:
+        with metrics.timer('news.fetch') as stock_news_timer:
+            feed = articles.feed(ticker)
+            if feed is not None:
+                logger.info('--using cached news')
+                metrics.REGISTRY.incr('news.cache_hit')
+            else:
+                news_df = upstream.company_news_rh(ticker, logger=logger)
+        with metrics.timer('news.sentiment') as sentiment_timer:
+            if feed is None:
+                feed = articles.store_feed(
+                    ticker,
+                    news_df,
+                    lambda unseen_df: pdr_utils.vader_sentiment(unseen_df, 'title', logger=logger),
+                    ttl=market_hours.STOCK_NEWS.ttl(),
+                    logger=logger
+                )
+        if not feed:
+            raise KeyError('no articles for {}'.format(ticker))
+    except KeyError as err:
+        logger.warning('Blank feed found', exc_info=True)
+        return 'NO NEWS FOUND',''
+    except Exception as err:
+        logger.warning('unable to fetch news for ticker %s', ticker, exc_info=True)
+        return 'ERROR - UNABLE TO FETCH NEWS FOR {} - {}'.format(
+            ticker, repr(err)
+        ), ''
 
-        logger.debug(news_df.head(5))
-        logger.info('--news fetch timer: %s', stock_news_timer)
+    logger.debug(feed[:5])
+    logger.info('--news fetch timer: %s sentiment timer: %s', stock_news_timer, sentiment_timer)
 
     if direction > 0:
         logger.info('--finding positive news')
-        best_article = news_df[news_df['compound'] == max(news_df['compound'])]
+        best_article = max(feed, key=lambda article: article['compound'])
         logger.debug(best_article)
-        url = best_article.iloc[0]['url']
-        score = best_article.iloc[0]['compound']
+        url = best_article['url']
+        score = best_article['compound']
 
     elif direction < 0:
         logger.info('--finding negative news')
-        best_article = news_df[news_df['compound'] == min(news_df['compound'])]
+        best_article = min(feed, key=lambda article: article['compound'])
         logger.debug(best_article)
-        url = best_article.iloc[0]['url']
-        score = best_article.iloc[0]['compound']
+        url = best_article['url']
+        score = best_article['compound']
 
     else:  # pragma no cover
         #TODO: raise EmptyQuoteReturned?
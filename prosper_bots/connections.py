@@ -1,15 +1,17 @@
 """connections.py: database and cache utilities for bot commands"""
 from os import path
+import json
+import os
+import sqlite3
+import threading
 import time
 from enum import Enum
 from datetime import datetime, timedelta
 
 from tinymongo import TinyMongoClient
-import pandas as pd
 
 from . import config as api_config
 from . import exceptions
-import prosper.datareader.coins as coins
 
 HERE = path.abspath(path.dirname(__file__))
 
@@ -19,9 +21,15 @@ class Modes(Enum):
     coins = 'coins'
     test = 'TEST'
 
+class Backends(Enum):
+    """supported storage backends"""
+    tinymongo = 'tinymongo'
+    sqlite = 'sqlite'
+
 def build_connection(
         source_name,
         source_path=path.join(HERE, 'cache'),
+        backend=Backends.tinymongo,
         logger=api_config.LOGGER
 ):
     """create a connection object for a bot main() to reference
@@ -29,16 +37,60 @@ def build_connection(
     Args:
         source_name (str): name of db
         source_path (str, optional): path to db
+        backend (:obj:`Enum` or str, optional): storage backend
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
-        (:obj:`tinymongo.TinyMongoDatabase`): handle to database
+        (:obj:`tinymongo.TinyMongoDatabase` or :obj:`SQLiteDatabase`): handle to database
 
     """
+    backend = Backends(backend)
+    if backend == Backends.sqlite:
+        db_path = path.join(source_path, source_name + '.sqlite')
+        logger.info('Building db connection: %s', db_path)
+        os.makedirs(source_path, exist_ok=True)
+        return SQLiteDatabase(db_path)
+
     logger.info('Building db connection: %s', path.join(source_path, source_name + '.json'))
 
     return TinyMongoClient(source_path)[source_name]
 
+def require_multiprocess_backend(backend, workers):
+    """refuse a backend that several worker processes would corrupt
+
+    Notes:
+        tinymongo keeps each file in memory and rewrites all of it on every
+        write, so sharded workers silently drop each other's alerts,
+        watchlists and digest subscriptions.  sqlite (WAL) serializes writers
+
+    Args:
+        backend (:obj:`Enum` or str): ``[ProsperBot] storage_backend``
+        workers (int): worker processes that will write (0 = single process)
+
+    Raises:
+        UnsafeBackend: ``workers`` with any backend but sqlite
+
+    """
+    if workers and Backends(backend) != Backends.sqlite:
+        raise exceptions.UnsafeBackend(
+            '{} worker processes need [ProsperBot] storage_backend = sqlite, not {}'.format(
+                workers, Backends(backend).value))
+
+def team_collection(collection_name, team_id=None):
+    """namespace a collection per chat workspace
+
+    Args:
+        collection_name (str): base collection name
+        team_id (str, optional): workspace id; None keeps the shared collection
+
+    Returns:
+        (str): collection name to query
+
+    """
+    if not team_id:
+        return collection_name
+    return '{}-{}'.format(collection_name, team_id)
+
 CHANNEL_COLLECTION = 'channel_settings'
 DEFAULT_MODE = Modes.stocks
 def check_channel_mode(
@@ -131,12 +183,82 @@ def set_channel_mode(
     return set_mode
 
 
+WATCHLIST_COLLECTION = 'watchlists'
+def get_watchlist(
+        channel_name,
+        db_conn,
+        watchlist_kind=Modes.stocks,
+        watchlist_collection=WATCHLIST_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """tickers a channel keeps an eye on
+
+    Args:
+        channel_name (str): name of channel (guid > pretty-string)
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        watchlist_kind (:obj:`Enum`, optional): stocks or coins list
+        watchlist_collection (str, optional): name of collection to query
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): tickers, in the order they were added
+
+    """
+    logger.info('Checking %s watchlist for %s', Modes(watchlist_kind).value, channel_name)
+    watchlist = db_conn[watchlist_collection].find_one({
+        'channel_name': channel_name,
+        'watchlist_kind': Modes(watchlist_kind).value,
+    })
+    return list(watchlist['tickers']) if watchlist else []
+
+def set_watchlist(
+        channel_name,
+        tickers,
+        user_name,
+        db_conn,
+        watchlist_kind=Modes.stocks,
+        watchlist_collection=WATCHLIST_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """replace a channel's watchlist
+
+    Args:
+        channel_name (str): name of channel (guid > pretty-string)
+        tickers (:obj:`list`): tickers to watch (empty clears the list)
+        user_name (str): who is changing the list
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        watchlist_kind (:obj:`Enum`, optional): stocks or coins list
+        watchlist_collection (str, optional): name of collection to write
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): tickers now watched
+
+    """
+    watchlist_kind = Modes(watchlist_kind).value
+    logger.info('Setting %s watchlist for %s: %s', watchlist_kind, channel_name, tickers)
+    db_conn[watchlist_collection].delete_many({
+        'channel_name': channel_name,
+        'watchlist_kind': watchlist_kind,
+    })
+    if tickers:
+        db_conn[watchlist_collection].insert_one({
+            'channel_name': channel_name,
+            'watchlist_kind': watchlist_kind,
+            'tickers': list(tickers),
+            'watchlist_set_time': datetime.utcnow().isoformat(),
+            'user_name': user_name
+        })
+    return list(tickers)
+
+
 COOLDOWN_COLLECTION = 'cooldown'
 def cooldown(
         element_name,
         db_conn,
         cooldown_time=30,
         cooldown_collection=COOLDOWN_COLLECTION,
+        cooldown_cache=None,
         logger=api_config.LOGGER
 ):
     """avoids spam by shushing for ``cooldown_time`` seconds
@@ -146,6 +268,8 @@ def cooldown(
         db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
         cooldown_time (int, optional): time to shut up (seconds)
         cooldown_collection (str, optional): name of collection to track cache
+        cooldown_cache (:obj:`caching.TTLCache`, optional): in-memory (shareable)
+            timers to use instead of ``db_conn`` (keyed by collection + element)
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
@@ -158,6 +282,12 @@ def cooldown(
         return
 
     logger.info('--checking cooldown cache for %s', element_name)
+    if cooldown_cache is not None:
+        return cooldown_cache.touch(
+            '{}/{}'.format(cooldown_collection, element_name),
+            ttl=cooldown_time
+        )
+
     cache_element = db_conn[cooldown_collection].find_one({'element_name': element_name})
 
     sleep_time = cooldown_time
@@ -176,3 +306,252 @@ def cooldown(
     })
 
     return False
+
+
+ALERT_COLLECTION = 'price_alerts'
+def add_alert(
+        alert,
+        db_conn,
+        alert_collection=ALERT_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """persist a price alert
+
+    Args:
+        alert (dict): alert document (see ``alerts.new_alert()``)
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        alert_collection (str, optional): name of collection to write
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    logger.info('--saving alert %s', alert['alert_id'])
+    db_conn[alert_collection].insert_one(dict(alert))
+
+def find_alerts(
+        db_conn,
+        alert_collection=ALERT_COLLECTION,
+        logger=api_config.LOGGER,
+        **filter
+):
+    """load price alerts
+
+    Args:
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        alert_collection (str, optional): name of collection to query
+        logger (:obj:`logging.logger`, optional): logging handle
+        filter (dict): equality filter (``ticker='MU'``...); empty for every alert
+
+    Returns:
+        (:obj:`list`): alert documents
+
+    """
+    logger.info('--loading alerts %s', filter)
+    return [
+        {key: value for key, value in alert.items() if key != '_id'}
+        for alert in db_conn[alert_collection].find(filter)
+    ]
+
+def remove_alert(
+        alert_id,
+        db_conn,
+        alert_collection=ALERT_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """delete a price alert
+
+    Args:
+        alert_id (str): alert to delete
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        alert_collection (str, optional): name of collection to write
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    logger.info('--removing alert %s', alert_id)
+    db_conn[alert_collection].delete_many({'alert_id': alert_id})
+
+
+DIGEST_COLLECTION = 'digest_subscriptions'
+def set_digest_subscription(
+        channel,
+        subscribed,
+        db_conn,
+        digest_kind=Modes.stocks,
+        digest_collection=DIGEST_COLLECTION,
+        logger=api_config.LOGGER,
+        **routing
+):
+    """subscribe a channel to (or drop it from) scheduled digests
+
+    Args:
+        channel (str): channel to post into
+        subscribed (bool): True to subscribe, False to unsubscribe
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        digest_kind (:obj:`Enum`, optional): digest the channel's stocks or coins watchlist
+        digest_collection (str, optional): name of collection to write
+        logger (:obj:`logging.logger`, optional): logging handle
+        routing (dict): platform routing (``team_id``, ``shard_id``, ``watchlist_collection``...)
+
+    """
+    digest_kind = Modes(digest_kind).value
+    logger.info('Setting %s digest for %s: %s', digest_kind, channel, subscribed)
+    db_conn[digest_collection].delete_many({'channel': channel, 'digest_kind': digest_kind})
+    if subscribed:
+        subscription = {
+            'channel': channel,
+            'digest_kind': digest_kind,
+            'subscribed': datetime.utcnow().isoformat(),
+        }
+        subscription.update(routing)
+        db_conn[digest_collection].insert_one(subscription)
+
+def find_digest_subscriptions(
+        db_conn,
+        digest_collection=DIGEST_COLLECTION,
+        logger=api_config.LOGGER
+):
+    """every channel subscribed to digests
+
+    Args:
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        digest_collection (str, optional): name of collection to query
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): subscription documents
+
+    """
+    logger.info('--loading digest subscriptions')
+    return [
+        {key: value for key, value in subscription.items() if key != '_id'}
+        for subscription in db_conn[digest_collection].find({})
+    ]
+
+
+class SQLiteCollection(object):
+    """tinymongo-style collection stored as JSON documents in one sqlite table
+
+    Notes:
+        supports the subset bot commands use: equality filters with
+        ``find``/``find_one``/``insert_one``/``insert_many``/``delete_many``.
+        Filters on the collection's ``key_field`` use an index; anything else scans
+
+    Args:
+        database (:obj:`SQLiteDatabase`): parent database
+        name (str): collection/table name
+        key_field (str, optional): document field to index
+
+    """
+    def __init__(self, database, name, key_field=None):
+        self.database = database
+        self.name = name
+        self.key_field = key_field
+        self._table = '"{}"'.format(name.replace('"', '""'))
+        with self.database.lock:
+            self.database.conn.execute(
+                'CREATE TABLE IF NOT EXISTS {} '
+                '(_id INTEGER PRIMARY KEY, key TEXT, doc TEXT)'.format(self._table))
+            self.database.conn.execute(
+                'CREATE INDEX IF NOT EXISTS "{}" ON {} (key)'.format(
+                    (name + '_key').replace('"', '""'), self._table))
+            self.database.conn.commit()
+
+    def _select(self, filter):
+        """(_id, document) pairs matching an equality filter"""
+        filter = filter or {}
+        with self.database.lock:
+            if self.key_field and self.key_field in filter:
+                rows = self.database.conn.execute(
+                    'SELECT _id, doc FROM {} WHERE key = ?'.format(self._table),
+                    (str(filter[self.key_field]),)
+                ).fetchall()
+            else:
+                rows = self.database.conn.execute(
+                    'SELECT _id, doc FROM {}'.format(self._table)).fetchall()
+
+        matches = []
+        for row_id, raw_doc in rows:
+            doc = json.loads(raw_doc)
+            if all(doc.get(field) == value for field, value in filter.items()):
+                matches.append((row_id, doc))
+        return matches
+
+    def find(self, filter=None):
+        """list every document matching ``filter``"""
+        return [doc for _, doc in self._select(filter)]
+
+    def find_one(self, filter=None):
+        """first document matching ``filter`` (or None)"""
+        matches = self._select(filter)
+        return matches[0][1] if matches else None
+
+    def insert_many(self, docs):
+        """store documents
+
+        Returns:
+            (int): documents stored
+
+        """
+        rows = [
+            (None if self.key_field is None else str(doc.get(self.key_field)), json.dumps(doc))
+            for doc in docs
+        ]
+        with self.database.lock:
+            self.database.conn.executemany(
+                'INSERT INTO {} (key, doc) VALUES (?, ?)'.format(self._table), rows)
+            self.database.conn.commit()
+        return len(rows)
+
+    def insert_one(self, doc):
+        """store a document"""
+        return self.insert_many([doc])
+
+    def delete_many(self, filter):
+        """remove every document matching ``filter``
+
+        Returns:
+            (int): documents removed
+
+        """
+        row_ids = [(row_id,) for row_id, _ in self._select(filter)]
+        with self.database.lock:
+            self.database.conn.executemany(
+                'DELETE FROM {} WHERE _id = ?'.format(self._table), row_ids)
+            self.database.conn.commit()
+        return len(row_ids)
+
+    def count(self):
+        """number of documents stored"""
+        with self.database.lock:
+            return self.database.conn.execute(
+                'SELECT COUNT(*) FROM {}'.format(self._table)).fetchone()[0]
+
+
+class SQLiteDatabase(object):
+    """tinymongo-style database backed by one sqlite file
+
+    Args:
+        db_path (str): path to sqlite file
+
+    """
+    KEY_FIELDS = {
+        CHANNEL_COLLECTION: 'channel_name',
+        COOLDOWN_COLLECTION: 'element_name',
+        WATCHLIST_COLLECTION: 'channel_name',
+        ALERT_COLLECTION: 'alert_id',
+        DIGEST_COLLECTION: 'channel',
+    }
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            base_name = name.split('-')[0]  # team_collection() namespaces share key fields
+            self._collections[name] = SQLiteCollection(
+                self, name, key_field=self.KEY_FIELDS.get(base_name))
+        return self._collections[name]
@@ -0,0 +1,357 @@
+"""digest.py: scheduled market digests, computed once and posted to many channels
+
+Notes:
+    a run loads every subscription, quotes the union of the subscribed
+    watchlists in one batched call per kind and scores news once per ticker.
+    Each channel's digest is then rendered from those shared results, so a
+    ticker on fifty watchlists costs one quote and one sentiment pass.  Posts
+    go out through a ``TokenBucket`` so a big fan-out stays inside platform
+    rate limits
+
+"""
+from os import path
+from datetime import datetime, time as day_time, timedelta
+import threading
+import time
+
+from . import commands
+from . import connections
+from . import market_hours
+from . import metrics
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+SESSIONS = (('open', (9, 35)), ('midday', (12, 30)), ('close', (16, 5)))  # US/Eastern
+
+def parse_sessions(text):
+    """read ``open=09:35,midday=12:30,close=16:05``
+
+    Args:
+        text (str): comma separated ``label=HH:MM`` (US/Eastern)
+
+    Returns:
+        (:obj:`tuple`): ``(label, (hour, minute))`` pairs, earliest first
+
+    """
+    sessions = []
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        label, _, clock_time = item.partition('=')
+        hour, minute = clock_time.strip().split(':')
+        sessions.append((label.strip(), (int(hour), int(minute))))
+    return tuple(sorted(sessions, key=lambda session: session[1]))
+
+def next_run(timestamp, sessions=SESSIONS):
+    """next digest slot on a trading day
+
+    Args:
+        timestamp (float): epoch seconds to search from
+        sessions (:obj:`tuple`): ``(label, (hour, minute))`` pairs, earliest first
+
+    Returns:
+        (:obj:`tuple`): ``(epoch seconds, label)``, or ``(None, None)`` without sessions
+
+    """
+    day = market_hours.to_eastern(timestamp).date()
+    for _ in range(14):
+        if sessions and market_hours.is_trading_day(day):
+            for label, (hour, minute) in sessions:
+                run_at = market_hours.from_eastern(
+                    datetime.combine(day, day_time(hour, minute)))
+                if run_at > timestamp:
+                    return run_at, label
+        day += timedelta(days=1)
+    return None, None
+
+
+class TokenBucket(object):
+    """outbound message budget: ``rate`` posts a second, bursts of ``burst``
+
+    Args:
+        rate (float, optional): sustained posts per second
+        burst (int, optional): posts allowed back to back
+        clock (:obj:`callable`, optional): monotonic clock
+        sleep (:obj:`callable`, optional): how to wait
+
+    """
+    def __init__(self, rate=1.0, burst=5, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._as_of = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._as_of) * self.rate)
+        self._as_of = now
+
+    def acquire(self):
+        """block until one post fits the budget
+
+        Returns:
+            (float): seconds spent waiting
+
+        """
+        with self._lock:
+            self._refill()
+            waited = 0.0
+            if self._tokens < 1:
+                waited = (1 - self._tokens) / self.rate
+                self._sleep(waited)
+                self._refill()
+            self._tokens -= 1
+            return waited
+
+
+def gather(
+        subscriptions,
+        db_conn,
+        currency='USD',
+        news=True,
+        logger=api_config.LOGGER
+):
+    """everything any subscribed channel needs, fetched once
+
+    Args:
+        subscriptions (:obj:`list`): subscription documents
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        currency (str, optional): currency coins are priced in
+        news (bool, optional): score news for stock tickers
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): ``(subscription, tickers)`` per subscription
+        (:obj:`dict`): kind: ``commands.basket_table()`` for the union of tickers
+        (:obj:`dict`): ticker: best article url for the way it moved
+
+    """
+    watchlists = []
+    union = {}
+    for subscription in subscriptions:
+        kind = subscription['digest_kind']
+        tickers = connections.get_watchlist(
+            subscription['channel'], db_conn, watchlist_kind=kind,
+            watchlist_collection=subscription.get(
+                'watchlist_collection', connections.WATCHLIST_COLLECTION),
+            logger=logger
+        )
+        watchlists.append((subscription, tickers))
+        members = union.setdefault(kind, set())
+        members.update(tickers)
+
+    tables = {}
+    for kind, tickers in union.items():
+        if not tickers:
+            continue
+        with metrics.timer('digest.fetch'):
+            quote_df = commands.fetch_basket(
+                sorted(tickers), kind=kind, currency=currency, logger=logger)
+        if not quote_df.empty:
+            tables[kind] = commands.basket_table(quote_df, kind=kind)
+
+    headlines = {}
+    if news and 'stocks' in tables:
+        with metrics.timer('digest.sentiment'):
+            for row in tables['stocks'].itertuples(index=False):
+                url, score = commands.stock_news(row.symbol, row.change_pct, logger=logger)
+                if score:  # '' when there was no news or no move
+                    headlines[row.symbol] = url
+    return watchlists, tables, headlines
+
+def render(label, kind, tickers, table, headlines, movers=3):
+    """one channel's digest
+
+    Args:
+        label (str): which digest (``open``, ``midday``...)
+        kind (str): ``stocks`` or ``coins``
+        tickers (:obj:`list`): the channel's watchlist
+        table (:obj:`pandas.DataFrame`): shared ``commands.basket_table()`` (or None)
+        headlines (:obj:`dict`): ticker: article url
+        movers (int, optional): biggest movers to attach news for
+
+    Returns:
+        (str): message body
+
+    """
+    lines = ['{} {} digest'.format(label, kind)]
+    if table is None:
+        lines.append('unable to quote {}'.format(', '.join(tickers)))
+        return '\n'.join(lines)
+    lines.append(commands.render_basket(table, tickers))
+
+    channel_table = table[table['symbol'].isin([ticker.upper() for ticker in tickers])]
+    ranked = channel_table.reindex(
+        channel_table['change_pct'].abs().sort_values(ascending=False).index)
+    shown = 0
+    for row in ranked.itertuples(index=False):
+        if shown >= movers:
+            break
+        if row.symbol in headlines:
+            lines.append('{:<6} {:>+7.2f}% {}'.format(
+                row.symbol, row.change_pct, headlines[row.symbol]))
+            shown += 1
+    return '\n'.join(lines)
+
+
+class DigestScheduler(object):
+    """posts digests to every subscribed channel at each session slot
+
+    Args:
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        send (:obj:`callable`): ``send(subscription, text)`` posts one digest
+        owns (:obj:`callable`, optional): ``owns(subscription)``; False leaves it to another process
+        sessions (:obj:`tuple`, optional): ``(label, (hour, minute))`` slots, US/Eastern
+        currency (str, optional): currency coins are priced in
+        news (bool, optional): attach news for the biggest movers
+        movers (int, optional): movers per digest to attach news for
+        bucket (:obj:`TokenBucket`, optional): outbound budget
+        digest_collection (str, optional): collection subscriptions live in
+        clock (:obj:`callable`, optional): wall-clock source
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            db_conn,
+            send,
+            owns=None,
+            sessions=SESSIONS,
+            currency='USD',
+            news=True,
+            movers=3,
+            bucket=None,
+            digest_collection=connections.DIGEST_COLLECTION,
+            clock=time.time,
+            logger=api_config.LOGGER
+    ):
+        self.db_conn = db_conn
+        self.send = send
+        self.owns = owns or (lambda subscription: True)
+        self.sessions = sessions
+        self.currency = currency
+        self.news = news
+        self.movers = movers
+        self.bucket = bucket or TokenBucket()
+        self.digest_collection = digest_collection
+        self._clock = clock
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, label='digest'):
+        """build and post one round of digests
+
+        Args:
+            label (str, optional): which digest this is
+
+        Returns:
+            (int): digests posted
+
+        """
+        subscriptions = [
+            subscription for subscription in connections.find_digest_subscriptions(
+                self.db_conn, digest_collection=self.digest_collection, logger=self.logger)
+            if self.owns(subscription)
+        ]
+        if not subscriptions:
+            return 0
+
+        with metrics.timer('digest.build'):
+            watchlists, tables, headlines = gather(
+                subscriptions, self.db_conn, currency=self.currency,
+                news=self.news, logger=self.logger
+            )
+
+        sent = 0
+        for subscription, tickers in watchlists:
+            if not tickers:
+                continue
+            kind = subscription['digest_kind']
+            text = render(
+                label, kind, tickers, tables.get(kind), headlines, movers=self.movers)
+            waited = self.bucket.acquire()
+            if waited:
+                metrics.REGISTRY.incr('digest.throttled')
+            try:
+                self.send(subscription, text)
+            except Exception:
+                self.logger.error(
+                    'unable to post digest to %s', subscription['channel'], exc_info=True)
+                metrics.REGISTRY.error('digest.send')
+                continue
+            sent += 1
+
+        self.logger.info('--posted %s %s digests', sent, label)
+        metrics.REGISTRY.incr('digest.sent', sent)
+        return sent
+
+    def _run(self):
+        while True:
+            run_at, label = next_run(self._clock(), self.sessions)
+            if run_at is None or self._stop.wait(max(run_at - self._clock(), 0)):
+                return
+            try:
+                self.run_once(label)
+            except Exception:  # pragma: no cover
+                self.logger.error('%s digest failed', label, exc_info=True)
+
+    def start(self):
+        """post digests on a daemon thread until ``stop()``"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='digest', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """stop the scheduler thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def start_from_config(config, db_conn, send, owns=None, logger=api_config.LOGGER):
+    """start a digest scheduler if ``[Digest] sessions`` is set
+
+    Notes:
+        keys: ``sessions``, ``news``, ``movers``, ``messages_per_second``, ``burst``
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        db_conn (:obj:`tinymongo.TinyMongoDatabase`): database to use
+        send (:obj:`callable`): ``send(subscription, text)`` posts one digest
+        owns (:obj:`callable`, optional): ``owns(subscription)`` filter (sharded workers)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`DigestScheduler`): running scheduler, or None when disabled
+
+    """
+    sessions = parse_sessions(config.get_option('Digest', 'sessions', None, ''))
+    if not sessions:
+        return None
+
+    scheduler = DigestScheduler(
+        db_conn,
+        send,
+        owns=owns,
+        sessions=sessions,
+        currency=config.get_option('ProsperBot', 'currency', None, 'USD'),
+        news=config.get_option('Digest', 'news', None, 'True') == 'True',
+        movers=int(config.get_option('Digest', 'movers', None, 3)),
+        bucket=TokenBucket(
+            rate=float(config.get_option('Digest', 'messages_per_second', None, 1)),
+            burst=int(config.get_option('Digest', 'burst', None, 5))
+        ),
+        logger=logger
+    )
+    logger.info(
+        'Posting digests at %s (US/Eastern)',
+        ', '.join('{}={:02d}:{:02d}'.format(label, *clock) for label, clock in sessions)
+    )
+    return scheduler.start()
@@ -9,6 +9,27 @@ class ConnectionsException(ProsperBotException):
 class TooManyOptions(ConnectionsException):
     """bot is confused, can't pick the right option out of many"""
     pass
+class UnsafeBackend(ConnectionsException):
+    """storage backend can't take writes from several processes"""
+    pass
 class EmptyQuoteReturned(ProsperBotException):
     """expected quote data, got back nothing.  Don't go forward"""
     pass
+class UpstreamException(ProsperBotException):
+    """class for prosper_bots.upstream"""
+    pass
+class RecordingNotFound(UpstreamException, KeyError):
+    """recorded stand-in has no payload for request (acts like a missing feed)"""
+    pass
+class InjectedUpstreamError(UpstreamException):
+    """recorded stand-in was told to fail this request"""
+    pass
+class UnknownCurrency(UpstreamException):
+    """no FX rate for the requested currency"""
+    pass
+class ProfilerBusy(ProsperBotException, RuntimeError):
+    """profiler is running, or cooling down after the last profile"""
+    pass
+
+class InsecureEndpoint(ProsperBotException, ValueError):
+    """events-API endpoint would accept unsigned requests"""
@@ -0,0 +1,192 @@
+"""fx.py: price coins once in a base currency and convert locally
+
+Notes:
+    rates are "units of currency per 1 ``BASE``" and live in
+    ``caching.QUOTES`` under ``FX-<BASE>``, so sharded workers share them and
+    cache snapshots keep them warm.  One upstream call refreshes every
+    currency anyone has asked for; conversions of a whole coin x currency
+    grid are a single outer product
+
+"""
+from os import path
+import threading
+import time
+
+from . import caching
+from . import exceptions
+from . import metrics
+from . import upstream
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+BASE = 'USD'
+RATE_TTL = 3600
+CURRENCIES = {'USD', 'EUR', 'GBP', 'JPY'}  # grows with every currency asked for
+PRICE_FIELDS = ('last', 'open', 'high', 'low')  # coin quote fields priced in a currency
+
+def _rate_key(base):
+    return 'FX-{}'.format(base)
+
+def _bad_key(base, currency):
+    return 'FX-{}-{}'.format(base, currency)
+
+def refresh(base=BASE, ttl=RATE_TTL, extra=(), logger=api_config.LOGGER):
+    """fetch rates for every known currency in one call
+
+    Args:
+        base (str, optional): currency rates are quoted from
+        ttl (float, optional): seconds before rates are refetched
+        extra (:obj:`list`, optional): new currencies to try (kept if upstream prices them)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`dict`): currency: rate (``base`` is 1.0)
+
+    """
+    wanted = sorted((CURRENCIES | set(extra)) - {base})
+    table = dict(upstream.fx_rates(base, wanted, logger=logger)) if wanted else {}
+    table[base] = 1.0
+    CURRENCIES.update(currency for currency in extra if currency in table)
+    caching.QUOTES.set(_rate_key(base), table, ttl=ttl)
+    logger.info('--refreshed %s fx rates from %s', len(table), base)
+    return table
+
+def rates(currencies, base=BASE, ttl=RATE_TTL, logger=api_config.LOGGER):
+    """rate vector for ``currencies``, refreshing when stale or missing one
+
+    Args:
+        currencies (:obj:`list`): currencies wanted, in output order
+        base (str, optional): currency rates are quoted from
+        ttl (float, optional): seconds before rates are refetched
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`numpy.ndarray`): units of each currency per 1 ``base``
+
+    Raises:
+        UnknownCurrency: upstream doesn't price one of ``currencies`` (remembered
+            in ``caching.BAD_SYMBOLS`` for ``ttl``, so typos don't refetch every time)
+
+    """
+    import numpy as np  # deferred: keep bot startup light
+
+    currencies = [currency.upper() for currency in currencies]
+    known = caching.QUOTES.get(_rate_key(base)) or {}
+    missing = [currency for currency in currencies if currency not in known]
+    known_bad = [
+        currency for currency in missing if _bad_key(base, currency) in caching.BAD_SYMBOLS
+    ]
+    if known_bad:
+        metrics.REGISTRY.incr('fx.known_bad')
+        raise exceptions.UnknownCurrency('no {} rate for {}'.format(base, ', '.join(known_bad)))
+    if missing:
+        known = refresh(base=base, ttl=ttl, extra=currencies, logger=logger)
+    missing = [currency for currency in currencies if currency not in known]
+    if missing:
+        logger.info('--remembering unknown currencies %s', ', '.join(missing))
+        for currency in missing:
+            caching.BAD_SYMBOLS.set(_bad_key(base, currency), True, ttl=ttl)
+        raise exceptions.UnknownCurrency('no {} rate for {}'.format(base, ', '.join(missing)))
+    return np.array([known[currency] for currency in currencies], dtype=float)
+
+def matrix(currencies, base=BASE, logger=api_config.LOGGER):
+    """cross rates between every pair of ``currencies``
+
+    Args:
+        currencies (:obj:`list`): currencies, in row/column order
+        base (str, optional): currency rates are quoted from
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`numpy.ndarray`): ``[i, j]`` = units of ``currencies[j]`` per 1 ``currencies[i]``
+
+    """
+    vector = rates(currencies, base=base, logger=logger)
+    return vector[None, :] / vector[:, None]
+
+def convert(prices, from_currency, currencies, base=BASE, logger=api_config.LOGGER):
+    """reprice a vector of prices into many currencies at once
+
+    Args:
+        prices (:obj:`list`): prices quoted in ``from_currency`` (one per coin)
+        from_currency (str): currency ``prices`` are in
+        currencies (:obj:`list`): currencies wanted
+        base (str, optional): currency rates are quoted from
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`numpy.ndarray`): ``len(prices) x len(currencies)`` grid
+
+    """
+    import numpy as np
+
+    currencies = [currency.upper() for currency in currencies]
+    factors = matrix(
+        [from_currency.upper()] + currencies, base=base, logger=logger)[0, 1:]
+    return np.outer(np.asarray(prices, dtype=float), factors)
+
+def convert_quote(quote, from_currency, currency, base=BASE, logger=api_config.LOGGER):
+    """copy of a coin quote with its price fields in another currency
+
+    Args:
+        quote (:obj:`records.CoinQuote`): coin quote priced in ``from_currency``
+        from_currency (str): currency ``quote`` is in
+        currency (str): currency wanted
+        base (str, optional): currency rates are quoted from
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`records.CoinQuote`): converted quote (``change_pct`` is left as quoted)
+
+    """
+    factor = matrix([from_currency, currency], base=base, logger=logger)[0, 1]
+    converted = quote.copy()
+    for field in PRICE_FIELDS:
+        if field in quote:
+            converted[field] = round(float(quote[field]) * factor, 8)
+    return converted
+
+def convert_frame(quote_df, from_currency, currency, base=BASE, logger=api_config.LOGGER):
+    """copy of a coin quote table with its price columns in another currency
+
+    Args:
+        quote_df (:obj:`pandas.DataFrame`): coin quotes priced in ``from_currency``
+        from_currency (str): currency ``quote_df`` is in
+        currency (str): currency wanted
+        base (str, optional): currency rates are quoted from
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): converted quotes
+
+    """
+    factor = matrix([from_currency, currency], base=base, logger=logger)[0, 1]
+    fields = [field for field in PRICE_FIELDS if field in quote_df]
+    converted = quote_df.copy()
+    converted[fields] = quote_df[fields].astype(float) * factor
+    return converted
+
+def start_refresher(interval=RATE_TTL / 2, base=BASE, logger=api_config.LOGGER):
+    """refresh rates in the background so quote replies never wait on them
+
+    Args:
+        interval (float, optional): seconds between refreshes (keep under ``RATE_TTL``)
+        base (str, optional): currency rates are quoted from
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`threading.Thread`): refresher
+
+    """
+    def run():
+        while True:
+            try:
+                refresh(base=base, logger=logger)
+            except Exception:
+                logger.warning('unable to refresh fx rates', exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='fx-refresh', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,294 @@
+"""history.py: local store of daily closes, topped up from upstream only when stale
+
+Notes:
+    one ``.npy`` file per ticker holding ``(day, close)`` records (days since
+    the epoch), completed sessions only.  A request for N sessions fetches
+    just the sessions after the last stored one (or the whole window when
+    the store doesn't reach back far enough), tickers in parallel, and each
+    (ticker, session) is asked for at most once per process.  Coins are kept
+    in USD (UTC days), stocks per NYSE session
+
+"""
+from os import path
+from datetime import date, datetime, timedelta
+import concurrent.futures
+import os
+import threading
+import time
+
+from . import market_hours
+from . import metrics
+from . import upstream
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+HISTORY_PATH = path.join(HERE, 'cache', 'history')
+DTYPE = [('day', '<i4'), ('close', '<f8')]
+EPOCH_DAY = date(1970, 1, 1)
+MAX_DAYS = 365
+
+def last_close_day(kind='stocks', timestamp=None):
+    """latest session whose close is final
+
+    Args:
+        kind (str, optional): ``stocks`` (NYSE sessions) or ``coins`` (UTC days)
+        timestamp (float, optional): epoch seconds (default now)
+
+    Returns:
+        (:obj:`datetime.date`): that session's day
+
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    if kind != 'stocks':
+        return datetime.utcfromtimestamp(timestamp).date() - timedelta(days=1)
+
+    eastern = market_hours.to_eastern(timestamp)
+    day = eastern.date()
+    close = market_hours.EARLY_CLOSE if day in market_hours.early_closes(day.year) \
+        else market_hours.REGULAR_CLOSE
+    if eastern < datetime.combine(day, datetime.min.time()).replace(
+            hour=close[0], minute=close[1]):
+        day -= timedelta(days=1)
+    while not market_hours.is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+def sessions(kind, as_of, days):
+    """the ``days`` sessions ending on ``as_of``
+
+    Args:
+        kind (str): ``stocks`` or ``coins``
+        as_of (:obj:`datetime.date`): last session
+        days (int): sessions wanted
+
+    Returns:
+        (:obj:`list`): session days, oldest first
+
+    """
+    wanted = []
+    day = as_of
+    while len(wanted) < days:
+        if kind != 'stocks' or market_hours.is_trading_day(day):
+            wanted.append(day)
+        day -= timedelta(days=1)
+    return wanted[::-1]
+
+def _day_number(day):
+    return (day - EPOCH_DAY).days
+
+
+class HistoryStore(object):
+    """daily closes per (kind, ticker) under one directory
+
+    Args:
+        root (str, optional): directory holding ``<kind>/<TICKER>.npy`` files
+        max_workers (int, optional): tickers fetched at once (upstream caps calls too)
+
+    """
+    def __init__(self, root=HISTORY_PATH, max_workers=upstream.MAX_CONCURRENT):
+        self.root = root
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._series = {}
+        self._asked = {}  # (kind, ticker): (first day, last day) already asked of upstream
+
+    def series_path(self, kind, ticker):
+        """(str): file backing a ticker's closes"""
+        return path.join(self.root, kind, '{}.npy'.format(ticker.upper()))
+
+    def load(self, kind, ticker):
+        """stored closes for a ticker (empty if never fetched)
+
+        Returns:
+            (:obj:`numpy.ndarray`): ``day``/``close`` records, oldest first
+
+        """
+        import numpy as np
+
+        key = (kind, ticker.upper())
+        with self._lock:
+            series = self._series.get(key)
+        if series is None:
+            series_path = self.series_path(kind, ticker)
+            if path.isfile(series_path):
+                series = np.load(series_path)
+            else:
+                series = np.zeros(0, dtype=DTYPE)
+            with self._lock:
+                series = self._series.setdefault(key, series)
+        return series
+
+    def merge(self, kind, ticker, rows, as_of):
+        """fold fetched ``(YYYY-MM-DD, close)`` rows into a ticker's closes
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            ticker (str): ticker fetched
+            rows (:obj:`list`): ``upstream.daily_closes()`` result
+            as_of (:obj:`datetime.date`): sessions after this are still open and dropped
+
+        Returns:
+            (:obj:`numpy.ndarray`): merged closes
+
+        """
+        import numpy as np
+
+        fetched = np.array([
+            (_day_number(datetime.strptime(day, '%Y-%m-%d').date()), close)
+            for day, close in rows
+        ], dtype=DTYPE)
+        fetched = fetched[fetched['day'] <= _day_number(as_of)]
+
+        stored = self.load(kind, ticker)
+        merged = np.concatenate([stored[~np.isin(stored['day'], fetched['day'])], fetched])
+        merged = merged[np.argsort(merged['day'], kind='stable')]
+
+        series_path = self.series_path(kind, ticker)
+        os.makedirs(path.dirname(series_path), exist_ok=True)
+        scratch_path = '{}.{}.tmp'.format(series_path, os.getpid())
+        with open(scratch_path, 'wb') as scratch_fh:
+            np.save(scratch_fh, merged)
+        os.replace(scratch_path, series_path)  # readers never see half a file
+
+        with self._lock:
+            self._series[(kind, ticker.upper())] = merged
+        return merged
+
+    def _to_fetch(self, kind, ticker, window):
+        """sessions to ask upstream for (0 = the store already covers ``window``)"""
+        stored = self.load(kind, ticker)
+        first, last = _day_number(window[0]), _day_number(window[-1])
+        if self._asked.get((kind, ticker)) == (first, last):
+            return 0  # asked already; whatever upstream lacked, it still lacks
+        if not len(stored) or stored['day'][0] > first:
+            newer = window
+        else:
+            newer = [day for day in window if _day_number(day) > stored['day'][-1]]
+        return len(newer) + 1 if newer else 0  # +1: upstream's latest row may still be open
+
+    def closes(self, kind, tickers, days, as_of=None, logger=api_config.LOGGER):
+        """the latest ``days`` closes for each ticker, fetching only what's missing
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            tickers (:obj:`list`): tickers wanted
+            days (int): sessions wanted
+            as_of (:obj:`datetime.date`, optional): last session (default ``last_close_day()``)
+            logger (:obj:`logging.logger`, optional): logging handle
+
+        Returns:
+            (:obj:`dict`): ticker: ``day``/``close`` records in the window
+                (tickers upstream had no history for are left out)
+
+        """
+        as_of = as_of or last_close_day(kind)
+        window = sessions(kind, as_of, days)
+        tickers = [ticker.upper() for ticker in tickers]
+        stale = {}
+        for ticker in tickers:
+            count = self._to_fetch(kind, ticker, window)
+            if count:
+                stale[ticker] = count
+
+        if stale:
+            logger.info('Fetching %s daily history for %s', kind, ', '.join(sorted(stale)))
+            metrics.REGISTRY.incr('history.fetch', len(stale))
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(stale))) as pool:
+                futures = {
+                    pool.submit(
+                        upstream.daily_closes, ticker, kind=kind, days=count, logger=logger
+                    ): ticker
+                    for ticker, count in stale.items()
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    ticker = futures[future]
+                    try:
+                        self.merge(kind, ticker, future.result(), as_of)
+                    except Exception:
+                        logger.warning('unable to fetch history for %s', ticker, exc_info=True)
+                        continue
+                    self._asked[(kind, ticker)] = (
+                        _day_number(window[0]), _day_number(window[-1]))
+        else:
+            metrics.REGISTRY.incr('history.cache_hit')
+
+        first, last = _day_number(window[0]), _day_number(window[-1])
+        found = {}
+        for ticker in tickers:
+            series = self.load(kind, ticker)
+            series = series[(series['day'] >= first) & (series['day'] <= last)]
+            if len(series):
+                found[ticker] = series
+        return found
+
+
+STORE = HistoryStore()
+
+def configure(config, logger=api_config.LOGGER):
+    """keep daily history under ``[ProsperBot] history_path``
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`HistoryStore`): store in use
+
+    """
+    global STORE
+    root = config.get_option('ProsperBot', 'history_path', None, '') or HISTORY_PATH
+    logger.info('Keeping daily history in %s', root)
+    STORE = HistoryStore(root)
+    return STORE
+
+def align(closes, tickers=None):
+    """line closes up on the sessions every ticker traded
+
+    Args:
+        closes (:obj:`dict`): ticker: ``day``/``close`` records
+        tickers (:obj:`list`, optional): column order (default sorted; missing ones skipped)
+
+    Returns:
+        (:obj:`list`): tickers, in column order
+        (:obj:`numpy.ndarray`): shared days
+        (:obj:`numpy.ndarray`): ``days x tickers`` closes
+
+    """
+    import numpy as np
+    from functools import reduce
+
+    tickers = [ticker for ticker in (tickers or sorted(closes)) if ticker in closes]
+    if not tickers:
+        return [], np.zeros(0, dtype='<i4'), np.zeros((0, 0))
+    days = reduce(np.intersect1d, [closes[ticker]['day'] for ticker in tickers])
+    prices = np.column_stack([
+        closes[ticker]['close'][np.searchsorted(closes[ticker]['day'], days)]
+        for ticker in tickers
+    ])
+    return tickers, days, prices
+
+def performance(prices):
+    """relative performance of every column at once
+
+    Args:
+        prices (:obj:`numpy.ndarray`): ``days x tickers`` closes, at least 2 days
+
+    Returns:
+        (:obj:`numpy.ndarray`): ``days x tickers`` growth of 1 (first day = 1.0)
+        (:obj:`numpy.ndarray`): total return per ticker
+        (:obj:`numpy.ndarray`): max drawdown per ticker (<= 0)
+        (:obj:`numpy.ndarray`): ``tickers x tickers`` correlation of daily returns
+
+    """
+    import numpy as np
+
+    normalized = prices / prices[0]
+    drawdown = (prices / np.maximum.accumulate(prices, axis=0) - 1.0).min(axis=0)
+    daily = np.diff(prices, axis=0) / prices[:-1]
+    if prices.shape[1] > 1 and len(daily) > 1:
+        correlation = np.atleast_2d(np.corrcoef(daily, rowvar=False))
+    else:
+        correlation = np.ones((prices.shape[1], prices.shape[1]))
+    return normalized, normalized[-1] - 1.0, drawdown, correlation
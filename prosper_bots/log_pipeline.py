@@ -0,0 +1,307 @@
+"""log_pipeline.py: move log I/O off the threads that answer chat
+
+Notes:
+    ``install_queue_logging()`` swaps a logger's handlers for one
+    ``QueueFanoutHandler``.  Each original handler gets its own bounded queue
+    and listener thread, so a slow webhook POST never holds up file writes and
+    ``logger.info()`` on the hot path only pays for a ``put_nowait()``.  When a
+    queue is full the record is dropped and counted (``logging.dropped``)
+
+"""
+from os import path
+import atexit
+import copy
+import logging
+import queue
+import threading
+
+from . import metrics
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+_STOP = object()
+WEBHOOK_MESSAGE_LIMIT = 1900  # prosper.common cuts discord posts past 2000 - 100 pad
+WEBHOOK_ATTRS = (  # prosper.common's HackySlackHandler / HackyDiscordHandler
+    'webhook_url',
+    'api_url', 'webhook_obj',
+)
+
+def _noop():
+    pass
+
+def is_webhook_handler(handler):
+    """(bool): handler POSTs every record to a chat webhook"""
+    return any(hasattr(handler, attr) for attr in WEBHOOK_ATTRS)
+
+
+class BatchingListener(object):
+    """drain one handler's queue on a background thread, a batch at a time
+
+    Notes:
+        stream/file handlers flush once per batch instead of once per record.
+        Webhook handlers (``is_webhook_handler()``) get as few combined
+        messages per batch as fit under ``WEBHOOK_MESSAGE_LIMIT``, instead of
+        one HTTP POST per record
+
+    Args:
+        handler (:obj:`logging.Handler`): real handler to feed
+        max_queue (int, optional): records buffered before dropping
+        batch_size (int, optional): most records handled per wakeup
+
+    """
+    def __init__(self, handler, max_queue=10000, batch_size=200):
+        self.handler = handler
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.queue = None
+        self._thread = None
+
+    @property
+    def level(self):
+        """(int): minimum level the wrapped handler wants"""
+        return self.handler.level
+
+    def start(self):
+        """(re)start the listener thread with an empty queue"""
+        self.queue = queue.Queue(self.max_queue)
+        self._thread = threading.Thread(
+            target=self._run,
+            name='log-{}'.format(type(self.handler).__name__),
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """flush what's queued then stop the listener thread"""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:  # pragma: no cover
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def enqueue(self, record):
+        """hand a record to the listener without ever blocking
+
+        Returns:
+            (bool): record was queued
+
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.REGISTRY.incr('logging.dropped')
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                try:
+                    self.handle_batch(records)
+                except Exception:  # pragma: no cover
+                    self.handler.handleError(records[-1])
+            if stopping:
+                return
+
+    def handle_batch(self, records):
+        """deliver a batch of records to the wrapped handler
+
+        Args:
+            records (:obj:`list`): prepared ``logging.LogRecord`` objects
+
+        """
+        handler = self.handler
+        if is_webhook_handler(handler) and len(records) > 1:
+            for merged in merge_records(records, handler):
+                handler.handle(merged)
+            return
+
+        if isinstance(handler, logging.StreamHandler):
+            handler.flush = _noop  # StreamHandler.emit() flushes every record
+            try:
+                for record in records:
+                    handler.handle(record)
+            finally:
+                del handler.flush
+            handler.flush()
+            return
+
+        for record in records:
+            handler.handle(record)
+
+
+def merge_records(records, handler, limit=WEBHOOK_MESSAGE_LIMIT):
+    """fold a batch into as few records as fit in one webhook message each
+
+    Notes:
+        webhook handlers truncate oversized messages, so a burst merged into
+        one record would lose everything past the limit.  Lines are packed in
+        order; a line longer than a whole message is split across several
+
+    Args:
+        records (:obj:`list`): prepared ``logging.LogRecord`` objects
+        handler (:obj:`logging.Handler`): handler whose formatter renders each message
+        limit (int, optional): most characters one rendered message may hold
+
+    Returns:
+        (:obj:`list`): combined records, each headed by its most severe entry
+
+    """
+    probe = _merged_record(records[0], '')
+    overhead = len(handler.format(probe)) + getattr(handler, 'alert_length', 0)
+    budget = max(limit - overhead - len('{} messages\n'.format(len(records))), 100)
+
+    chunks = [([], [])]  # (records, lines) per message
+    size = 0
+    for record in records:
+        text = '{}: {}'.format(record.levelname, record.getMessage())
+        if record.exc_text:
+            text += '\n' + record.exc_text
+        for start in range(0, len(text) or 1, budget):
+            piece = text[start:start + budget]
+            chunk_records, lines = chunks[-1]
+            if lines and size + 1 + len(piece) > budget:
+                chunk_records, lines = [], []
+                chunks.append((chunk_records, lines))
+                size = 0
+            size += len(piece) + (1 if lines else 0)
+            lines.append(piece)
+            if not chunk_records or chunk_records[-1] is not record:
+                chunk_records.append(record)
+
+    return [
+        _merged_record(
+            max(chunk_records, key=lambda record: record.levelno),
+            '{} messages\n{}'.format(len(chunk_records), '\n'.join(lines))
+        )
+        for chunk_records, lines in chunks
+    ]
+
+def _merged_record(template, msg):
+    """copy of ``template`` carrying ``msg`` and nothing left to render"""
+    merged = logging.makeLogRecord(dict(template.__dict__))
+    merged.msg = msg
+    merged.args = None
+    merged.exc_info = None
+    merged.exc_text = None
+    return merged
+
+
+class QueueFanoutHandler(logging.Handler):
+    """the only handler left on a logger after ``install_queue_logging()``
+
+    Args:
+        listeners (:obj:`list`): one ``BatchingListener`` per real handler
+
+    """
+    def __init__(self, listeners):
+        super().__init__()
+        self.listeners = listeners
+
+    def prepare(self, record):
+        """render args/tracebacks into a copy that is safe to hand off
+
+        Notes:
+            the caller's record is left alone: other handlers (and loggers
+            it propagates to) still see its ``args`` and ``exc_info``
+
+        """
+        prepared = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            prepared.exc_text = logging.Formatter().formatException(record.exc_info)
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        prepared.exc_info = None
+        return prepared
+
+    def emit(self, record):
+        try:
+            prepared = self.prepare(record)
+            for listener in self.listeners:
+                if prepared.levelno >= listener.level:
+                    listener.enqueue(prepared)
+        except Exception:  # pragma: no cover
+            self.handleError(record)
+
+    def restart(self):
+        """fresh queues/threads (listener threads don't survive ``fork()``)"""
+        for listener in self.listeners:
+            listener.start()
+
+    def close(self):
+        """flush everything queued, then close the real handlers"""
+        for listener in self.listeners:
+            listener.stop()
+            listener.handler.close()
+        super().close()
+
+    @property
+    def dropped(self):
+        """(int): records dropped because a queue was full"""
+        return sum(listener.dropped for listener in self.listeners)
+
+
+def install_queue_logging(
+        logger,
+        max_queue=10000,
+        batch_size=200,
+        log=api_config.LOGGER
+):
+    """route every handler on ``logger`` through background queues
+
+    Args:
+        logger (:obj:`logging.logger`): logger to rewire (usually ProsperLogger's)
+        max_queue (int, optional): records buffered per handler before dropping
+        batch_size (int, optional): most records handled per wakeup
+        log (:obj:`logging.logger`, optional): where to report the rewiring
+
+    Returns:
+        (:obj:`QueueFanoutHandler`): installed handler
+
+    """
+    existing = [handler for handler in logger.handlers if isinstance(handler, QueueFanoutHandler)]
+    if existing:
+        return existing[0]
+
+    listeners = []
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        listeners.append(BatchingListener(handler, max_queue=max_queue, batch_size=batch_size))
+
+    fanout = QueueFanoutHandler(listeners)
+    fanout.restart()
+    logger.addHandler(fanout)
+    atexit.register(fanout.close)
+
+    log.info(
+        'Queued logging for %s handler(s): %s',
+        len(listeners), ', '.join(type(listener.handler).__name__ for listener in listeners)
+    )
+    return fanout
+
+def restart_after_fork(logger):
+    """restart listener threads in a child process
+
+    Args:
+        logger (:obj:`logging.logger`): logger passed to ``install_queue_logging()``
+
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, QueueFanoutHandler):
+            handler.restart()
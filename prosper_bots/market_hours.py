@@ -0,0 +1,266 @@
+"""market_hours.py: US equity trading calendar and the cache TTLs it implies
+
+Notes:
+    prices can't move while the market is closed, so quotes cached outside
+    the session live until (at most) the next pre-market open.  Times are
+    epoch seconds like ``time.time()``; US/Eastern DST is computed here so
+    there's no tz database dependency
+
+"""
+from os import path
+from datetime import date, datetime, timedelta
+import time
+
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+EPOCH = datetime(1970, 1, 1)
+PRE_MARKET = (4, 0)
+REGULAR_OPEN = (9, 30)
+REGULAR_CLOSE = (16, 0)
+EARLY_CLOSE = (13, 0)
+AFTER_HOURS_CLOSE = (20, 0)
+
+def nth_weekday(year, month, weekday, nth):
+    """``nth`` ``weekday`` (Mon=0) of a month; ``nth=-1`` for the last one"""
+    if nth > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (nth - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def easter(year):
+    """western Easter Sunday (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+def _observed(holiday):
+    """NYSE weekend rule: Saturday -> Friday, Sunday -> Monday"""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+def nyse_holidays(year):
+    """full-day NYSE closures
+
+    Args:
+        year (int): calendar year
+
+    Returns:
+        (:obj:`set`): :obj:`datetime.date` market holidays
+
+    """
+    holidays = {
+        nth_weekday(year, 1, 0, 3),  # MLK day
+        nth_weekday(year, 2, 0, 3),  # Presidents day
+        easter(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, 0, -1),  # Memorial day
+        _observed(date(year, 7, 4)),
+        nth_weekday(year, 9, 0, 1),  # Labor day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),
+    }
+    new_years = date(year, 1, 1)
+    if new_years.weekday() != 5:  # a Saturday new year isn't made up on Dec 31
+        holidays.add(_observed(new_years))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+def early_closes(year):
+    """1pm closes: July 3rd, day after Thanksgiving, Christmas Eve"""
+    candidates = {
+        date(year, 7, 3),
+        nth_weekday(year, 11, 3, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    }
+    holidays = nyse_holidays(year)
+    return {day for day in candidates if day.weekday() < 5 and day not in holidays}
+
+def is_trading_day(day):
+    """(bool): NYSE opens on ``day``"""
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+def to_eastern(timestamp):
+    """epoch seconds -> naive US/Eastern datetime"""
+    utc = EPOCH + timedelta(seconds=timestamp)
+    # DST: 2nd Sunday of March 2am EST through 1st Sunday of November 2am EDT
+    dst_start = datetime.combine(nth_weekday(utc.year, 3, 6, 2), datetime.min.time()) + \
+        timedelta(hours=7)
+    dst_end = datetime.combine(nth_weekday(utc.year, 11, 6, 1), datetime.min.time()) + \
+        timedelta(hours=6)
+    offset = 4 if dst_start <= utc < dst_end else 5
+    return utc - timedelta(hours=offset)
+
+def from_eastern(eastern):
+    """naive US/Eastern datetime -> epoch seconds"""
+    for offset in (4, 5):
+        timestamp = (eastern + timedelta(hours=offset) - EPOCH).total_seconds()
+        if to_eastern(timestamp) == eastern:
+            return timestamp
+    return (eastern + timedelta(hours=5) - EPOCH).total_seconds()  # pragma: no cover
+
+def _at(day, hour_minute):
+    return datetime.combine(day, datetime.min.time()).replace(
+        hour=hour_minute[0], minute=hour_minute[1])
+
+def market_state(timestamp=None):
+    """where the US equity session stands
+
+    Args:
+        timestamp (float, optional): epoch seconds (default now)
+
+    Returns:
+        (str): ``regular``, ``extended`` (pre/after hours) or ``closed``
+
+    """
+    eastern = to_eastern(time.time() if timestamp is None else timestamp)
+    day = eastern.date()
+    if not is_trading_day(day):
+        return 'closed'
+
+    close = EARLY_CLOSE if day in early_closes(day.year) else REGULAR_CLOSE
+    if _at(day, REGULAR_OPEN) <= eastern < _at(day, close):
+        return 'regular'
+    if _at(day, PRE_MARKET) <= eastern < _at(day, AFTER_HOURS_CLOSE):
+        return 'extended'
+    return 'closed'
+
+def session_start(timestamp=None):
+    """epoch seconds of pre-market open on ``timestamp``'s US/Eastern day
+
+    Args:
+        timestamp (float, optional): epoch seconds (default now)
+
+    Returns:
+        (float): start of that day's session (even if the market never opened)
+
+    """
+    day = to_eastern(time.time() if timestamp is None else timestamp).date()
+    return from_eastern(_at(day, PRE_MARKET))
+
+def seconds_until_open(timestamp=None):
+    """seconds until prices can move again (next pre-market open)
+
+    Args:
+        timestamp (float, optional): epoch seconds (default now)
+
+    Returns:
+        (float): 0 if the market is already open
+
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    if market_state(timestamp) != 'closed':
+        return 0.0
+
+    day = to_eastern(timestamp).date()
+    for _ in range(14):
+        if is_trading_day(day):
+            opens = from_eastern(_at(day, PRE_MARKET))
+            if opens > timestamp:
+                return opens - timestamp
+        day += timedelta(days=1)
+    return 0.0  # pragma: no cover
+
+
+class FixedTTLPolicy(object):
+    """same TTL around the clock (coins trade 24/7)
+
+    Args:
+        ttl (float): seconds to cache
+
+    """
+    def __init__(self, ttl):
+        self._ttl = ttl
+
+    def ttl(self, timestamp=None):
+        """(float): seconds to cache something fetched at ``timestamp``"""
+        return self._ttl
+
+    def __repr__(self):
+        return 'FixedTTLPolicy({})'.format(self._ttl)
+
+
+class MarketHoursTTLPolicy(object):
+    """short TTLs in session, long ones while US equities are closed
+
+    Args:
+        regular_ttl (float): seconds to cache during the regular session
+        extended_ttl (float): seconds to cache during pre/after hours
+        closed_ttl (float): most seconds to cache while closed (the TTL
+            never runs past the next pre-market open)
+
+    """
+    def __init__(self, regular_ttl, extended_ttl, closed_ttl):
+        self.regular_ttl = regular_ttl
+        self.extended_ttl = extended_ttl
+        self.closed_ttl = closed_ttl
+
+    def ttl(self, timestamp=None):
+        """seconds to cache something fetched at ``timestamp``
+
+        Args:
+            timestamp (float, optional): epoch seconds (default now)
+
+        Returns:
+            (float): TTL
+
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        state = market_state(timestamp)
+        if state == 'regular':
+            return self.regular_ttl
+        if state == 'extended':
+            return self.extended_ttl
+        return min(self.closed_ttl, seconds_until_open(timestamp)) or self.extended_ttl
+
+    def __repr__(self):
+        return 'MarketHoursTTLPolicy(regular={}, extended={}, closed<={})'.format(
+            self.regular_ttl, self.extended_ttl, self.closed_ttl)
+
+
+STOCK_QUOTES = MarketHoursTTLPolicy(regular_ttl=15, extended_ttl=60, closed_ttl=6 * 3600)
+STOCK_NEWS = MarketHoursTTLPolicy(regular_ttl=300, extended_ttl=600, closed_ttl=1800)
+COIN_QUOTES = FixedTTLPolicy(15)
+
+def configure(config, logger=api_config.LOGGER):
+    """override default policies from ``[CacheTTL]`` in config
+
+    Notes:
+        keys: ``stock_regular``, ``stock_extended``, ``stock_closed``,
+        ``news_regular``, ``news_extended``, ``news_closed``, ``coin`` (seconds)
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global STOCK_QUOTES, STOCK_NEWS, COIN_QUOTES
+
+    def option(key, default):
+        return float(config.get_option('CacheTTL', key, None, default))
+
+    STOCK_QUOTES = MarketHoursTTLPolicy(
+        option('stock_regular', STOCK_QUOTES.regular_ttl),
+        option('stock_extended', STOCK_QUOTES.extended_ttl),
+        option('stock_closed', STOCK_QUOTES.closed_ttl)
+    )
+    STOCK_NEWS = MarketHoursTTLPolicy(
+        option('news_regular', STOCK_NEWS.regular_ttl),
+        option('news_extended', STOCK_NEWS.extended_ttl),
+        option('news_closed', STOCK_NEWS.closed_ttl)
+    )
+    COIN_QUOTES = FixedTTLPolicy(option('coin', COIN_QUOTES.ttl()))
+    logger.info('Cache TTLs: stocks=%r news=%r coins=%r', STOCK_QUOTES, STOCK_NEWS, COIN_QUOTES)
@@ -0,0 +1,387 @@
+"""metrics.py: in-process counters and latency histograms for bot commands
+
+Notes:
+    metric names are ``{command}.{stage}`` (``stock.fetch``, ``news.sentiment``,
+    ``quote.send``...).  Each process keeps its own ``REGISTRY``; sharded workers
+    report only their own traffic
+
+"""
+from os import path
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import asyncio
+import bisect
+import threading
+
+from contexttimer import Timer
+
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+# histogram bucket upper bounds (seconds): 20% wide, 0.1ms through ~70s
+BUCKETS = [0.0001 * 1.2 ** index for index in range(75)]
+# snapshot percentile: Prometheus ``quantile`` label
+QUANTILES = (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99'))
+
+class LatencyHistogram(object):
+    """fixed-bucket latency histogram; percentiles are bucket upper bounds
+
+    Args:
+        bounds (:obj:`list`, optional): sorted bucket upper bounds (seconds)
+
+    """
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """record one sample"""
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct):
+        """estimate a percentile
+
+        Args:
+            pct (float): 0-100
+
+        Returns:
+            (float): seconds (never more than the slowest sample seen)
+
+        """
+        if not self.count:
+            return 0.0
+
+        rank = max(pct / 100.0 * self.count, 1)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                break
+        if index >= len(self.bounds):
+            return self.max
+        return min(self.bounds[index], self.max)
+
+    @property
+    def mean(self):
+        """(float): average seconds per sample"""
+        return self.total / self.count if self.count else 0.0
+
+
+class MetricsRegistry(object):
+    """thread-safe counters, error counts and latency histograms"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.errors = Counter()
+        self.histograms = {}
+        self.gauges = {}
+
+    def incr(self, name, value=1):
+        """bump a plain counter (cache hits, drops...)"""
+        with self._lock:
+            self.counters[name] += value
+
+    def error(self, name):
+        """count a failure for ``name`` without a timing sample"""
+        with self._lock:
+            self.errors[name] += 1
+
+    def observe(self, name, seconds, error=False):
+        """record a timed call
+
+        Args:
+            name (str): ``{command}.{stage}``
+            seconds (float): how long it took
+            error (bool, optional): call raised
+
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[name] += 1
+
+    def set_gauge(self, name, value):
+        """publish a point-in-time value
+
+        Args:
+            name (str): gauge name (``discord_loop_lag_seconds``...)
+            value (float or :obj:`callable`): value, or zero-arg function read at scrape time
+
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    def gauge_values(self):
+        """(dict): name: current value, callables evaluated now"""
+        with self._lock:
+            gauges = dict(self.gauges)
+        values = {}
+        for name, value in gauges.items():
+            try:
+                values[name] = float(value() if callable(value) else value)
+            except Exception:  # pragma: no cover
+                continue  # a broken probe shouldn't break the scrape
+        return values
+
+    def timer(self, name):
+        """``contexttimer.Timer`` that reports into this registry on exit"""
+        return StageTimer(name, registry=self)
+
+    def snapshot(self):
+        """current numbers
+
+        Returns:
+            (dict): name: {count, errors, sum, mean, p50, p95, p99, max} (seconds)
+
+        """
+        with self._lock:
+            stats = {}
+            for name, histogram in self.histograms.items():
+                stats[name] = {
+                    'count': histogram.count,
+                    'errors': self.errors[name],
+                    'sum': histogram.total,
+                    'mean': histogram.mean,
+                    'p50': histogram.percentile(50),
+                    'p95': histogram.percentile(95),
+                    'p99': histogram.percentile(99),
+                    'max': histogram.max,
+                }
+            for name, error_count in self.errors.items():
+                if name not in stats:
+                    stats[name] = {'count': 0, 'errors': error_count}
+            return stats
+
+    def report(self):
+        """render ``snapshot()`` for chat
+
+        Returns:
+            (:obj:`list`): one line per metric, plus counters
+
+        """
+        stats = self.snapshot()
+        lines = ['{:<20} {:>6} {:>5} {:>8} {:>8} {:>8} {:>8}'.format(
+            'stage', 'count', 'err', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')]
+        for name, stat in sorted(stats.items()):
+            lines.append('{:<20} {:>6} {:>5} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}'.format(
+                name, stat['count'], stat['errors'],
+                stat.get('p50', 0) * 1000, stat.get('p95', 0) * 1000,
+                stat.get('p99', 0) * 1000, stat.get('max', 0) * 1000
+            ))
+        with self._lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            lines.append('{:<20} {:>6}'.format(name, value))
+        return lines
+
+    def reset(self):
+        """forget everything"""
+        with self._lock:
+            self.counters.clear()
+            self.errors.clear()
+            self.histograms.clear()
+            self.gauges.clear()
+
+
+class StageTimer(Timer):
+    """``contexttimer.Timer`` that feeds a ``MetricsRegistry``
+
+    Notes:
+        an exception escaping the ``with`` block is counted as an error
+
+    Args:
+        name (str): ``{command}.{stage}``
+        registry (:obj:`MetricsRegistry`, optional): where to report (default ``REGISTRY``)
+
+    """
+    def __init__(self, name, registry=None):
+        super().__init__()
+        self.name = name
+        self.registry = registry
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        super().__exit__(exc_type, exc_value, exc_traceback)
+        registry = REGISTRY if self.registry is None else self.registry
+        registry.observe(self.name, self.elapsed, error=exc_type is not None)
+
+
+REGISTRY = MetricsRegistry()
+
+def timer(name):
+    """time a stage into the module-level ``REGISTRY``
+
+    Args:
+        name (str): ``{command}.{stage}``
+
+    Returns:
+        (:obj:`StageTimer`): context manager (``str()`` gives elapsed seconds)
+
+    """
+    return StageTimer(name)
+
+def stats_report(logger=api_config.LOGGER):
+    """text block for the ``stats`` admin command
+
+    Args:
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): pre-formatted table
+
+    """
+    lines = REGISTRY.report()
+    logger.info('--reporting %s metrics', len(lines) - 1)
+    return '\n'.join(lines)
+
+def render_prometheus(registry=None, prefix='prosperbot'):
+    """render a registry in the Prometheus text exposition format
+
+    Notes:
+        stages export as summaries (``{prefix}_stage_seconds``), counters as
+        ``{prefix}_events_total``, gauges as ``{prefix}_{gauge}``.  A
+        ``{command}.cache_hit`` counter plus ``{command}.fetch`` timings also
+        yield ``{prefix}_cache_hit_ratio``
+
+    Args:
+        registry (:obj:`MetricsRegistry`, optional): what to render (default ``REGISTRY``)
+        prefix (str, optional): metric name prefix
+
+    Returns:
+        (str): exposition text
+
+    """
+    registry = REGISTRY if registry is None else registry
+    stats = registry.snapshot()
+    with registry._lock:
+        counters = dict(registry.counters)
+
+    lines = [
+        '# TYPE {}_stage_seconds summary'.format(prefix),
+    ]
+    for name, stat in sorted(stats.items()):
+        for percentile, quantile in QUANTILES:
+            if percentile in stat:
+                lines.append('{}_stage_seconds{{stage="{}",quantile="{}"}} {}'.format(
+                    prefix, name, quantile, stat[percentile]))
+        lines.append('{}_stage_seconds_sum{{stage="{}"}} {}'.format(
+            prefix, name, stat.get('sum', 0.0)))
+        lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(
+            prefix, name, stat['count']))
+
+    lines.append('# TYPE {}_stage_errors_total counter'.format(prefix))
+    for name, stat in sorted(stats.items()):
+        lines.append('{}_stage_errors_total{{stage="{}"}} {}'.format(
+            prefix, name, stat['errors']))
+
+    lines.append('# TYPE {}_events_total counter'.format(prefix))
+    for name, value in sorted(counters.items()):
+        lines.append('{}_events_total{{event="{}"}} {}'.format(prefix, name, value))
+
+    lines.append('# TYPE {}_cache_hit_ratio gauge'.format(prefix))
+    for name, value in sorted(counters.items()):
+        command, _, event = name.rpartition('.')
+        fetches = stats.get(command + '.fetch', {}).get('count')
+        if event == 'cache_hit' and fetches:
+            lines.append('{}_cache_hit_ratio{{command="{}"}} {}'.format(
+                prefix, command, value / fetches))
+
+    for name, value in sorted(registry.gauge_values().items()):
+        lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+        lines.append('{}_{} {}'.format(prefix, name, value))
+
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics -> ``render_prometheus()``"""
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = render_prometheus(self.registry).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds would drown the bot log
+
+
+def serve_metrics(port, host='127.0.0.1', registry=None, logger=api_config.LOGGER):
+    """serve ``/metrics`` from a daemon thread
+
+    Args:
+        port (int): port to bind (0 = pick a free one)
+        host (str, optional): interface to bind
+        registry (:obj:`MetricsRegistry`, optional): what to serve (default ``REGISTRY``)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`http.server.HTTPServer`): running server (``server_address`` has the real port)
+
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = HTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    logger.info('Serving metrics on http://%s:%s/metrics', *server.server_address[:2])
+    return server
+
+def serve_from_config(config, port_offset=0, logger=api_config.LOGGER):
+    """start the metrics endpoint if ``[ProsperBot] metrics_port`` is set
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        port_offset (int, optional): added to the port (one per worker process)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`http.server.HTTPServer`): running server, or None when disabled
+
+    """
+    port = int(config.get_option('ProsperBot', 'metrics_port', None, 0) or 0)
+    if not port:
+        return None
+
+    return serve_metrics(
+        port + port_offset,
+        host=config.get_option('ProsperBot', 'metrics_host', None, '127.0.0.1'),
+        logger=logger
+    )
+
+async def watch_loop_lag(
+        interval=5,
+        gauge_name='loop_lag_seconds',
+        loop=None,
+        registry=None
+):
+    """keep a gauge of how late the event loop wakes up
+
+    Args:
+        interval (float, optional): seconds between probes
+        gauge_name (str, optional): gauge to publish
+        loop (:obj:`asyncio.AbstractEventLoop`, optional): loop to measure
+        registry (:obj:`MetricsRegistry`, optional): where to report (default ``REGISTRY``)
+
+    """
+    loop = loop or asyncio.get_event_loop()
+    registry = REGISTRY if registry is None else registry
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        registry.set_gauge(gauge_name, max(loop.time() - expected, 0.0))
@@ -27,6 +27,7 @@ def parse_slack_message_object(message_obj):
         )
     metadata['user_name'] = message_obj._client.users[metadata['user']]['name']
     metadata['team_name'] = message_obj._client.login_data['team']['name']
+    metadata['team_id'] = message_obj._client.login_data['team']['id']
 
     return metadata
 
@@ -41,7 +42,10 @@ def parse_discord_context_object(context_obj):
 
     """
     metadata = dict()  # TODO: all context_obj.message.{children}.name values
+    metadata['user'] = context_obj.message.author.id
     metadata['user_name'] = context_obj.message.author.name
+    metadata['channel'] = context_obj.message.channel.id
+    metadata['team_id'] = context_obj.message.server.id
     metadata['team_name'] = context_obj.message.server.name
     try:
         metadata['channel_name'] = context_obj.message.channel.name
@@ -49,3 +53,26 @@ def parse_discord_context_object(context_obj):
         metadata['channel_name'] = 'DIRECT_MESSAGE:{}'.format(context_obj.message.author.name)
 
     return metadata
+
+def is_admin(user_id, admins):
+    """check a user against the ``[ProsperBot] admin_ids`` list
+
+    Notes:
+        admins are matched on platform user ids (``message_info['user']``),
+        never display names: names aren't unique and anyone can change
+        theirs.  Admin commands (``stats``, ``profile``) stay off until
+        admins are configured: a blank list lets nobody in
+
+    Args:
+        user_id (str): platform id of who is asking
+        admins (str): comma separated user ids
+
+    Returns:
+        (bool): user may run admin commands
+
+    """
+    return str(user_id) in admin_ids(admins)
+
+def admin_ids(admins):
+    """(:obj:`list`): user ids in a comma separated ``admin_ids`` option"""
+    return [admin.strip() for admin in (admins or '').split(',') if admin.strip()]
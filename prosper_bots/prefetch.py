@@ -0,0 +1,306 @@
+"""prefetch.py: keep the most-asked-for tickers warm in cache
+
+Notes:
+    every request that passes the symbol check bumps a decaying counter.  A
+    background thread re-fetches the hottest tickers a few seconds before
+    their cached quote (and optionally news) expires, under a per-minute
+    upstream call budget.  Entries already gone are left to the next request,
+    stocks aren't refreshed while the market is closed, and a refresh that
+    fails backs off before that key is tried again.  Counters are per
+    process; sharded workers share ``caching.QUOTES``, so whichever worker
+    refreshes first saves the others the call
+
+"""
+from os import path
+from collections import deque
+import heapq
+import threading
+import time
+
+from . import caching
+from . import market_hours
+from . import metrics
+from . import symbols
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+class HotTickers(object):
+    """request counter whose scores halve every ``half_life`` seconds
+
+    Notes:
+        a score is roughly "requests in the last ``half_life`` seconds" with
+        older requests counting for less.  When more than ``2 * capacity``
+        keys are tracked, the coldest are forgotten
+
+    Args:
+        half_life (float, optional): seconds for a score to halve
+        capacity (int, optional): keys worth tracking
+        clock (:obj:`callable`, optional): wall-clock source
+
+    """
+    def __init__(self, half_life=600, capacity=500, clock=time.time):
+        self.half_life = half_life
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._scores = {}  # key: (score, as_of)
+
+    def _decayed(self, score, as_of, now):
+        return score * 0.5 ** ((now - as_of) / self.half_life)
+
+    def hit(self, kind, ticker, weight=1.0):
+        """count one request
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            ticker (str): requested ticker
+            weight (float, optional): how much the request counts
+
+        """
+        key = (kind, ticker.upper())
+        now = self._clock()
+        with self._lock:
+            score, as_of = self._scores.get(key, (0.0, now))
+            self._scores[key] = (self._decayed(score, as_of, now) + weight, now)
+            if len(self._scores) > 2 * self.capacity:
+                self._prune(now)
+
+    def _prune(self, now):
+        keep = heapq.nlargest(
+            self.capacity,
+            self._scores.items(),
+            key=lambda item: self._decayed(item[1][0], item[1][1], now)
+        )
+        self._scores = dict(keep)
+
+    def score(self, kind, ticker):
+        """(float): current decayed score (0 if untracked)"""
+        with self._lock:
+            entry = self._scores.get((kind, ticker.upper()))
+        if entry is None:
+            return 0.0
+        return self._decayed(entry[0], entry[1], self._clock())
+
+    def top(self, count, min_score=0.0):
+        """hottest tickers right now
+
+        Args:
+            count (int): most to return
+            min_score (float, optional): ignore anything colder than this
+
+        Returns:
+            (:obj:`list`): ``(kind, ticker, score)``, hottest first
+
+        """
+        now = self._clock()
+        with self._lock:
+            scored = [
+                (kind, ticker, self._decayed(score, as_of, now))
+                for (kind, ticker), (score, as_of) in self._scores.items()
+            ]
+        hottest = heapq.nlargest(count, scored, key=lambda item: item[2])
+        return [item for item in hottest if item[2] >= min_score]
+
+    def forget(self, kind, ticker):
+        """stop tracking a ticker (e.g. upstream says it doesn't exist)"""
+        with self._lock:
+            self._scores.pop((kind, ticker.upper()), None)
+
+    def clear(self):
+        """forget everything"""
+        with self._lock:
+            self._scores.clear()
+
+    def __len__(self):
+        return len(self._scores)
+
+
+HOT = HotTickers()
+
+class Prefetcher(object):
+    """refresh hot tickers' cache entries just before they expire
+
+    Notes:
+        ``jobs`` maps a kind to ``(cache_name, key_template, refresh_func)``
+        triples: ``caching.<cache_name>`` holds ``key_template.format(ticker)``
+        and ``refresh_func(ticker, logger=logger)`` re-fills it.  Caches are
+        looked up by name each pass so ``caching.install_caches()`` is honored
+
+    Args:
+        jobs (:obj:`dict`): kind: list of refresh jobs
+        hot (:obj:`HotTickers`, optional): popularity source (default ``HOT``)
+        top_k (int, optional): tickers kept warm
+        min_score (float, optional): colder tickers are left to expire
+        lead (float, optional): refresh when an entry has less than this many seconds left
+        max_calls_per_minute (int, optional): upstream budget for prefetching
+        retry_backoff (float, optional): seconds a key waits after its first failed refresh
+            (doubling per failure, up to ``max_backoff``)
+        max_backoff (float, optional): longest wait between failed refreshes
+        market_state (:obj:`callable`, optional): ``market_state(timestamp)`` for stocks
+        clock (:obj:`callable`, optional): wall-clock source
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            jobs,
+            hot=None,
+            top_k=10,
+            min_score=2.0,
+            lead=3.0,
+            max_calls_per_minute=120,
+            retry_backoff=30.0,
+            max_backoff=600.0,
+            market_state=market_hours.market_state,
+            clock=time.time,
+            logger=api_config.LOGGER
+    ):
+        self.jobs = jobs
+        self.hot = HOT if hot is None else hot
+        self.top_k = top_k
+        self.min_score = min_score
+        self.lead = lead
+        self.max_calls_per_minute = max_calls_per_minute
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.logger = logger
+        self._market_state = market_state
+        self._clock = clock
+        self._calls = deque()  # timestamps of recent refreshes
+        self._failures = {}  # key: (retry after, last backoff)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _budget_left(self, now):
+        while self._calls and self._calls[0] <= now - 60:
+            self._calls.popleft()
+        return self.max_calls_per_minute - len(self._calls)
+
+    def due(self):
+        """cache entries worth refreshing now
+
+        Returns:
+            (:obj:`list`): ``(kind, ticker, cache_name, key, refresh_func)``, hottest first
+
+        """
+        now = self._clock()
+        stocks_closed = self._market_state(now) == 'closed'  # nothing moves until the open
+        due = []
+        for kind, ticker, _ in self.hot.top(self.top_k, self.min_score):
+            if kind == 'stocks' and stocks_closed:
+                continue
+            if not symbols.check_ticker(ticker, kind)[0]:
+                continue
+            for cache_name, key_template, refresh_func in self.jobs.get(kind, []):
+                key = key_template.format(ticker)
+                if key in self._failures and self._failures[key][0] > now:
+                    continue
+                if 0 < getattr(caching, cache_name).remaining(key) <= self.lead:
+                    due.append((kind, ticker, cache_name, key, refresh_func))
+        return due
+
+    def _failed(self, key, now):
+        """back ``key`` off: ``retry_backoff``, doubling up to ``max_backoff``"""
+        last_backoff = self._failures.get(key, (None, 0.0))[1]
+        backoff = min(max(last_backoff * 2, self.retry_backoff), self.max_backoff)
+        self._failures[key] = (now + backoff, backoff)
+        return backoff
+
+    def run_once(self):
+        """refresh everything due, within budget
+
+        Returns:
+            (int): upstream refreshes made
+
+        """
+        refreshed = 0
+        for kind, ticker, cache_name, key, refresh_func in self.due():
+            now = self._clock()
+            if self._budget_left(now) <= 0:
+                self.logger.info('--prefetch budget spent, skipping %s', key)
+                metrics.REGISTRY.incr('prefetch.throttled')
+                break
+
+            self._calls.append(now)
+            try:
+                with metrics.timer('prefetch.refresh'):
+                    refresh_func(ticker, logger=self.logger)
+            except Exception as err:
+                if symbols.is_bad_symbol_error(err):
+                    symbols.remember_bad(ticker, kind, logger=self.logger)
+                    self.hot.forget(kind, ticker)
+                else:
+                    self.logger.warning(
+                        'unable to prefetch %s, retrying in %.0fs',
+                        key, self._failed(key, now), exc_info=True)
+                    metrics.REGISTRY.incr('prefetch.backoff')
+                continue
+            self._failures.pop(key, None)
+            refreshed += 1
+        if refreshed:
+            metrics.REGISTRY.incr('prefetch.refreshed', refreshed)
+        return refreshed
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception:  # pragma: no cover
+                self.logger.error('prefetch pass failed', exc_info=True)
+
+    def start(self, interval=1.0):
+        """refresh on a daemon thread every ``interval`` seconds"""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name='prefetch', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """stop the background thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def start_from_config(config, jobs, logger=api_config.LOGGER):
+    """start a prefetcher if ``[Prefetch] top_k`` is set
+
+    Notes:
+        keys: ``top_k``, ``min_score``, ``half_life``, ``lead_seconds``,
+        ``interval``, ``max_calls_per_minute``, ``retry_backoff``, ``max_backoff``
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        jobs (:obj:`dict`): kind: refresh jobs (see ``commands.prefetch_jobs()``)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`Prefetcher`): running prefetcher, or None when disabled
+
+    """
+    def option(key, default):
+        return float(config.get_option('Prefetch', key, None, default))
+
+    top_k = int(option('top_k', 0))
+    if not top_k:
+        return None
+
+    HOT.half_life = option('half_life', HOT.half_life)
+    prefetcher = Prefetcher(
+        jobs,
+        top_k=top_k,
+        min_score=option('min_score', 2.0),
+        lead=option('lead_seconds', 3.0),
+        max_calls_per_minute=int(option('max_calls_per_minute', 120)),
+        retry_backoff=option('retry_backoff', 30.0),
+        max_backoff=option('max_backoff', 600.0),
+        logger=logger
+    )
+    logger.info(
+        'Prefetching top %s tickers (%s) up to %s calls/min',
+        top_k, ', '.join(sorted(jobs)), prefetcher.max_calls_per_minute
+    )
+    return prefetcher.start(option('interval', 1.0))
@@ -0,0 +1,327 @@
+"""profiling.py: on-demand sampling profiler for a live bot process
+
+Notes:
+    a background thread snapshots every thread's stack with
+    ``sys._current_frames()`` and counts identical stacks.  Output is the
+    collapsed-stack format (``frame;frame;frame count``) read by
+    flamegraph.pl, speedscope and friends.  One profile runs at a time,
+    starts are ``COOLDOWN`` seconds apart and only the newest ``MAX_FILES``
+    profiles are kept, so chat can't keep a bot busy profiling or fill its disk
+
+"""
+from os import path
+from collections import Counter
+import os
+import signal
+import sys
+import threading
+import time
+
+from . import exceptions
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+OUTPUT_PATH = path.join(HERE, 'profiles')
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+MAX_SECONDS = 120
+COOLDOWN = 300  # seconds between the starts of two profiles
+MAX_FILES = 20  # newest ``.folded`` files kept per directory
+_ACTIVE = threading.Lock()  # one profile (process or call) at a time
+_LAST_START = [None]
+
+def configure(output_path, cooldown=None, max_files=None, logger=api_config.LOGGER):
+    """pick where profiles get written (usually the log directory)
+
+    Args:
+        output_path (str): directory for ``.folded`` files
+        cooldown (float, optional): seconds between profiles (default ``COOLDOWN``)
+        max_files (int, optional): profiles kept before the oldest are deleted
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global OUTPUT_PATH, COOLDOWN, MAX_FILES
+    logger.info('Profiles will be written to %s', output_path)
+    OUTPUT_PATH = output_path
+    if cooldown is not None:
+        COOLDOWN = float(cooldown)
+    if max_files is not None:
+        MAX_FILES = int(max_files)
+
+def _claim(clock=time.monotonic):
+    """take the profiler for one run (release ``_ACTIVE`` when done)
+
+    Raises:
+        ProfilerBusy: a profile is running, or one started less than ``COOLDOWN`` ago
+
+    """
+    if not _ACTIVE.acquire(blocking=False):
+        raise exceptions.ProfilerBusy('a profile is already running')
+    now = clock()
+    if _LAST_START[0] is not None and now - _LAST_START[0] < COOLDOWN:
+        _ACTIVE.release()
+        raise exceptions.ProfilerBusy('profiler cooling down, try again in {:.0f}s'.format(
+            COOLDOWN - (now - _LAST_START[0])))
+    _LAST_START[0] = now
+
+def prune(output_path=None, max_files=None):
+    """delete the oldest profiles beyond ``max_files``
+
+    Args:
+        output_path (str, optional): directory to prune (default ``OUTPUT_PATH``)
+        max_files (int, optional): profiles to keep (default ``MAX_FILES``)
+
+    Returns:
+        (:obj:`list`): deleted files
+
+    """
+    output_path = OUTPUT_PATH if output_path is None else output_path
+    max_files = MAX_FILES if max_files is None else max_files
+    if not path.isdir(output_path):
+        return []
+    profiles = sorted(
+        (path.join(output_path, name) for name in os.listdir(output_path)
+         if name.startswith('profile-') and name.endswith('.folded')),
+        key=path.getmtime
+    )
+    deleted = profiles[:max(len(profiles) - max_files, 0)]
+    for profile_file in deleted:
+        os.remove(profile_file)
+    return deleted
+
+def frame_label(frame):
+    """``module:function:line`` for one stack frame"""
+    code = frame.f_code
+    return '{}:{}:{}'.format(
+        path.splitext(path.basename(code.co_filename))[0], code.co_name, frame.f_lineno)
+
+def collapse_stack(frame):
+    """root-first ``;``-joined labels for a thread's stack"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler(object):
+    """count thread stacks at a fixed interval
+
+    Args:
+        interval (float, optional): seconds between samples
+        thread_ids (:obj:`set`, optional): only sample these threads (default all)
+
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                thread_name = names.get(thread_id, str(thread_id))
+                self.stacks[thread_name + ';' + collapse_stack(frame)] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """begin sampling on a daemon thread"""
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """stop sampling and wait for the sampler to exit"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self):
+        """(:obj:`list`): ``stack count`` lines, hottest first"""
+        return [
+            '{} {}'.format(stack, count) for stack, count in self.stacks.most_common()
+        ]
+
+    def write(self, output_path):
+        """save collapsed stacks
+
+        Args:
+            output_path (str): file to write
+
+        Returns:
+            (str): ``output_path``
+
+        """
+        os.makedirs(path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as profile_fh:
+            profile_fh.write('\n'.join(self.collapsed()) + '\n')
+        return output_path
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop()
+
+
+def profile_path(label, output_path=None):
+    """timestamped ``.folded`` filename in ``OUTPUT_PATH``"""
+    return path.join(
+        OUTPUT_PATH if output_path is None else output_path,
+        'profile-{}-{}-{}.folded'.format(label, os.getpid(), time.strftime('%Y%m%dT%H%M%S'))
+    )
+
+def profile_process(
+        seconds,
+        interval=DEFAULT_INTERVAL,
+        output_path=None,
+        logger=api_config.LOGGER
+):
+    """sample every thread in this process for ``seconds`` (blocking)
+
+    Args:
+        seconds (float): how long to sample (capped at ``MAX_SECONDS``)
+        interval (float, optional): seconds between samples
+        output_path (str, optional): directory to write into (default ``OUTPUT_PATH``)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (str): path to collapsed-stack file
+
+    Raises:
+        ProfilerBusy: another profile is running, or the last one was too recent
+
+    """
+    _claim()
+    try:
+        seconds = min(float(seconds), MAX_SECONDS)
+        logger.info('Profiling process for %ss', seconds)
+        profiler = SamplingProfiler(interval=interval).start()
+        time.sleep(seconds)
+        profiler.stop()
+        profile_file = profiler.write(profile_path('process', output_path))
+        prune(path.dirname(profile_file))
+        logger.info('--%s samples written to %s', profiler.samples, profile_file)
+        return profile_file
+    finally:
+        _ACTIVE.release()
+
+def profile_process_async(
+        seconds,
+        callback=None,
+        interval=DEFAULT_INTERVAL,
+        output_path=None,
+        logger=api_config.LOGGER
+):
+    """``profile_process()`` on a background thread
+
+    Args:
+        seconds (float): how long to sample
+        callback (:obj:`callable`, optional): ``callback(profile_file, error)`` when done
+        interval (float, optional): seconds between samples
+        output_path (str, optional): directory to write into
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`threading.Thread`): running profile
+
+    """
+    def run():
+        profile_file, error = None, None
+        try:
+            profile_file = profile_process(
+                seconds, interval=interval, output_path=output_path, logger=logger)
+        except Exception as err:
+            logger.warning('profile failed', exc_info=True)
+            error = err
+        if callback is not None:
+            callback(profile_file, error)
+
+    thread = threading.Thread(target=run, name='profile-process', daemon=True)
+    thread.start()
+    return thread
+
+def profile_call(
+        label,
+        func,
+        *args,
+        interval=0.001,
+        output_path=None,
+        logger=api_config.LOGGER,
+        **kwargs
+):
+    """profile one call end to end on the calling thread
+
+    Args:
+        label (str): goes into the filename (e.g. ``stock-MU``)
+        func (:obj:`callable`): thing to run (usually a ``commands.py`` function)
+        args (list): positional args for ``func``
+        interval (float, optional): seconds between samples
+        output_path (str, optional): directory to write into
+        logger (:obj:`logging.logger`, optional): logging handle
+        kwargs (dict): keyword args for ``func``
+
+    Returns:
+        (any): ``func()`` result
+        (str): path to collapsed-stack file
+        (float): seconds ``func()`` took
+
+    Raises:
+        ProfilerBusy: another profile is running, or the last one was too recent
+
+    """
+    _claim()
+    try:
+        profiler = SamplingProfiler(interval=interval, thread_ids={threading.get_ident()})
+        start = time.perf_counter()
+        with profiler:
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        safe_label = ''.join(char if char.isalnum() or char in '-_' else '_' for char in label)
+        profile_file = profiler.write(profile_path(safe_label, output_path))
+        prune(path.dirname(profile_file))
+    finally:
+        _ACTIVE.release()
+    logger.info('--profiled %s in %.3fs: %s', label, elapsed, profile_file)
+    return result, profile_file, elapsed
+
+def install_signal_handler(
+        seconds=30,
+        signum=getattr(signal, 'SIGUSR2', None),
+        logger=api_config.LOGGER
+):
+    """``kill -USR2 <pid>`` starts a ``seconds`` long process profile
+
+    Args:
+        seconds (float, optional): how long each profile samples
+        signum (int, optional): signal to listen for
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (bool): handler installed (False on platforms without the signal)
+
+    """
+    if signum is None:  # pragma: no cover
+        logger.warning('signal-triggered profiling not supported on this platform')
+        return False
+
+    def handler(signum, frame):
+        profile_process_async(seconds, logger=logger)
+
+    signal.signal(signum, handler)
+    logger.info('Send signal %s to pid %s to profile for %ss', signum, os.getpid(), seconds)
+    return True
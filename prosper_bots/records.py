@@ -0,0 +1,120 @@
+"""records.py: compact quote/article records cut out of datareader frames
+
+Notes:
+    datareader answers with DataFrames carrying every column upstream sent.
+    Commands only ever read a handful of fields, so quotes and articles are
+    copied out at the boundary into ``__slots__`` records (no per-instance
+    ``__dict__``, plain Python scalars) and the frame is dropped.  Records
+    read like the dicts they replace (``quote['last']``, ``quote.get()``,
+    ``dict(quote)``), pickle for shared caches/snapshots, and raise
+    ``KeyError`` for fields they don't keep
+
+"""
+from os import path
+
+HERE = path.abspath(path.dirname(__file__))
+
+class Record(object):
+    """mapping-like base: subclasses list their fields in ``__slots__``
+
+    Args:
+        **fields: field values (unknown names are ignored, missing ones are None)
+
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_frame(cls, frame):
+        """one record per row of a datareader frame
+
+        Args:
+            frame (:obj:`pandas.DataFrame`): datareader result
+
+        Returns:
+            (:obj:`list`): records, in row order
+
+        """
+        columns = frame.columns.tolist()
+        positions = [
+            (name, columns.index(name)) if name in columns else (name, None)
+            for name in cls.__slots__
+        ]
+        records = []
+        for row in frame.values.tolist():  # one pass, plain Python scalars, no Series
+            record = cls.__new__(cls)
+            for name, position in positions:
+                setattr(record, name, None if position is None else row[position])
+            records.append(record)
+        return records
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        """fields the source frame didn't have are None, and count as missing"""
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        """``dict.get()``: None-valued fields count as missing"""
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def keys(self):
+        """field names (lets ``dict(record)`` work)"""
+        return self.__slots__
+
+    def items(self):
+        """``(field, value)`` pairs"""
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def copy(self):
+        """shallow copy"""
+        return type(self)(**dict(self.items()))
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.__getstate__() == other.__getstate__()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, value) for name, value in self.items()))
+
+
+class StockQuote(Record):
+    """``upstream.get_quote_rh()`` row"""
+    __slots__ = (
+        'symbol', 'name', 'pe_ratio', 'change_pct', 'current_price',
+        'previous_close', 'volume', 'updated_at',
+    )
+
+
+class CoinQuote(Record):
+    """``upstream.get_quote_cc(to_yahoo=True)`` row"""
+    __slots__ = (
+        'symbol', 'name', 'last', 'change_pct', 'open', 'high', 'low', 'volume', 'timestamp',
+    )
+
+
+class Article(Record):
+    """scored ``upstream.company_news_rh()`` row"""
+    __slots__ = ('title', 'url', 'source', 'published_at', 'compound')
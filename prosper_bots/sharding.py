@@ -0,0 +1,176 @@
+"""sharding.py: run gateway shards across several worker processes"""
+from os import path
+import asyncio
+import multiprocessing
+import os
+import time
+
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+def assign_shards(shard_count, worker_count):
+    """split gateway shard ids across worker processes
+
+    Args:
+        shard_count (int): total shards to open with the gateway
+        worker_count (int): number of worker processes
+
+    Returns:
+        (:obj:`list`): one list of shard ids per worker (round-robin)
+
+    Raises:
+        ValueError: more workers than shards, or nothing to run
+
+    """
+    if shard_count < 1 or worker_count < 1:
+        raise ValueError('shard_count and worker_count must be >= 1')
+    if worker_count > shard_count:
+        raise ValueError(
+            'worker_count={} would leave workers without shards (shard_count={})'.format(
+                worker_count, shard_count))
+
+    return [list(range(worker_id, shard_count, worker_count)) for worker_id in range(worker_count)]
+
+def report_health(health_board, worker_id, **status):
+    """publish a worker's status to the shared health board
+
+    Args:
+        health_board (:obj:`dict`): ``multiprocessing.Manager().dict()``
+        worker_id (int): which worker is reporting
+        status (dict): anything worth reporting (shards, guilds, loop_lag...)
+
+    """
+    report = {'pid': os.getpid(), 'last_beat': time.time()}
+    report.update(status)
+    health_board[worker_id] = report
+
+async def heartbeat(
+        health_board,
+        worker_id,
+        status_func,
+        interval=15,
+        loop=None,
+        logger=api_config.LOGGER
+):
+    """periodically publish worker health, including event-loop lag
+
+    Args:
+        health_board (:obj:`dict`): ``multiprocessing.Manager().dict()``
+        worker_id (int): which worker is reporting
+        status_func (:obj:`callable`): returns a dict of worker-specific status
+        interval (float, optional): seconds between reports
+        loop (:obj:`asyncio.AbstractEventLoop`, optional): loop to measure
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    loop = loop or asyncio.get_event_loop()
+    loop_lag = 0.0
+    while True:
+        try:
+            report_health(health_board, worker_id, loop_lag=loop_lag, **status_func())
+        except Exception:  # pragma: no cover
+            logger.warning('unable to report health for worker %s', worker_id, exc_info=True)
+
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        loop_lag = max(loop.time() - expected, 0.0)
+
+def summarize_health(health_board, stale_after=60):
+    """render the health board for logs/chat
+
+    Args:
+        health_board (:obj:`dict`): ``multiprocessing.Manager().dict()``
+        stale_after (float, optional): seconds before a silent worker is STALE
+
+    Returns:
+        (:obj:`list`): one line per worker
+
+    """
+    now = time.time()
+    lines = []
+    for worker_id, report in sorted(dict(health_board).items()):
+        state = 'OK' if now - report['last_beat'] < stale_after else 'STALE'
+        details = ' '.join(
+            '{}={}'.format(key, value) for key, value in sorted(report.items())
+            if key not in ('pid', 'last_beat')
+        )
+        lines.append('worker {} pid={} {} {}'.format(
+            worker_id, report['pid'], state, details).strip())
+    return lines
+
+
+class ShardSupervisor(object):
+    """start, watch and restart gateway worker processes
+
+    Args:
+        worker_target (:obj:`callable`): ``target(worker_id, shard_ids, shard_count, health_board, **worker_kwargs)``
+        shard_count (int): total gateway shards
+        worker_count (int): number of worker processes
+        health_board (:obj:`dict`): ``multiprocessing.Manager().dict()``
+        worker_kwargs (dict, optional): extra kwargs for ``worker_target``
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            worker_target,
+            shard_count,
+            worker_count,
+            health_board,
+            worker_kwargs=None,
+            logger=api_config.LOGGER
+    ):
+        self.worker_target = worker_target
+        self.shard_count = shard_count
+        self.assignments = assign_shards(shard_count, worker_count)
+        self.health_board = health_board
+        self.worker_kwargs = worker_kwargs or {}
+        self.logger = logger
+        self.workers = {}
+
+    def start_worker(self, worker_id):
+        """(re)start one worker process
+
+        Args:
+            worker_id (int): index into ``assignments``
+
+        """
+        shard_ids = self.assignments[worker_id]
+        self.logger.info('--starting worker %s for shards %s', worker_id, shard_ids)
+        worker = multiprocessing.Process(
+            target=self.worker_target,
+            args=(worker_id, shard_ids, self.shard_count, self.health_board),
+            kwargs=self.worker_kwargs,
+            name='shard-worker-{}'.format(worker_id),
+            daemon=True
+        )
+        worker.start()
+        self.workers[worker_id] = worker
+
+    def run(self, check_interval=15, stale_after=60):
+        """start every worker then babysit them forever
+
+        Args:
+            check_interval (float, optional): seconds between health checks
+            stale_after (float, optional): seconds before a silent worker is logged
+
+        """
+        self.logger.info(
+            'Starting %s workers for %s shards', len(self.assignments), self.shard_count)
+        for worker_id in range(len(self.assignments)):
+            self.start_worker(worker_id)
+
+        while True:
+            time.sleep(check_interval)
+            for worker_id, worker in list(self.workers.items()):
+                if not worker.is_alive():
+                    self.logger.error(
+                        'worker %s died (exitcode=%s), restarting', worker_id, worker.exitcode)
+                    self.start_worker(worker_id)
+
+            for line in summarize_health(self.health_board, stale_after=stale_after):
+                if 'STALE' in line:
+                    self.logger.warning('--%s', line)
+                else:
+                    self.logger.info('--%s', line)
@@ -0,0 +1,352 @@
+"""slack_events.py: asyncio receiver for the Slack Events API
+
+Notes:
+    alternative ingress to slackbot's RTM loop.  Slack POSTs event payloads,
+    the receiver acks immediately (Slack wants a 200 inside 3s) and runs the
+    normal slackbot-style handlers on a thread pool; handler replies go out
+    later through ``chat.postMessage``
+
+"""
+from os import path
+import asyncio
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import time
+
+from . import caching
+from . import exceptions
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+SLACK_API = 'https://slack.com/api/'
+MAX_REQUEST_AGE = 60 * 5  # reject replayed signatures older than this
+MAX_BODY_BYTES = 1024 * 1024  # event payloads are a few KB; don't buffer whatever is claimed
+HTTP_REASONS = {
+    200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+    413: 'Payload Too Large',
+}
+
+class SlackWebDirectory(object):
+    """per-workspace lookups/replies over the Slack web API
+
+    Notes:
+        quacks like the bits of ``slackbot.slackclient.SlackClient`` that
+        ``platform_utils.parse_slack_message_object`` reads: ``channels``,
+        ``users`` and ``login_data['team']``
+
+    Args:
+        api_token (str): bot token for the workspace
+        session (:obj:`requests.Session`, optional): HTTP session to use
+
+    """
+    def __init__(self, api_token, session=None):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.api_token = api_token
+        self.session = session
+        self.channels = _LazyLookup(self._fetch_channel)
+        self.users = _LazyLookup(self._fetch_user)
+
+        auth = self.call('auth.test')
+        self.bot_id = auth['user_id']
+        self.login_data = {
+            'team': {'id': auth['team_id'], 'name': auth['team']},
+            'self': {'id': auth['user_id'], 'name': auth['user']},
+        }
+
+    def call(self, method, **params):
+        """call a web API method
+
+        Args:
+            method (str): e.g. ``chat.postMessage``
+            params (dict): method arguments
+
+        Returns:
+            (dict): response payload
+
+        Raises:
+            RuntimeError: slack said ``ok: false``
+
+        """
+        req = self.session.post(
+            SLACK_API + method,
+            data=params,
+            headers={'Authorization': 'Bearer ' + self.api_token}
+        )
+        req.raise_for_status()
+        data = req.json()
+        if not data.get('ok'):
+            raise RuntimeError('{} failed: {}'.format(method, data.get('error')))
+        return data
+
+    def _fetch_channel(self, channel_id):
+        channel = self.call('conversations.info', channel=channel_id)['channel']
+        if channel.get('is_im'):
+            raise KeyError(channel_id)  # parse_slack_message_object treats DMs as KeyError
+        return channel
+
+    def _fetch_user(self, user_id):
+        return self.call('users.info', user=user_id)['user']
+
+    def post_message(self, channel, text):
+        """deferred reply for a handler"""
+        return self.call('chat.postMessage', channel=channel, text=text, as_user=True)
+
+
+class _LazyLookup(dict):
+    """dict that fills missing keys from ``fetch_func`` and remembers them"""
+    def __init__(self, fetch_func):
+        super().__init__()
+        self.fetch_func = fetch_func
+
+    def __missing__(self, key):
+        value = self.fetch_func(key)
+        self[key] = value
+        return value
+
+
+class EventMessage(object):
+    """stand-in for ``slackbot.dispatcher.Message`` built from an events-API payload
+
+    Args:
+        client (:obj:`SlackWebDirectory`): workspace the event came from
+        body (dict): ``event`` portion of the payload
+
+    """
+    def __init__(self, client, body):
+        self._client = client
+        self._body = body
+
+    @property
+    def body(self):
+        return self._body
+
+    @property
+    def channel(self):
+        return self._body['channel']
+
+    def send(self, text):
+        """reply into the originating channel"""
+        return self._client.post_message(self._body['channel'], text)
+
+    def reply(self, text):
+        """reply to the originating user"""
+        return self.send('<@{}>: {}'.format(self._body['user'], text))
+
+
+def match_handlers(plugins, category, text):
+    """find every handler whose pattern matches ``text``
+
+    Args:
+        plugins (dict): ``slackbot.manager.PluginsManager.commands``
+        category (str): ``listen_to`` or ``respond_to``
+        text (str): message text
+
+    Returns:
+        (:obj:`list`): (handler, match groups) pairs
+
+    """
+    matches = []
+    for matcher, handler in plugins.get(category, {}).items():
+        match = matcher.search(text)
+        if match:
+            matches.append((handler, match.groups()))
+    return matches
+
+def verify_signature(signing_secret, timestamp, body, signature, now=None):
+    """check Slack's ``X-Slack-Signature`` header
+
+    Args:
+        signing_secret (str): app signing secret
+        timestamp (str): ``X-Slack-Request-Timestamp`` header
+        body (bytes): raw request body
+        signature (str): ``X-Slack-Signature`` header
+        now (float, optional): current time (for tests)
+
+    Returns:
+        (bool): request is authentic and fresh
+
+    """
+    now = time.time() if now is None else now
+    try:
+        if abs(now - int(timestamp)) > MAX_REQUEST_AGE:
+            return False
+    except (TypeError, ValueError):
+        return False
+
+    base = b'v0:' + timestamp.encode() + b':' + body
+    expected = 'v0=' + hmac.new(signing_secret.encode(), base, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+class EventsReceiver(object):
+    """minimal HTTP endpoint for Slack event payloads
+
+    Args:
+        plugins (dict): ``slackbot.manager.PluginsManager.commands``
+        directories (dict): team_id: :obj:`SlackWebDirectory`
+        signing_secret (str, optional): app signing secret every request is verified with
+        insecure (bool, optional): accept unsigned requests when there's no secret
+        max_workers (int, optional): handler threads
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Raises:
+        InsecureEndpoint: no ``signing_secret`` and not ``insecure``
+
+    """
+    def __init__(
+            self,
+            plugins,
+            directories,
+            signing_secret='',
+            insecure=False,
+            max_workers=32,
+            logger=api_config.LOGGER
+    ):
+        if not signing_secret:
+            if not insecure:
+                raise exceptions.InsecureEndpoint(
+                    'no signing secret: anyone reaching the endpoint could forge events')
+            logger.warning('Accepting UNSIGNED slack events: never expose this endpoint')
+        self.plugins = plugins
+        self.directories = directories
+        self.signing_secret = signing_secret
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.seen_events = caching.TTLCache(default_ttl=MAX_REQUEST_AGE)
+        self.pending = 0
+        self.logger = logger
+
+    async def handle(self, reader, writer):
+        """``asyncio.start_server`` callback: one HTTP request per connection"""
+        try:
+            status, response = await self._respond(reader)
+        except Exception:
+            self.logger.warning('unable to parse events-API request', exc_info=True)
+            status, response = 400, {}
+
+        body = json.dumps(response).encode()
+        writer.write(
+            'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+            'Content-Length: {}\r\nConnection: close\r\n\r\n'.format(
+                status, HTTP_REASONS.get(status, ''), len(body)
+            ).encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+    async def _respond(self, reader):
+        """read one request and decide the reply
+
+        Returns:
+            (int): HTTP status
+            (dict): JSON response
+
+        """
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if not 0 <= length <= MAX_BODY_BYTES:
+            self.logger.warning('refusing %s byte events-API request', length)
+            return 413, {}
+        body = await reader.readexactly(length)
+
+        if len(request_line) < 2 or request_line[0] != 'POST':
+            return 404, {}
+
+        if self.signing_secret and not verify_signature(
+                self.signing_secret,
+                headers.get('x-slack-request-timestamp'),
+                body,
+                headers.get('x-slack-signature')
+        ):
+            self.logger.warning('rejecting unsigned events-API request')
+            return 401, {}
+
+        payload = json.loads(body.decode('utf-8'))
+        if payload.get('type') == 'url_verification':
+            return 200, {'challenge': payload.get('challenge')}
+
+        if payload.get('type') == 'event_callback':
+            event_id = payload.get('event_id')
+            if event_id and self.seen_events.touch(event_id):
+                self.logger.info('--dropping retried event %s', event_id)
+            else:
+                self.pending += 1
+                future = asyncio.get_event_loop().run_in_executor(
+                    self.executor, self.dispatch, payload
+                )
+                future.add_done_callback(self._done)
+
+        return 200, {}
+
+    def _done(self, future):
+        self.pending -= 1
+        if future.exception() is not None:
+            self.logger.error('events-API dispatch failed', exc_info=future.exception())
+
+    def dispatch(self, payload):
+        """run matching handlers for one event (worker thread)
+
+        Args:
+            payload (dict): full ``event_callback`` payload
+
+        Returns:
+            (int): handlers run
+
+        """
+        event = payload.get('event', {})
+        if event.get('type') != 'message' or event.get('subtype') or event.get('bot_id'):
+            return 0
+
+        client = self.directories.get(payload.get('team_id'))
+        if client is None:
+            self.logger.warning('no token for team %s', payload.get('team_id'))
+            return 0
+
+        text = event.get('text') or ''
+        category = 'listen_to'
+        mention = '<@{}>'.format(client.bot_id)
+        if text.startswith(mention):
+            category = 'respond_to'
+            text = text[len(mention):].lstrip(': ')
+        elif event.get('channel', '').startswith('D'):
+            category = 'respond_to'
+
+        body = dict(event)
+        body['text'] = text
+        handled = 0
+        for handler, args in match_handlers(self.plugins, category, text):
+            handled += 1
+            try:
+                handler(EventMessage(client, body), *args)
+            except Exception:
+                self.logger.error(
+                    'handler %s failed on %r', handler.__name__, text, exc_info=True)
+        return handled
+
+async def serve(receiver, host='127.0.0.1', port=3000, logger=api_config.LOGGER):
+    """start listening for Slack events
+
+    Args:
+        receiver (:obj:`EventsReceiver`): request handler
+        host (str, optional): interface to bind
+        port (int, optional): port to bind (0 = pick a free one)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`asyncio.AbstractServer`): running server
+
+    """
+    server = await asyncio.start_server(receiver.handle, host, port)
+    logger.info('Listening for slack events on %s', server.sockets[0].getsockname())
+    return server
@@ -0,0 +1,252 @@
+"""symbols.py: local ticker index + negative cache, so junk never reaches upstream
+
+Notes:
+    every ``$`` in chat ("$5 lunch", "$$$") used to cost a mode lookup, a
+    cooldown write and a failing upstream call.  Tokens are now checked for
+    shape, then against recently-failed symbols, then against a sorted index
+    of real tickers (when one has been loaded)
+
+"""
+from os import path
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import time
+
+from . import caching
+from . import exceptions
+from . import metrics
+from . import upstream
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+INDEX_PATH = path.join(HERE, 'cache', 'symbols.json')
+REFRESH_INTERVAL = 24 * 3600
+TICKER_SHAPE = re.compile(r'^[A-Z][A-Z0-9.\-]{0,9}$')
+BAD_SYMBOL_TTL = 3600
+
+class SymbolIndex(object):
+    """sorted, de-duplicated ticker list with bisect lookups
+
+    Args:
+        symbols (:obj:`list`): tickers (any case)
+
+    """
+    def __init__(self, symbols):
+        self.symbols = sorted({symbol.upper() for symbol in symbols if symbol})
+        self._by_length = None
+
+    def __contains__(self, symbol):
+        index = bisect.bisect_left(self.symbols, symbol)
+        return index < len(self.symbols) and self.symbols[index] == symbol
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def startswith(self, prefix, limit=10):
+        """tickers beginning with ``prefix``"""
+        start = bisect.bisect_left(self.symbols, prefix)
+        matches = []
+        for symbol in self.symbols[start:start + limit]:
+            if not symbol.startswith(prefix):
+                break
+            matches.append(symbol)
+        return matches
+
+    def suggest(self, symbol, limit=3, cutoff=0.6):
+        """"did you mean" candidates for an unknown ticker
+
+        Args:
+            symbol (str): unknown ticker
+            limit (int, optional): most suggestions
+            cutoff (float, optional): ``difflib`` similarity floor
+
+        Returns:
+            (:obj:`list`): closest tickers, best first
+
+        """
+        if self._by_length is None:
+            by_length = {}
+            for known in self.symbols:
+                by_length.setdefault(len(known), []).append(known)
+            self._by_length = by_length
+
+        candidates = []
+        for length in (len(symbol) - 1, len(symbol), len(symbol) + 1):
+            candidates.extend(self._by_length.get(length, []))
+        return difflib.get_close_matches(symbol, candidates, n=limit, cutoff=cutoff)
+
+
+INDEXES = {}  # 'stocks'/'coins': SymbolIndex; missing kind = accept anything well-shaped
+
+def install(stocks=None, coins=None):
+    """swap in fresh indexes (atomic per kind)"""
+    if stocks is not None:
+        INDEXES['stocks'] = SymbolIndex(stocks)
+    if coins is not None:
+        INDEXES['coins'] = SymbolIndex(coins)
+
+def looks_like_ticker(token):
+    """cheap shape check: "MU" yes, "5", "$$" or "5 LUNCH" no"""
+    return bool(TICKER_SHAPE.match(token.strip().upper()))
+
+def is_bad_symbol_error(err):
+    """upstream said "no such symbol" (as opposed to being down, or our own bug)
+
+    Notes:
+        only explicit answers count: HTTP 400/404, datareader's
+        ``SymbolNotSupported``, an unrecorded symbol (``RecordingNotFound``)
+        or an empty quote (``EmptyQuoteReturned``).  A bare ``KeyError`` is
+        as likely a formatting bug as a bad ticker, so it isn't cached
+
+    Args:
+        err (:obj:`Exception`): what the fetch raised
+
+    Returns:
+        (bool): safe to negative-cache the symbol
+
+    """
+    import prosper.datareader.exceptions as pdr_exceptions  # deferred: only needed on failure
+
+    if isinstance(err, (
+            exceptions.EmptyQuoteReturned,
+            exceptions.RecordingNotFound,
+            pdr_exceptions.SymbolNotSupported,
+    )):
+        return True
+    response = getattr(err, 'response', None)
+    return getattr(response, 'status_code', None) in (400, 404)
+
+def _bad_key(kind, symbol):
+    return '{}/{}'.format(kind, symbol)
+
+def remember_bad(symbol, kind='stocks', ttl=BAD_SYMBOL_TTL, logger=api_config.LOGGER):
+    """negative-cache a symbol upstream rejected
+
+    Args:
+        symbol (str): ticker
+        kind (str, optional): ``stocks`` or ``coins``
+        ttl (float, optional): seconds to remember
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    logger.info('--remembering bad %s symbol %s', kind, symbol)
+    caching.BAD_SYMBOLS.set(_bad_key(kind, symbol.upper()), True, ttl=ttl)
+
+def check_ticker(symbol, kind='stocks'):
+    """decide whether a ticker is worth an upstream call
+
+    Args:
+        symbol (str): ticker
+        kind (str, optional): ``stocks`` or ``coins``
+
+    Returns:
+        (bool): go ahead
+        (str): why not (``shape``, ``known_bad``, ``unknown``) or ''
+
+    """
+    symbol = symbol.strip().upper()
+    if not TICKER_SHAPE.match(symbol):
+        reason = 'shape'
+    elif _bad_key(kind, symbol) in caching.BAD_SYMBOLS:
+        reason = 'known_bad'
+    elif kind in INDEXES and symbol not in INDEXES[kind]:
+        reason = 'unknown'
+    else:
+        return True, ''
+
+    metrics.REGISTRY.incr('symbols.rejected_{}'.format(reason))
+    return False, reason
+
+def suggest(symbol, kind='stocks', limit=3):
+    """"did you mean" candidates (empty without an index)"""
+    index = INDEXES.get(kind)
+    if index is None or not looks_like_ticker(symbol):
+        return []
+    return index.suggest(symbol.strip().upper(), limit=limit)
+
+def load(index_path=INDEX_PATH, logger=api_config.LOGGER):
+    """install indexes saved by ``refresh()``
+
+    Args:
+        index_path (str, optional): JSON written by ``save()``
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (float): when the saved index was built (0 if nothing to load)
+
+    """
+    if not path.isfile(index_path):
+        logger.info('No symbol index at %s', index_path)
+        return 0.0
+
+    with open(index_path, 'r') as index_fh:
+        data = json.load(index_fh)
+    install(stocks=data.get('stocks'), coins=data.get('coins'))
+    logger.info(
+        'Loaded symbol index: %s stocks, %s coins',
+        len(data.get('stocks') or []), len(data.get('coins') or []))
+    return data.get('updated', 0.0)
+
+def save(index_path=INDEX_PATH):
+    """write the installed indexes to disk"""
+    os.makedirs(path.dirname(index_path), exist_ok=True)
+    data = {'updated': time.time()}
+    for kind, index in INDEXES.items():
+        data[kind] = index.symbols
+    tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())  # both bots refresh this file
+    with open(tmp_path, 'w') as index_fh:
+        json.dump(data, index_fh)
+    os.replace(tmp_path, index_path)
+
+def refresh(index_path=INDEX_PATH, logger=api_config.LOGGER):
+    """rebuild indexes from upstream and save them
+
+    Notes:
+        a kind that fails to download keeps its current index
+
+    Args:
+        index_path (str, optional): where to save
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    logger.info('Refreshing symbol index')
+    for kind, fetch_func in (('stocks', upstream.stock_symbols), ('coins', upstream.coin_symbols)):
+        try:
+            install(**{kind: fetch_func(logger=logger)})
+        except Exception:
+            logger.warning('unable to refresh %s symbols', kind, exc_info=True)
+    save(index_path)
+
+def start_refresher(
+        index_path=INDEX_PATH,
+        interval=REFRESH_INTERVAL,
+        logger=api_config.LOGGER
+):
+    """load the saved index now, refresh it in the background when stale
+
+    Args:
+        index_path (str, optional): saved index
+        interval (float, optional): seconds between refreshes
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`threading.Thread`): refresher
+
+    """
+    updated = load(index_path, logger=logger)
+
+    def run():
+        wait = max(updated + interval - time.time(), 0)
+        while True:
+            time.sleep(wait)
+            refresh(index_path, logger=logger)
+            wait = interval
+
+    thread = threading.Thread(target=run, name='symbol-refresh', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,263 @@
+"""tickstore.py: per-ticker intraday history from quotes we already fetch
+
+Notes:
+    one file per ticker: a 32 byte header (magic, capacity, records written)
+    then ``capacity`` fixed 24 byte ``(timestamp, price, volume)`` little-endian
+    float64 records used as a ring.  Files are ``mmap``'d, so any process on
+    the host can read them with ``numpy.memmap``/``TickRing`` and no IPC.
+    Writers take an ``flock`` per append (sharded workers share files); a
+    record is written before the count moves, so readers never see a slot
+    that is still being filled
+
+"""
+from os import path
+from collections import OrderedDict
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from . import config as api_config
+
+HERE = path.abspath(path.dirname(__file__))
+
+TICK_PATH = path.join(HERE, 'cache', 'ticks')
+MAGIC = b'PBTICK01'
+HEADER = struct.Struct('<8sQQQ')  # magic, capacity, written, reserved
+RECORD = struct.Struct('<ddd')  # timestamp, price, volume
+DTYPE = [('timestamp', '<f8'), ('price', '<f8'), ('volume', '<f8')]
+DEFAULT_CAPACITY = 4096
+MAX_OPEN = 256  # mmap'd files kept open per process
+
+class TickRing(object):
+    """one ticker's memory-mapped ring of tick records
+
+    Args:
+        ring_path (str): file to open (created if missing)
+        capacity (int, optional): records kept when creating a new file
+            (an existing file keeps the capacity it was built with)
+        writable (bool, optional): open for appends
+
+    """
+    def __init__(self, ring_path, capacity=DEFAULT_CAPACITY, writable=True):
+        self.ring_path = ring_path
+        self._lock = threading.Lock()  # flock() doesn't exclude threads sharing a handle
+        if writable and not path.isfile(ring_path):
+            self._create(ring_path, capacity)
+
+        self._fh = open(ring_path, 'r+b' if writable else 'rb')
+        self._mmap = mmap.mmap(
+            self._fh.fileno(), 0,
+            access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        )
+        magic, self.capacity, _, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a tick ring'.format(ring_path))
+
+    @staticmethod
+    def _create(ring_path, capacity):
+        os.makedirs(path.dirname(ring_path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(ring_path, os.getpid())
+        with open(tmp_path, 'wb') as ring_fh:
+            ring_fh.write(HEADER.pack(MAGIC, capacity, 0, 0))
+            ring_fh.truncate(HEADER.size + capacity * RECORD.size)
+        try:
+            os.link(tmp_path, ring_path)  # fails if another process got there first
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    @property
+    def written(self):
+        """(int): records ever appended (slot = written % capacity)"""
+        return HEADER.unpack_from(self._mmap, 0)[2]
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, timestamp, price, volume=float('nan')):
+        """add one tick, overwriting the oldest once full"""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fh, fcntl.LOCK_EX)
+            try:
+                written = self.written
+                RECORD.pack_into(
+                    self._mmap,
+                    HEADER.size + (written % self.capacity) * RECORD.size,
+                    timestamp, price, volume
+                )
+                HEADER.pack_into(self._mmap, 0, MAGIC, self.capacity, written + 1, 0)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fh, fcntl.LOCK_UN)
+
+    def views(self):
+        """zero-copy numpy views of the ring, oldest records first
+
+        Returns:
+            (:obj:`tuple`): ``(older, newer)`` structured arrays (``older`` is
+            empty until the ring has wrapped).  Views alias the file: copy
+            anything you need to keep stable
+
+        """
+        import numpy as np  # deferred: writers never need numpy
+
+        written = self.written
+        records = np.frombuffer(
+            self._mmap, dtype=DTYPE, count=self.capacity, offset=HEADER.size)
+        if written <= self.capacity:
+            return records[:0], records[:written]
+        split = written % self.capacity
+        return records[split:], records[:split]
+
+    def history(self, since=None):
+        """every kept tick in time order (a copy)
+
+        Args:
+            since (float, optional): only ticks at/after this epoch time
+
+        Returns:
+            (:obj:`numpy.ndarray`): ``timestamp``/``price``/``volume`` records
+
+        """
+        import numpy as np
+
+        older, newer = self.views()
+        ticks = np.concatenate([older, newer])
+        if since is not None:
+            ticks = ticks[ticks['timestamp'] >= since]
+        return ticks
+
+    def close(self):
+        """release the mapping and file handle"""
+        if getattr(self, '_mmap', None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:  # a reader still holds views(); GC unmaps it later
+                pass
+            self._mmap = None
+        self._fh.close()
+
+
+class TickStore(object):
+    """``TickRing`` per (kind, ticker) under one directory
+
+    Args:
+        root (str, optional): directory holding ``<kind>/<TICKER>.ticks`` files
+        capacity (int, optional): records per new ring
+        max_open (int, optional): rings kept mapped at once (least recent closed first)
+
+    """
+    def __init__(self, root=TICK_PATH, capacity=DEFAULT_CAPACITY, max_open=MAX_OPEN):
+        self.root = root
+        self.capacity = capacity
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._rings = OrderedDict()
+
+    def ring_path(self, kind, ticker):
+        """(str): file backing a ticker's ring"""
+        return path.join(self.root, kind, '{}.ticks'.format(ticker.upper()))
+
+    def ring(self, kind, ticker):
+        """open (or reuse) a ticker's ring for writing"""
+        key = (kind, ticker.upper())
+        with self._lock:
+            ring = self._rings.pop(key, None)
+            if ring is None:
+                ring = TickRing(self.ring_path(kind, ticker), capacity=self.capacity)
+            self._rings[key] = ring  # most recently used last
+            while len(self._rings) > self.max_open:
+                self._rings.popitem(last=False)[1].close()
+            return ring
+
+    def append(self, kind, ticker, price, volume=float('nan'), timestamp=None):
+        """record one tick
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            ticker (str): ticker quoted
+            price (float): quoted price
+            volume (float, optional): quoted volume (NaN if unknown)
+            timestamp (float, optional): epoch seconds (default now)
+
+        """
+        self.ring(kind, ticker).append(
+            time.time() if timestamp is None else timestamp, price, volume)
+
+    def history(self, kind, ticker, since=None):
+        """ticks recorded for a ticker (empty if never seen)
+
+        Args:
+            kind (str): ``stocks`` or ``coins``
+            ticker (str): ticker to read
+            since (float, optional): only ticks at/after this epoch time
+
+        Returns:
+            (:obj:`numpy.ndarray`): ``timestamp``/``price``/``volume`` records
+
+        """
+        if not path.isfile(self.ring_path(kind, ticker)):
+            import numpy as np
+            return np.zeros(0, dtype=DTYPE)
+        return self.ring(kind, ticker).history(since=since)
+
+    def close(self):
+        """unmap every open ring"""
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
+
+
+STORE = None  # TickStore once configured; None = don't record
+
+def configure(config, logger=api_config.LOGGER):
+    """start recording ticks per ``[ProsperBot] tick_capacity``/``tick_path``
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`TickStore`): store in use, or None when disabled
+
+    """
+    global STORE
+    capacity = int(config.get_option('ProsperBot', 'tick_capacity', None, DEFAULT_CAPACITY))
+    if capacity <= 0:
+        STORE = None
+        return None
+
+    root = config.get_option('ProsperBot', 'tick_path', None, '') or TICK_PATH
+    logger.info('Recording up to %s ticks per ticker in %s', capacity, root)
+    STORE = TickStore(root, capacity=capacity)
+    return STORE
+
+def record(kind, ticker, price, volume=None, logger=api_config.LOGGER):
+    """append a fetched quote to the configured store (never raises)
+
+    Args:
+        kind (str): ``stocks`` or ``coins``
+        ticker (str): ticker quoted
+        price (float): quoted price
+        volume (float, optional): quoted volume
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    if STORE is None:
+        return
+    try:
+        STORE.append(
+            kind, ticker, float(price), float('nan') if volume is None else float(volume))
+    except Exception:
+        logger.warning('unable to record tick for %s', ticker, exc_info=True)
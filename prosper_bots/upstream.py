@@ -0,0 +1,597 @@
+"""upstream.py: one gateway for every prosper.datareader call
+
+Notes:
+    every bot/team/shard in a process shares this module, so concurrent asks
+    for the same data collapse into one upstream call, total concurrency is
+    capped, and HTTP connections are pooled instead of re-handshaking per call
+
+"""
+from os import path
+from collections import Counter
+import json
+import random
+import threading
+import time
+
+from . import config as api_config
+from . import exceptions
+from . import metrics
+
+HERE = path.abspath(path.dirname(__file__))
+
+MAX_CONCURRENT = 8
+_POOL_SIZE = MAX_CONCURRENT
+_POOL = threading.BoundedSemaphore(MAX_CONCURRENT)
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+SESSION = None
+SOURCE = None  # stand-in for prosper.datareader (benchmarks/offline runs)
+
+STOCK_SYMBOLS_URI = 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqtraded.txt'
+FX_RATES_URI = 'https://min-api.cryptocompare.com/data/price'
+STOCK_HISTORY_URI = 'https://api.robinhood.com/quotes/historicals/{ticker}/'
+STOCK_HISTORY_SPANS = ((5, 'week'), (21, 'month'), (63, '3month'), (252, 'year'), (1260, '5year'))
+
+# `prosper.datareader.coins.columns_to_yahoo()`: CryptoCompare column -> yahoo column
+CC_TO_YAHOO = {
+    'CoinName': 'name',
+    'FullName': 'more_info',
+    'Name': 'symbol',
+    'TotalCoinSupply': 'shares_outstanding',
+    'TotalCoinsFreeFloat': 'float_shares',
+    'LASTVOLUME': 'volume',
+    'MKTCAP': 'market_capitalization',
+    'CHANGEPCT24HOUR': 'change_pct',
+    'MARKET': 'stock_exchange',
+    'OPEN24HOUR': 'open',
+    'HIGH24HOUR': 'high',
+    'LOW24HOUR': 'low',
+    'PRICE': 'last',
+    'LASTUPDATE': 'timestamp',
+}
+
+# `prosper.datareader.stocks.SUMMARY_KEYS`: columns `get_quote_rh()` keeps by default
+SUMMARY_KEYS = ['symbol', 'name', 'pe_ratio', 'change_pct', 'current_price', 'updated_at']
+# columns the bot asks `get_quote_rh()` for: baskets price change off `previous_close`,
+# movers and tick history use the day's share `volume`
+QUOTE_KEYS = SUMMARY_KEYS + ['previous_close', 'volume']
+
+# datareader modules that talk HTTP through module-level `requests.get()`
+POOLED_MODULES = [
+    'prosper.datareader.robinhood.quotes',
+    'prosper.datareader.robinhood.news',
+    'prosper.datareader.cryptocompare.quotes',
+]
+
+def configure(max_concurrent=MAX_CONCURRENT, logger=api_config.LOGGER):
+    """resize the shared upstream pool
+
+    Args:
+        max_concurrent (int, optional): simultaneous upstream calls allowed
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global _POOL, _POOL_SIZE, SESSION
+    logger.info('Configuring upstream pool: max_concurrent=%s', max_concurrent)
+    _POOL_SIZE = max_concurrent
+    _POOL = threading.BoundedSemaphore(max_concurrent)
+    SESSION = None  # rebuilt with new pool size on next call
+
+def _pooled_session(pool_size):
+    """build a keep-alive HTTP session sized to the upstream pool
+
+    Args:
+        pool_size (int): connections to keep per host
+
+    Returns:
+        (:obj:`requests.Session`): shared session
+
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def _datareader(module_name):
+    """import a datareader module on first use, routed through the shared session
+
+    Args:
+        module_name (str): e.g. ``prosper.datareader.stocks``
+
+    Returns:
+        (:obj:`module`): imported module
+
+    """
+    global SESSION
+    import importlib
+
+    module = importlib.import_module(module_name)
+    if SESSION is None:
+        SESSION = _pooled_session(_POOL_SIZE)
+        for pooled_name in POOLED_MODULES:
+            # datareader only ever calls `requests.get()`, which a Session provides
+            importlib.import_module(pooled_name).requests = SESSION
+    return module
+
+def use_source(source, logger=api_config.LOGGER):
+    """answer upstream calls from a stand-in instead of prosper.datareader
+
+    Args:
+        source (object): provides ``get_quote_rh``, ``get_quote_cc`` and
+            ``company_news_rh`` with datareader's signatures.  None restores datareader
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global SOURCE
+    logger.info('Upstream source: %s', 'prosper.datareader' if source is None else source)
+    SOURCE = source
+
+class RecordedSource(object):
+    """replays recorded datareader payloads, offline and deterministic
+
+    Notes:
+        recording layout (JSON)::
+
+            {
+                "get_quote_rh": {"MU": {<QUOTE_KEYS columns of a datareader quote>}},
+                "get_quote_cc": {"USD": {"BTC": {<CryptoCompare row>}}},
+                "company_news_rh": {"MU": [{<article>}, ...]},
+                "fx_rates": {"USD": {"EUR": 0.81, ...}},
+                "daily_closes": {
+                    "stocks": {"MU": [["2018-01-19", 43.77], ...]},
+                    "coins": {"USD": {"BTC": [["2018-01-19", 11594.25], ...]}}
+                },
+                "stock_symbols": ["MU", ...],
+                "coin_symbols": ["BTC", ...]
+            }
+
+    Args:
+        recording_path (str): path to recording JSON
+        latency (float, optional): seconds added to every call
+        jitter (float, optional): +/- seconds of random extra latency
+        error_rate (float, optional): 0-1 odds a call raises ``InjectedUpstreamError``
+        seed (int, optional): random seed for jitter/errors
+
+    """
+    def __init__(
+            self,
+            recording_path,
+            latency=0.0,
+            jitter=0.0,
+            error_rate=0.0,
+            seed=None
+    ):
+        with open(recording_path, 'r') as recording_fh:
+            self.recording = json.load(recording_fh)
+        self.recording_path = recording_path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+
+    def __str__(self):
+        return 'RecordedSource({}, latency={}s, error_rate={})'.format(
+            path.basename(self.recording_path), self.latency, self.error_rate)
+
+    def _play(self, endpoint, *keys):
+        """simulate the wire then look up a recorded payload
+
+        Raises:
+            InjectedUpstreamError: dice said fail
+            RecordingNotFound: nothing recorded for ``keys``
+
+        """
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise exceptions.InjectedUpstreamError('{} {}'.format(endpoint, keys))
+
+        payload = self.recording.get(endpoint, {})
+        try:
+            for key in keys:
+                payload = payload[key]
+        except KeyError:
+            raise exceptions.RecordingNotFound('{} {}'.format(endpoint, keys))
+        return payload
+
+    def get_quote_rh(
+            self,
+            ticker_list,
+            keys=SUMMARY_KEYS,
+            logger=api_config.LOGGER,
+            **kwargs
+    ):
+        """``prosper.datareader.stocks.get_quote_rh`` replay
+
+        Notes:
+            like datareader, only ``keys`` columns come back (all recorded
+            ones when ``keys`` is empty); asking for an unrecorded column
+            raises ``KeyError``
+
+        """
+        import pandas as pd
+        quote_df = pd.DataFrame([
+            self._play('get_quote_rh', ticker.upper()) for ticker in ticker_list
+        ])
+        return quote_df[keys] if keys else quote_df
+
+    def get_quote_cc(
+            self,
+            coin_list,
+            currency='USD',
+            to_yahoo=False,
+            logger=api_config.LOGGER,
+            **kwargs
+    ):
+        """``prosper.datareader.coins.get_quote_cc`` replay
+
+        Notes:
+            coins are recorded as CryptoCompare rows (pricemultifull merged
+            with coin info), and come back that way unless ``to_yahoo``, like
+            datareader: then only ``CC_TO_YAHOO`` columns are kept, renamed,
+            indexed by symbol, with ``change_pct`` as a ``+2.10%`` string
+
+        """
+        import pandas as pd
+        quote_df = pd.DataFrame([
+            self._play('get_quote_cc', currency.upper(), coin.upper()) for coin in coin_list
+        ])
+        if not to_yahoo:
+            return quote_df
+
+        quote_df = quote_df[[column for column in CC_TO_YAHOO if column in quote_df.columns]]
+        quote_df = quote_df.rename(columns=CC_TO_YAHOO, index=quote_df['Name'])
+        quote_df['change_pct'] = [
+            '{:+.2%}'.format(change / 100) for change in quote_df['change_pct']
+        ]
+        return quote_df
+
+    def company_news_rh(self, ticker, logger=api_config.LOGGER, **kwargs):
+        """``prosper.datareader.news.company_news_rh`` replay"""
+        import pandas as pd
+        news_df = pd.DataFrame(self._play('company_news_rh', ticker.upper()))
+        news_df['published_at'] = pd.to_datetime(news_df['published_at'])
+        return news_df
+
+    def fx_rates(self, base, currencies, logger=api_config.LOGGER):
+        """``fx_rates()`` replay (unrecorded currencies are left out, like cryptocompare)"""
+        recorded = self._play('fx_rates', base.upper())
+        return {
+            currency.upper(): recorded[currency.upper()]
+            for currency in currencies if currency.upper() in recorded
+        }
+
+    def daily_closes(self, ticker, kind='stocks', days=30, currency='USD', logger=api_config.LOGGER):
+        """``daily_closes()`` replay (the latest ``days`` recorded)"""
+        keys = ('stocks', ticker.upper()) if kind == 'stocks' else \
+            ('coins', currency.upper(), ticker.upper())
+        return [tuple(row) for row in self._play('daily_closes', *keys)[-days:]]
+
+    def stock_symbols(self, logger=api_config.LOGGER):
+        """``stock_symbols()`` replay"""
+        return list(self._play('stock_symbols'))
+
+    def coin_symbols(self, logger=api_config.LOGGER):
+        """``coin_symbols()`` replay"""
+        return list(self._play('coin_symbols'))
+
+def configure_source(config, logger=api_config.LOGGER):
+    """pick the upstream source from ``[Upstream]`` in config
+
+    Notes:
+        ``source = datareader`` (default) or ``source = recorded`` with
+        ``recording_path`` (relative to the config file), ``latency_ms``,
+        ``jitter_ms``, ``error_rate`` and ``seed``
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): config to read
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (object): the source in use (None = prosper.datareader)
+
+    """
+    source_name = config.get_option('Upstream', 'source', None, 'datareader')
+    if source_name == 'datareader':
+        use_source(None, logger=logger)
+        return None
+
+    if source_name != 'recorded':
+        raise exceptions.UpstreamException('unsupported [Upstream] source: {}'.format(source_name))
+
+    recording_path = path.join(
+        path.dirname(path.abspath(config.config_filename)),
+        config.get_option('Upstream', 'recording_path', None, 'recording.json')
+    )
+    seed = config.get_option('Upstream', 'seed', None, None)
+    source = RecordedSource(
+        recording_path,
+        latency=float(config.get_option('Upstream', 'latency_ms', None, 0)) / 1000.0,
+        jitter=float(config.get_option('Upstream', 'jitter_ms', None, 0)) / 1000.0,
+        error_rate=float(config.get_option('Upstream', 'error_rate', None, 0)),
+        seed=None if seed is None else int(seed)
+    )
+    use_source(source, logger=logger)
+    return source
+
+def _source(module_name):
+    """the configured stand-in, or the real datareader module"""
+    if SOURCE is not None:
+        return SOURCE
+    return _datareader(module_name)
+
+class _Call(object):
+    """one upstream call other threads can wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def _coalesce(key, fetch_func, logger=api_config.LOGGER):
+    """run ``fetch_func`` once for every concurrent caller asking for ``key``
+
+    Args:
+        key (tuple): identity of the upstream request
+        fetch_func (:obj:`callable`): does the actual fetch
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (any): ``fetch_func()`` result
+
+    Raises:
+        Exception: whatever ``fetch_func`` raised, for every waiter
+
+    """
+    with _INFLIGHT_LOCK:
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _INFLIGHT[key] = _Call()
+
+    if not leader:
+        logger.info('--joining in-flight upstream call %s', key)
+        metrics.REGISTRY.incr('upstream.coalesced')
+        call.done.wait()
+    else:
+        try:
+            with _POOL, metrics.timer('upstream.' + key[0]):
+                call.result = fetch_func()
+        except Exception as err:
+            call.error = err
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(key, None)
+            call.done.set()
+
+    if call.error is not None:
+        raise call.error
+    return call.result
+
+def get_quote_rh(ticker_list, keys=QUOTE_KEYS, logger=api_config.LOGGER):
+    """``prosper.datareader.stocks.get_quote_rh`` through the shared pool
+
+    Notes:
+        datareader only returns ``keys`` columns (``SUMMARY_KEYS`` unless
+        asked), so every column the bot reads has to be listed here
+
+    Args:
+        ticker_list (str or :obj:`list`): ticker(s) to look up
+        keys (:obj:`list`, optional): columns to return
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): stock quote(s)
+
+    """
+    stocks = _source('prosper.datareader.stocks')
+    if isinstance(ticker_list, str):
+        ticker_list = [ticker_list]
+    return _coalesce(
+        ('get_quote_rh', tuple(ticker_list), tuple(keys or ())),
+        lambda: stocks.get_quote_rh(ticker_list, keys=keys, logger=logger),
+        logger=logger
+    )
+
+def get_quote_cc(coin_list, currency='USD', to_yahoo=False, logger=api_config.LOGGER):
+    """``prosper.datareader.coins.get_quote_cc`` through the shared pool
+
+    Args:
+        coin_list (:obj:`list`): coin tickers to look up
+        currency (str, optional): currency to FOREX against
+        to_yahoo (bool, optional): convert names to yahoo analog
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): coin quote(s)
+
+    """
+    coins = _source('prosper.datareader.coins')
+    return _coalesce(
+        ('get_quote_cc', tuple(coin_list), currency, to_yahoo),
+        lambda: coins.get_quote_cc(
+            coin_list, currency=currency, to_yahoo=to_yahoo, logger=logger
+        ),
+        logger=logger
+    )
+
+def company_news_rh(ticker, logger=api_config.LOGGER):
+    """``prosper.datareader.news.company_news_rh`` through the shared pool
+
+    Args:
+        ticker (str): stock ticker
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`pandas.DataFrame`): news feed
+
+    """
+    news = _source('prosper.datareader.news')
+    return _coalesce(
+        ('company_news_rh', ticker),
+        lambda: news.company_news_rh(ticker, logger=logger),
+        logger=logger
+    )
+
+def parse_symbol_directory(text):
+    """tickers from a nasdaqtrader.com symbol directory file
+
+    Args:
+        text (str): pipe-delimited file, header first, "File Creation Time" footer
+
+    Returns:
+        (:obj:`list`): tradeable (non-test) symbols
+
+    """
+    lines = text.splitlines()
+    header = lines[0].split('|')
+    symbol_column = header.index('Symbol')
+    test_column = header.index('Test Issue') if 'Test Issue' in header else None
+
+    symbols = []
+    for line in lines[1:]:
+        fields = line.split('|')
+        if len(fields) != len(header):
+            continue  # footer
+        if test_column is not None and fields[test_column] == 'Y':
+            continue
+        symbols.append(fields[symbol_column])
+    return symbols
+
+def stock_symbols(logger=api_config.LOGGER):
+    """every US-listed ticker, through the shared pool
+
+    Args:
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): ticker symbols
+
+    """
+    if SOURCE is not None:
+        fetch_func = lambda: SOURCE.stock_symbols(logger=logger)
+    else:
+        def fetch_func():
+            _datareader('prosper.datareader.stocks')  # builds SESSION
+            req = SESSION.get(STOCK_SYMBOLS_URI)
+            req.raise_for_status()
+            return parse_symbol_directory(req.text)
+
+    return _coalesce(('stock_symbols',), fetch_func, logger=logger)
+
+def coin_symbols(logger=api_config.LOGGER):
+    """every coin cryptocompare knows, through the shared pool
+
+    Args:
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): coin symbols
+
+    """
+    if SOURCE is not None:
+        fetch_func = lambda: SOURCE.coin_symbols(logger=logger)
+    else:
+        def fetch_func():
+            quotes = _datareader('prosper.datareader.cryptocompare.quotes')
+            return [coin['Symbol'] for coin in quotes.get_supported_symbols_cc()]
+
+    return _coalesce(('coin_symbols',), fetch_func, logger=logger)
+
+def fx_rates(base, currencies, logger=api_config.LOGGER):
+    """units of each currency one ``base`` buys, through the shared pool
+
+    Args:
+        base (str): currency to price from (``USD``)
+        currencies (:obj:`list`): currencies to price into
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`dict`): currency: rate
+
+    Raises:
+        UpstreamException: cryptocompare refused the request
+
+    """
+    currencies = tuple(sorted(currency.upper() for currency in currencies))
+    if SOURCE is not None:
+        fetch_func = lambda: SOURCE.fx_rates(base, currencies, logger=logger)
+    else:
+        def fetch_func():
+            _datareader('prosper.datareader.cryptocompare.quotes')  # builds SESSION
+            req = SESSION.get(
+                FX_RATES_URI, params={'fsym': base.upper(), 'tsyms': ','.join(currencies)})
+            req.raise_for_status()
+            data = req.json()
+            if data.get('Response') == 'Error':
+                raise exceptions.UpstreamException(data.get('Message', 'fx rates refused'))
+            return {currency.upper(): float(rate) for currency, rate in data.items()}
+
+    return _coalesce(('fx_rates', base.upper(), currencies), fetch_func, logger=logger)
+
+def daily_closes(ticker, kind='stocks', days=30, currency='USD', logger=api_config.LOGGER):
+    """closing prices for the latest ``days`` sessions, through the shared pool
+
+    Notes:
+        stocks come from robinhood historicals (smallest span covering
+        ``days``), coins from cryptocompare ``histoday`` (UTC days).  The
+        latest row can be a session still in progress
+
+    Args:
+        ticker (str): stock or coin ticker
+        kind (str, optional): ``stocks`` or ``coins``
+        days (int, optional): sessions wanted
+        currency (str, optional): currency coins are priced in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): ``(YYYY-MM-DD, close)`` pairs, oldest first
+
+    Raises:
+        UpstreamException: no history for ``ticker``
+
+    """
+    ticker = ticker.upper()
+    if SOURCE is not None:
+        fetch_func = lambda: SOURCE.daily_closes(
+            ticker, kind=kind, days=days, currency=currency, logger=logger)
+    elif kind == 'stocks':
+        def fetch_func():
+            _datareader('prosper.datareader.robinhood.quotes')  # builds SESSION
+            span = next(
+                (name for limit, name in STOCK_HISTORY_SPANS if days <= limit),
+                STOCK_HISTORY_SPANS[-1][1]
+            )
+            req = SESSION.get(
+                STOCK_HISTORY_URI.format(ticker=ticker),
+                params={'interval': 'day', 'span': span}
+            )
+            req.raise_for_status()
+            rows = req.json().get('historicals') or []
+            if not rows:
+                raise exceptions.UpstreamException('no history for {}'.format(ticker))
+            return [
+                (row['begins_at'][:10], float(row['close_price'])) for row in rows[-days:]
+            ]
+    else:
+        def fetch_func():
+            coins = _datareader('prosper.datareader.coins')
+            ohlc_df = coins.get_ohlc_cc(ticker, days, currency=currency, logger=logger)
+            if ohlc_df.empty or not ohlc_df['close'].any():
+                raise exceptions.UpstreamException('no history for {}'.format(ticker))
+            return [
+                (day.strftime('%Y-%m-%d'), float(close))
+                for day, close in zip(ohlc_df['datetime'], ohlc_df['close'])
+            ][-days:]
+
+    return _coalesce(
+        ('daily_closes', kind, ticker, days, currency), fetch_func, logger=logger)
@@ -1,6 +1,8 @@
 """utils.py: generic functions that drive individual bot responses"""
 from os import path
 from enum import Enum
+from collections import OrderedDict
+import time
 
 HERE = path.abspath(path.dirname(__file__))
 
@@ -15,3 +17,56 @@ class Sources(Enum):
     """supported data sources"""
     robinhood = 'robinhood'
     hitbtc = 'hitBTC'
+
+
+class StartupReport(object):
+    """track how long each phase of bot startup takes
+
+    Notes:
+        phases are recorded back-to-back: each phase runs from the end of the
+        previous one (or ``begin``) until ``mark()`` is called
+
+    Args:
+        begin (float, optional): ``time.perf_counter()`` value startup began at
+
+    """
+    def __init__(self, begin=None):
+        self.begin = time.perf_counter() if begin is None else begin
+        self.phases = OrderedDict()
+        self._last = self.begin
+
+    def mark(self, phase_name):
+        """close out a phase that ends now
+
+        Args:
+            phase_name (str): name of phase (import, config, db, connect)
+
+        Returns:
+            (float): seconds spent in phase
+
+        """
+        now = time.perf_counter()
+        self.phases[phase_name] = now - self._last
+        self._last = now
+        return self.phases[phase_name]
+
+    @property
+    def total(self):
+        """(float): seconds from ``begin`` to last mark"""
+        return self._last - self.begin
+
+    def __str__(self):
+        return ' '.join(
+            ['{}={:.3f}s'.format(name, elapsed) for name, elapsed in self.phases.items()] +
+            ['total={:.3f}s'.format(self.total)]
+        )
+
+    def log(self, logger, prefix='STARTUP TIMER'):
+        """emit report to log
+
+        Args:
+            logger (:obj:`logging.logger`): logging handle
+            prefix (str, optional): label for log line
+
+        """
+        logger.info('%s -- %s', prefix, str(self))
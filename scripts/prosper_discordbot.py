@@ -1,14 +1,16 @@
 """prosper_discordbot.py: main method for slackbot"""
+import time
+STARTUP_BEGIN = time.perf_counter()  # before heavy imports, for startup report
+
 from os import path
+import asyncio
+import multiprocessing
 import platform
-import re
 import pprint
 
 import discord
 from discord.ext import commands as discord_commands
 from plumbum import cli
-from contexttimer import Timer
-import requests
 
 import prosper.common.prosper_logging as p_logging
 import prosper.common.prosper_config as p_config
@@ -16,31 +18,37 @@ import prosper.common.prosper_config as p_config
 ## TODO: need more path than expected?
 from prosper_bots._version import __version__
 import prosper_bots.config as api_config
+import prosper_bots.alerts as alerts
+import prosper_bots.caching as caching
 import prosper_bots.utils as utils
 import prosper_bots.connections as connections
+import prosper_bots.digest as digest
+import prosper_bots.fx as fx
+import prosper_bots.history as history
+import prosper_bots.log_pipeline as log_pipeline
+import prosper_bots.market_hours as market_hours
+import prosper_bots.metrics as metrics
 import prosper_bots.platform_utils as platform_utils
+import prosper_bots.prefetch as prefetch
+import prosper_bots.profiling as profiling
 import prosper_bots.commands as commands
 import prosper_bots.exceptions as exceptions
+import prosper_bots.sharding as sharding
+import prosper_bots.symbols as symbols
+import prosper_bots.tickstore as tickstore
+import prosper_bots.upstream as upstream
 
 HERE = path.abspath(path.dirname(__file__))
 CONFIG = p_config.ProsperConfig(path.join(HERE, 'bot_config.cfg'))
 PROGNAME = 'ProsperDiscordBot'
-CONN = connections.build_connection('discordbot')
+CONN = None  # built in main() so importing the script stays cheap
+STARTUP = None
+HEALTH_BOARD = None  # shared worker health, only in sharded mode
+ALERTS = None  # alerts.AlertEngine for the shards this process runs
+DISCORD_BOTS = {}  # shard_id: bot, for posting alerts
 PP = pprint.PrettyPrinter(indent=2)
 
-bot = discord_commands.Bot(
-    command_prefix=CONFIG.get('DiscordBot', 'bot_prefix'),
-    description='ProsperBot is BESTBOT'
-)
-
-@bot.event
-async def on_ready():
-    api_config.LOGGER.info('Logged in as')
-    api_config.LOGGER.info(bot.user.name)
-    api_config.LOGGER.info(bot.user.id)
-    api_config.LOGGER.info('------')
-
-@bot.command(pass_context=True)
+@discord_commands.command(pass_context=True)
 async def version(context):
     """echo deployment info"""
     message_info = platform_utils.parse_discord_context_object(context)
@@ -56,13 +64,104 @@ async def version(context):
     except Exception:  # pragma: no cover
         api_config.LOGGER.error('Unable to build version info', exc_info=True)
 
-    await bot.say(version_str)
+    await context.bot.say(version_str)
+
+@discord_commands.command(pass_context=True)
+async def health(context):
+    """report worker/shard health"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Health Info',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+    )
+
+    if HEALTH_BOARD is None:
+        lines = ['single process: shard_id={} guilds={}'.format(
+            context.bot.shard_id, len(context.bot.servers))]
+    else:
+        lines = sharding.summarize_health(HEALTH_BOARD)
+
+    await context.bot.say('```' + '\n'.join(lines) + '```')
+
+@discord_commands.command(pass_context=True)
+async def stats(context):
+    """admin: per-command counters and latency percentiles (this process)"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Stats',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+    )
+    if not platform_utils.is_admin(
+            message_info['user'],
+            CONFIG.get_option('ProsperBot', 'admin_ids', None, '')
+    ):
+        api_config.LOGGER.warning(
+            '--%s (%s) is not an admin', message_info['user_name'], message_info['user'])
+        return
 
-@bot.command(pass_context=True)
+    await context.bot.say('```' + metrics.stats_report(logger=api_config.LOGGER) + '```')
+
+@discord_commands.command(pass_context=True)
+async def profile(context, target):
+    """admin: `profile 30` samples the process for 30s, `profile MU` profiles one quote"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Profile %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        target
+    )
+    admins = CONFIG.get_option('ProsperBot', 'admin_ids', None, '')
+    if not platform_utils.admin_ids(admins):
+        api_config.LOGGER.warning('--profiling disabled: [ProsperBot] admin_ids is blank')
+        return
+    if not platform_utils.is_admin(message_info['user'], admins):
+        api_config.LOGGER.warning(
+            '--%s (%s) is not an admin', message_info['user_name'], message_info['user'])
+        return
+
+    loop = context.bot.loop
+    if target.isdigit():
+        await context.bot.say('Profiling for {}s'.format(min(int(target), profiling.MAX_SECONDS)))
+        try:
+            profile_file = await loop.run_in_executor(
+                None, profiling.profile_process, int(target))
+        except Exception as err:
+            await context.bot.say('Unable to profile: `{}`'.format(repr(err)))
+            return
+        await context.bot.say('Profile written to `{}`'.format(profile_file))
+        return
+
+    ticker = target.upper().lstrip('$')
+    try:
+        data, profile_file, elapsed = await loop.run_in_executor(
+            None,
+            lambda: profiling.profile_call(
+                'stock-' + ticker,
+                commands.generic_stock_info,
+                ticker,
+                CONN,
+                cooldown_time=0,
+                logger=api_config.LOGGER
+            )
+        )
+    except exceptions.ProfilerBusy as err:
+        await context.bot.say('Unable to profile: `{}`'.format(err))
+        return
+    await context.bot.say('```{}``` in {:.3f}s -- profile written to `{}`'.format(
+        data, elapsed, profile_file))
+
+@discord_commands.command(pass_context=True)
 async def price(context, ticker):
     """fetch relevant article for requested stock"""
     ticker = ticker.upper()
-    message_info = platform_utils.parse_discord_context_object(context)
+    with metrics.timer('price.parse'):
+        message_info = platform_utils.parse_discord_context_object(context)
     api_config.LOGGER.info(
         '%s #%s @%s -- Stock News `%s`',
         message_info['team_name'],
@@ -73,7 +172,9 @@ async def price(context, ticker):
 
     try:
         quote = commands.generic_stock_info(
-            ticker, CONN, cooldown_time=0, logger=api_config.LOGGER,
+            ticker, CONN, logger=api_config.LOGGER,
+            cooldown_time=int(CONFIG.get_option('DiscordBot', 'cooldown_time', None, 0)),
+            cooldown_cache=caching.COOLDOWNS,
             info_mask=['name', 'current_price', 'change_pct']
         )
         if not quote:
@@ -85,12 +186,20 @@ async def price(context, ticker):
             direction,
             logger=api_config.LOGGER
         )
+        if CONFIG.get_option('ProsperBot', 'sparklines', None, 'False') == 'True':
+            spark = commands.intraday_summary(
+                ticker,
+                width=int(CONFIG.get_option('ProsperBot', 'sparkline_width', None, 16)),
+                logger=api_config.LOGGER
+            )
+            quote = ' '.join([quote, spark]) if spark else quote
     except exceptions.ProsperBotException:
         api_config.LOGGER.warning(
             'Unable to resolve basic stock info for %s',
             ticker, exc_info=True
         )
-        quote = 'ERROR - NO QUOTE DATA FOUND FOR {}'.format(ticker)
+        quote = commands.ticker_suggestion(ticker, 'stocks') or \
+            'ERROR - NO QUOTE DATA FOUND FOR {}'.format(ticker)
         link = ''
         details = ''
     except Exception as err:
@@ -106,31 +215,35 @@ async def price(context, ticker):
 
     if quote:  # only emit if there is data
         api_config.LOGGER.debug(quote)
-        await bot.say(
-            '```' + quote + '```\n' +
-            link + ' ' + details
-        )
+        with metrics.timer('price.send'):
+            await context.bot.say(
+                '```' + quote + '```\n' +
+                link + ' ' + details
+            )
 
-@bot.command(pass_context=True)
-async def coin(context, ticker, currency='USD'):
-    """fetch relevant article for requested stock"""
+@discord_commands.command(pass_context=True)
+async def coin(context, ticker, *currencies):
+    """`coin BTC` / `coin BTC EUR JPY`: coin price in one or more currencies"""
     ticker = ticker.upper()
-    currency = currency.upper()
-    message_info = platform_utils.parse_discord_context_object(context)
+    currencies = [currency.upper() for currency in currencies] or \
+        [CONFIG.get_option('ProsperBot', 'currency', None, 'USD')]
+    with metrics.timer('coin.parse'):
+        message_info = platform_utils.parse_discord_context_object(context)
     api_config.LOGGER.info(
         '%s #%s @%s -- Cryptocoin Info `%s`x%s',
         message_info['team_name'],
         message_info['channel_name'],
         message_info['user_name'],
-        ticker, currency
+        ticker, ','.join(currencies)
     )
 
     try:
         quote = commands.generic_coin_info(
             ticker,
             CONN,
-            currency=currency,
-            cooldown_time=0,
+            currency=currencies,
+            cooldown_time=int(CONFIG.get_option('DiscordBot', 'cooldown_time', None, 0)),
+            cooldown_cache=caching.COOLDOWNS,
             logger=api_config.LOGGER
         )
         if not quote:
@@ -140,7 +253,8 @@ async def coin(context, ticker, currency='USD'):
             'Unable to resolve coin info for %s',
             ticker, exc_info=True
         )
-        quote = 'ERROR - NO QUOTE DATA FOUND FOR {}'.format(ticker)
+        quote = commands.ticker_suggestion(ticker, 'coins') or \
+            'ERROR - NO QUOTE DATA FOUND FOR {}'.format(ticker)
     except Exception as err:
         api_config.LOGGER.error(
             'Unable to resolve basic stock info for %s',
@@ -153,9 +267,417 @@ async def coin(context, ticker, currency='USD'):
 
     if quote:
         api_config.LOGGER.debug(quote)
-        await bot.say(
-            '```' + quote + '```'
+        with metrics.timer('coin.send'):
+            await context.bot.say(
+                '```' + quote + '```'
+            )
+
+@discord_commands.command(pass_context=True, aliases=['top'])
+async def movers(context, kind='coins'):
+    """`movers` / `movers stocks`: top gainers/losers/volume across the configured universe"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Movers %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        kind
+    )
+    if kind not in ('stocks', 'coins'):
+        await context.bot.say('usage: `movers` or `movers stocks`')
+        return
+
+    try:
+        response = await context.bot.loop.run_in_executor(
+            None,
+            lambda: commands.market_movers(
+                CONFIG.get_option('Movers', kind, None, '').replace(' ', '').split(','),
+                kind=kind,
+                currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+                count=int(CONFIG.get_option('Movers', 'count', None, 5)),
+                ttl=float(CONFIG.get_option('Movers', 'ttl', None, 60)),
+                logger=api_config.LOGGER
+            )
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to rank movers', exc_info=True)
+        response = 'ERROR - UNABLE TO RANK MOVERS -- {}'.format(repr(err))
+
+    with metrics.timer('movers.send'):
+        await context.bot.say('```' + response + '```')
+
+async def _watchlist(context, kind, args):
+    """shared body of ``watchlist``/``coinwatch``"""
+    with metrics.timer('watchlist.parse'):
+        message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Watchlist %s %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        kind, args
+    )
+
+    def build_response():
+        if args:
+            return commands.update_watchlist(
+                message_info['channel'],
+                args[0].lower(),
+                ' '.join(args[1:]).replace(',', ' ').split(),
+                message_info['user_name'],
+                CONN,
+                kind=kind,
+                max_size=int(CONFIG.get_option('ProsperBot', 'watchlist_size', None, 25)),
+                logger=api_config.LOGGER
+            )
+        return commands.channel_watchlist(
+            message_info['channel'],
+            CONN,
+            kind=kind,
+            currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+            logger=api_config.LOGGER
+        )
+
+    try:
+        response = await context.bot.loop.run_in_executor(None, build_response)
+    except Exception as err:
+        api_config.LOGGER.error('Unable to resolve watchlist', exc_info=True)
+        response = 'ERROR - UNABLE TO RESOLVE WATCHLIST -- {}'.format(repr(err))
+
+    with metrics.timer('watchlist.send'):
+        await context.bot.say('```' + response + '```')
+
+@discord_commands.command(pass_context=True)
+async def watchlist(context, *args):
+    """`watchlist` table, or `watchlist add MU INTC` / `remove MU` / `clear`"""
+    await _watchlist(context, 'stocks', args)
+
+@discord_commands.command(pass_context=True)
+async def coinwatch(context, *args):
+    """`coinwatch` table, or `coinwatch add BTC ETH` / `remove BTC` / `clear`"""
+    await _watchlist(context, 'coins', args)
+
+async def _compare(context, kind, args):
+    """shared body of ``compare``/``coincompare``"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Compare %s %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        kind, args
+    )
+    tickers, days = commands.parse_compare_args(' '.join(args).replace(',', ' ').split())
+    try:
+        response = await context.bot.loop.run_in_executor(
+            None,
+            lambda: commands.compare(
+                tickers,
+                days=days,
+                kind=kind,
+                width=int(CONFIG.get_option('ProsperBot', 'sparkline_width', None, 16)),
+                logger=api_config.LOGGER
+            )
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to compare %s', tickers, exc_info=True)
+        response = 'ERROR - UNABLE TO COMPARE -- {}'.format(repr(err))
+
+    with metrics.timer('compare.send'):
+        await context.bot.say('```' + response + '```')
+
+@discord_commands.command(pass_context=True)
+async def compare(context, *args):
+    """`compare MU INTC AMD 30d`: relative performance over the last N sessions"""
+    await _compare(context, 'stocks', args)
+
+@discord_commands.command(pass_context=True)
+async def coincompare(context, *args):
+    """`coincompare BTC ETH 30d`: relative performance over the last N days (USD)"""
+    await _compare(context, 'coins', args)
+
+async def _set_alert(context, kind, ticker, args):
+    """shared body of ``alert``/``coinalert``"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Price alert %s %s %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        kind, ticker, args
+    )
+    if ALERTS is None:
+        await context.bot.say('price alerts are not enabled')
+        return
+    if len(args) not in (1, 2) or (len(args) == 2 and args[0].lower() not in alerts.DIRECTIONS):
+        await context.bot.say('usage: `alert MU 50` or `alert MU below 40`')
+        return
+
+    try:
+        response = await context.bot.loop.run_in_executor(
+            None,
+            lambda: commands.set_price_alert(
+                ALERTS,
+                ticker.lstrip('$'),
+                args[-1],
+                message_info['channel'],
+                message_info['user_name'],
+                kind=kind,
+                direction=args[0].lower() if len(args) == 2 else None,
+                currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+                max_per_channel=int(CONFIG.get_option('Alerts', 'max_per_channel', None, 25)),
+                shard_id=context.bot.shard_id,
+                logger=api_config.LOGGER
+            )
         )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to set alert for %s', ticker, exc_info=True)
+        response = 'Unable to set alert: {}'.format(repr(err))
+
+    await context.bot.say('```' + response + '```')
+
+@discord_commands.command(pass_context=True)
+async def alert(context, ticker, *args):
+    """`alert MU 50` / `alert MU below 40`: announce when a stock crosses a price"""
+    await _set_alert(context, 'stocks', ticker, args)
+
+@discord_commands.command(pass_context=True)
+async def coinalert(context, ticker, *args):
+    """`coinalert BTC 20000`: announce when a coin crosses a price"""
+    await _set_alert(context, 'coins', ticker, args)
+
+@discord_commands.command(pass_context=True, name='alerts')
+async def list_alerts(context):
+    """list price alerts set in this channel"""
+    if ALERTS is None:
+        await context.bot.say('price alerts are not enabled')
+        return
+    message_info = platform_utils.parse_discord_context_object(context)
+    await context.bot.say(
+        '```' + commands.list_price_alerts(ALERTS, message_info['channel']) + '```')
+
+@discord_commands.command(pass_context=True)
+async def unalert(context, alert_id):
+    """`unalert 1a2b3c4d`: cancel a price alert"""
+    if ALERTS is None:
+        await context.bot.say('price alerts are not enabled')
+        return
+    message_info = platform_utils.parse_discord_context_object(context)
+    await context.bot.say('```' + commands.cancel_price_alert(
+        ALERTS, alert_id, message_info['channel'], logger=api_config.LOGGER) + '```')
+
+@discord_commands.command(pass_context=True, name='digest')
+async def digest_subscription(context, action, kind='stocks'):
+    """`digest on` / `digest off coins`: scheduled open/midday/close digests of the watchlist"""
+    message_info = platform_utils.parse_discord_context_object(context)
+    api_config.LOGGER.info(
+        '%s #%s @%s -- Digest %s %s',
+        message_info['team_name'],
+        message_info['channel_name'],
+        message_info['user_name'],
+        action, kind
+    )
+    if kind not in ('stocks', 'coins'):
+        await context.bot.say('usage: `digest on` or `digest off coins`')
+        return
+
+    try:
+        response = await context.bot.loop.run_in_executor(
+            None,
+            lambda: commands.update_digest(
+                message_info['channel'],
+                action.lower(),
+                CONN,
+                kind=kind,
+                shard_id=context.bot.shard_id,
+                logger=api_config.LOGGER
+            )
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to update digest', exc_info=True)
+        response = 'Unable to update digest: {}'.format(repr(err))
+
+    await context.bot.say('```' + response + '```')
+
+COMMANDS = [
+    version, health, stats, profile, price, coin, movers,
+    watchlist, coinwatch, compare, coincompare, alert, coinalert, list_alerts, unalert,
+    digest_subscription
+]
+
+def build_bot(**client_kwargs):
+    """build a bot with every command registered
+
+    Args:
+        client_kwargs (dict): passed through to ``discord.Client`` (shard_id, shard_count, loop)
+
+    Returns:
+        (:obj:`discord.ext.commands.Bot`): ready-to-run bot
+
+    """
+    new_bot = discord_commands.Bot(
+        command_prefix=CONFIG.get('DiscordBot', 'bot_prefix'),
+        description='ProsperBot is BESTBOT',
+        **client_kwargs
+    )
+
+    async def on_ready():
+        api_config.LOGGER.info('Logged in as')
+        api_config.LOGGER.info(new_bot.user.name)
+        api_config.LOGGER.info(new_bot.user.id)
+        api_config.LOGGER.info('shard %s of %s', new_bot.shard_id, new_bot.shard_count)
+        api_config.LOGGER.info('------')
+
+        if STARTUP and 'connect' not in STARTUP.phases:
+            STARTUP.mark('connect')
+            STARTUP.log(api_config.LOGGER)
+
+    new_bot.event(on_ready)
+    for command in COMMANDS:
+        new_bot.add_command(command)
+    DISCORD_BOTS[new_bot.shard_id] = new_bot
+
+    return new_bot
+
+def start_prefetch(logger=api_config.LOGGER):
+    """keep hot tickers warm (per process: counters and threads don't cross ``fork()``)"""
+    return prefetch.start_from_config(
+        CONFIG,
+        commands.prefetch_jobs(
+            currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+            news=CONFIG.get_option('Prefetch', 'news', None, 'False') == 'True'
+        ),
+        logger=logger
+    )
+
+def post(shard_id, channel, text):
+    """post into a channel from a background thread (alerts, digests)
+
+    Args:
+        shard_id (int): shard the channel's guild lives on (None: the only shard)
+        channel (str): channel id
+        text (str): message body
+
+    Returns:
+        (bool): False when this process has no bot for that shard
+
+    """
+    bot = DISCORD_BOTS.get(shard_id)
+    if bot is None and len(DISCORD_BOTS) == 1:
+        bot = list(DISCORD_BOTS.values())[0]
+    if bot is None:
+        return False
+
+    asyncio.run_coroutine_threadsafe(
+        bot.send_message(discord.Object(id=channel), text), bot.loop)
+    return True
+
+def announce_alert(alert, price):
+    """``alerts.AlertEngine`` notify hook: post into the alert's channel (called off-loop)"""
+    text = '```' + alerts.announcement(alert, price) + '```'
+    if not post(alert.get('shard_id'), alert['channel'], text):
+        api_config.LOGGER.warning('no shard connection for alert %s', alert['alert_id'])
+
+def send_digest(subscription, text):
+    """``digest.DigestScheduler`` send hook (called off-loop)"""
+    if not post(subscription.get('shard_id'), subscription['channel'], '```' + text + '```'):
+        api_config.LOGGER.warning('no shard connection for digest %s', subscription['channel'])
+
+def start_alerts(owns=None, logger=api_config.LOGGER):
+    """start the alert engine for this process's shards
+
+    Args:
+        owns (:obj:`callable`, optional): ``owns(alert)`` filter (sharded workers)
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global ALERTS
+    interval = float(CONFIG.get_option('Alerts', 'interval', None, 30))
+    if not interval:
+        return
+
+    ALERTS = alerts.AlertEngine(
+        CONN,
+        announce_alert,
+        owns=owns,
+        currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+        logger=logger
+    ).start(interval)
+
+def run_shard_worker(
+        worker_id,
+        shard_ids,
+        shard_count,
+        health_board,
+        caches=None,
+        token=''
+):
+    """worker process: run one bot per owned shard on a single event loop
+
+    Args:
+        worker_id (int): index of this worker
+        shard_ids (:obj:`list`): gateway shards owned by this worker
+        shard_count (int): total gateway shards
+        health_board (:obj:`dict`): shared health reports
+        caches (:obj:`dict`, optional): shared caches from ``caching.share_caches()``
+        token (str, optional): discord api token
+
+    """
+    global CONN, HEALTH_BOARD
+    log_pipeline.restart_after_fork(api_config.LOGGER)
+    HEALTH_BOARD = health_board
+    if caches:
+        caching.install_caches(caches)
+    CONN = connections.build_connection(
+        'discordbot',
+        backend=CONFIG.get_option('ProsperBot', 'storage_backend', None, 'tinymongo'),
+        logger=api_config.LOGGER
+    )
+    metrics.serve_from_config(CONFIG, port_offset=worker_id, logger=api_config.LOGGER)
+    profiling.install_signal_handler(
+        int(CONFIG.get_option('ProsperBot', 'profile_seconds', None, 30)),
+        logger=api_config.LOGGER
+    )
+    tickstore.configure(CONFIG, logger=api_config.LOGGER)  # own file handles: flock per process
+    symbols.start_refresher(  # refresher threads don't survive fork()
+        interval=float(CONFIG.get_option('ProsperBot', 'symbol_refresh_hours', None, 24)) * 3600,
+        logger=api_config.LOGGER
+    )
+    start_prefetch(api_config.LOGGER)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bots = [
+        build_bot(shard_id=shard_id, shard_count=shard_count, loop=loop)
+        for shard_id in shard_ids
+    ]
+    start_alerts(
+        owns=lambda alert: (alert.get('shard_id') or 0) in shard_ids,
+        logger=api_config.LOGGER
+    )
+    digest.start_from_config(
+        CONFIG, CONN, send_digest,
+        owns=lambda subscription: (subscription.get('shard_id') or 0) in shard_ids,
+        logger=api_config.LOGGER
+    )
+
+    def worker_status():
+        """shard-level status for the health board"""
+        return {
+            'shards': ','.join(map(str, shard_ids)),
+            'ready': sum(1 for shard_bot in bots if shard_bot.is_logged_in),
+            'guilds': sum(len(shard_bot.servers) for shard_bot in bots),
+            'quotes_cached': len(caching.QUOTES),
+        }
+
+    api_config.LOGGER.info('worker %s starting shards %s', worker_id, shard_ids)
+    loop.create_task(sharding.heartbeat(
+        health_board, worker_id, worker_status, loop=loop, logger=api_config.LOGGER
+    ))
+    loop.create_task(metrics.watch_loop_lag(gauge_name='discord_loop_lag_seconds', loop=loop))
+    loop.run_until_complete(asyncio.gather(
+        *[shard_bot.start(token) for shard_bot in bots]
+    ))
 
 
 class ProsperDiscordBot(cli.Application):
@@ -174,8 +696,42 @@ class ProsperDiscordBot(cli.Application):
         help='debug mode, high verbosity for devs'
     )
 
+    workers = cli.SwitchAttr(
+        '--workers',
+        int,
+        default=0,
+        help='sharded mode: worker processes (0 = single process, >0 needs sqlite storage)'
+    )
+
+    shards = cli.SwitchAttr(
+        '--shards',
+        int,
+        default=0,
+        help='sharded mode: total gateway shards (default: one per worker)'
+    )
+
+    def run_sharded(self, logger):
+        """start ``workers`` processes sharing caches, owning ``shards`` gateway shards"""
+        manager = multiprocessing.Manager()
+        supervisor = sharding.ShardSupervisor(
+            run_shard_worker,
+            self.shards or self.workers,
+            self.workers,
+            manager.dict(),
+            worker_kwargs={
+                'caches': caching.share_caches(manager, logger=logger),
+                'token': CONFIG.get('DiscordBot', 'api_token'),
+            },
+            logger=logger
+        )
+        supervisor.run()
+
     def main(self):
         """bot main"""
+        global CONN, STARTUP
+        STARTUP = utils.StartupReport(begin=STARTUP_BEGIN)
+        STARTUP.mark('import')
+
         if self.debug:
             self._log_builder.configure_debug_logger()
         else:
@@ -186,10 +742,63 @@ class ProsperDiscordBot(cli.Application):
         logger.info('Hello World')
         api_config.LOGGER = logger
         api_config.CONFIG = CONFIG
+        log_pipeline.install_queue_logging(
+            logger,
+            max_queue=int(CONFIG.get_option('ProsperBot', 'log_queue_size', None, 10000)),
+            log=logger
+        )
+        STARTUP.mark('config')
+
+        backend = CONFIG.get_option('ProsperBot', 'storage_backend', None, 'tinymongo')
+        try:
+            connections.require_multiprocess_backend(backend, self.workers)
+        except exceptions.UnsafeBackend:
+            logger.critical('Refusing to start sharded', exc_info=True)
+            return 1
+        CONN = connections.build_connection('discordbot', backend=backend, logger=logger)
+        upstream.configure_source(CONFIG, logger=logger)
+        market_hours.configure(CONFIG, logger=logger)
+        tickstore.configure(CONFIG, logger=logger)
+        history.configure(CONFIG, logger=logger)
+        fx.start_refresher(  # rates live in caching.QUOTES, which workers share
+            interval=float(CONFIG.get_option('ProsperBot', 'fx_refresh_minutes', None, 30)) * 60,
+            logger=logger
+        )
+        snapshot_path = caching.snapshot_path_for(CONFIG, PROGNAME, logger=logger)
+        caching.load_snapshot(snapshot_path, logger=logger)
+        caching.start_snapshots(
+            interval=float(CONFIG.get_option('ProsperBot', 'snapshot_seconds', None, 300)),
+            snapshot_path=snapshot_path,
+            logger=logger
+        )
+        symbols.start_refresher(
+            interval=float(CONFIG.get_option('ProsperBot', 'symbol_refresh_hours', None, 24)) * 3600,
+            logger=logger
+        )
+        profiling.configure(
+            self._log_builder.log_path,
+            cooldown=CONFIG.get_option('ProsperBot', 'profile_cooldown', None, 300),
+            max_files=CONFIG.get_option('ProsperBot', 'profile_max_files', None, 20),
+            logger=logger
+        )
+        profiling.install_signal_handler(
+            int(CONFIG.get_option('ProsperBot', 'profile_seconds', None, 30)), logger=logger)
+        STARTUP.mark('db')
 
         logger.error('STARTING PROSPERBOT -- DISCORD %s', platform.node())
+        status = None
         try:
-            status = bot.run(CONFIG.get('DiscordBot', 'api_token'))
+            if self.workers:
+                self.run_sharded(logger)
+            else:
+                metrics.serve_from_config(CONFIG, logger=logger)
+                start_prefetch(logger)
+                bot = build_bot()
+                start_alerts(logger=logger)
+                digest.start_from_config(CONFIG, CONN, send_digest, logger=logger)
+                bot.loop.create_task(metrics.watch_loop_lag(
+                    gauge_name='discord_loop_lag_seconds', loop=bot.loop))
+                status = bot.run(CONFIG.get('DiscordBot', 'api_token'))
         except Exception:
             logger.critical('Going down in flames!', exc_info=True)
 
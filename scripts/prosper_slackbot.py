@@ -1,14 +1,20 @@
 """prosper_slackbot.py: main method for slackbot"""
+import time
+STARTUP_BEGIN = time.perf_counter()  # before heavy imports, for startup report
+
 from os import path
+import asyncio
 import platform
 import re
 import pprint
-import json
+import threading
 
 import slackbot.bot
+from slackbot import settings as slack_settings
+from slackbot.dispatcher import MessageDispatcher
+from slackbot.manager import PluginsManager
+from slackbot.slackclient import SlackClient
 from plumbum import cli
-from contexttimer import Timer
-import requests
 
 import prosper.common.prosper_logging as p_logging
 import prosper.common.prosper_config as p_config
@@ -16,18 +22,76 @@ import prosper.common.prosper_config as p_config
 ## TODO: need more path than expected?
 from prosper_bots._version import __version__
 import prosper_bots.config as api_config
+import prosper_bots.alerts as alerts
+import prosper_bots.caching as caching
 import prosper_bots.utils as utils
 import prosper_bots.connections as connections
+import prosper_bots.digest as digest
+import prosper_bots.fx as fx
+import prosper_bots.history as history
+import prosper_bots.log_pipeline as log_pipeline
+import prosper_bots.market_hours as market_hours
+import prosper_bots.metrics as metrics
 import prosper_bots.platform_utils as platform_utils
+import prosper_bots.prefetch as prefetch
+import prosper_bots.profiling as profiling
 import prosper_bots.commands as commands
 import prosper_bots.exceptions as exceptions
+import prosper_bots.slack_events as slack_events
+import prosper_bots.symbols as symbols
+import prosper_bots.tickstore as tickstore
+import prosper_bots.upstream as upstream
 
 HERE = path.abspath(path.dirname(__file__))
 CONFIG = p_config.ProsperConfig(path.join(HERE, 'bot_config.cfg'))
 PROGNAME = 'ProsperSlackBot'
-CONN = connections.build_connection('slackbot')
+CONN = None  # built in main() so importing the script stays cheap
+MULTI_WORKSPACE = False  # namespace per-channel state by team (see configure_team_scope())
+ALERTS = None  # alerts.AlertEngine, started once workspaces are connected
+SLACK_CLIENTS = {}  # team_id: client that can post into that workspace
 PP = pprint.PrettyPrinter(indent=2)
 
+def team_collection(message_info, collection_name):
+    """pick the per-workspace collection for a message
+
+    Args:
+        message_info (dict): output of ``platform_utils.parse_slack_message_object``
+        collection_name (str): base collection name
+
+    Returns:
+        (str): collection to use
+
+    """
+    return connections.team_collection(
+        collection_name,
+        message_info['team_id'] if MULTI_WORKSPACE else None
+    )
+
+def configure_team_scope(api_tokens, logger=api_config.LOGGER):
+    """decide once, for every ingress mode, whether per-channel state is kept per team
+
+    Notes:
+        driven by ``[SlackBot] team_scoped_state`` alone, so the same tokens
+        see the same modes/watchlists/alerts/cooldowns whether served over
+        RTM, ``--workspaces`` or ``--events-port``
+
+    Args:
+        api_tokens (:obj:`list`): tokens this process will serve
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Raises:
+        ValueError: several workspaces would share one namespace
+
+    """
+    global MULTI_WORKSPACE
+    MULTI_WORKSPACE = CONFIG.get_option('SlackBot', 'team_scoped_state', None, 'False') == 'True'
+    if len(api_tokens) > 1 and not MULTI_WORKSPACE:
+        raise ValueError(
+            'serving {} workspaces needs [SlackBot] team_scoped_state = True'.format(
+                len(api_tokens)))
+    logger.info('Per-channel state is %s', 'kept per team' if MULTI_WORKSPACE else 'shared')
+    return MULTI_WORKSPACE
+
 @slackbot.bot.respond_to('version', re.IGNORECASE)
 def which_prosperbot(message):
     """echo deployment info"""
@@ -63,6 +127,7 @@ def change_mode(message, mode):
             mode,
             message_info['user_name'],
             CONN,
+            channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
             logger=api_config.LOGGER
         )
     except Exception as err:
@@ -78,11 +143,82 @@ def change_mode(message, mode):
     message.send('OK, I set this channel to `{}`'.format(set_mode.value))
 
 
+@slackbot.bot.respond_to('^stats$', re.IGNORECASE)
+def stats(message):
+    """admin: per-command counters and latency percentiles"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Stats',
+        message_info['channel_name'],
+        message_info['user_name']
+    )
+    if not platform_utils.is_admin(
+            message_info['user'],
+            CONFIG.get_option('ProsperBot', 'admin_ids', None, '')
+    ):
+        api_config.LOGGER.warning(
+            '--%s (%s) is not an admin', message_info['user_name'], message_info['user'])
+        return
+
+    message.send('```' + metrics.stats_report(logger=api_config.LOGGER) + '```')
+
+
+@slackbot.bot.respond_to(r'^profile \$?(\S+)$', re.IGNORECASE)
+def profile(message, target):
+    """admin: `profile 30` samples the process for 30s, `profile $MU` profiles one quote"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Profile %s',
+        message_info['channel_name'],
+        message_info['user_name'],
+        target
+    )
+    admins = CONFIG.get_option('ProsperBot', 'admin_ids', None, '')
+    if not platform_utils.admin_ids(admins):
+        api_config.LOGGER.warning('--profiling disabled: [ProsperBot] admin_ids is blank')
+        return
+    if not platform_utils.is_admin(message_info['user'], admins):
+        api_config.LOGGER.warning(
+            '--%s (%s) is not an admin', message_info['user_name'], message_info['user'])
+        return
+
+    if target.isdigit():
+        def report(profile_file, error):
+            if error is not None:
+                message.send('Unable to profile: `{}`'.format(repr(error)))
+            else:
+                message.send('Profile written to `{}`'.format(profile_file))
+
+        profiling.profile_process_async(int(target), callback=report, logger=api_config.LOGGER)
+        message.send('Profiling for {}s'.format(min(int(target), profiling.MAX_SECONDS)))
+        return
+
+    ticker = target.upper()
+    try:
+        data, profile_file, elapsed = profiling.profile_call(
+            'stock-' + ticker,
+            commands.generic_stock_info,
+            ticker,
+            CONN,
+            cooldown_time=0,
+            logger=api_config.LOGGER
+        )
+    except exceptions.ProfilerBusy as err:
+        message.send('Unable to profile: `{}`'.format(err))
+        return
+    message.send('`{}` in {:.3f}s -- profile written to `{}`'.format(data, elapsed, profile_file))
+
+
 @slackbot.bot.listen_to(r'\$(.*)\s?')
 def generic_stock_info(message, ticker):
     """echo basic info about stock"""
     ticker = ticker.upper()
-    message_info = platform_utils.parse_slack_message_object(message)
+    if not symbols.looks_like_ticker(ticker):  # "$5 lunch", "$$$"
+        metrics.REGISTRY.incr('symbols.rejected_shape')
+        return
+
+    with metrics.timer('quote.parse'):
+        message_info = platform_utils.parse_slack_message_object(message)
     api_config.LOGGER.info(
         '#%s @%s -- Basic company info %s',
         message_info['channel_name'],
@@ -90,11 +226,13 @@ def generic_stock_info(message, ticker):
         ticker
     )
 
-    mode = connections.check_channel_mode(
-        message_info['channel'],
-        CONN,
-        logger=api_config.LOGGER
-    )
+    with metrics.timer('quote.mode'):
+        mode = connections.check_channel_mode(
+            message_info['channel'],
+            CONN,
+            channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+            logger=api_config.LOGGER
+        )
     api_config.LOGGER.info('Channel mode: %s', mode.value)
     try:
         if mode == connections.Modes.stocks:
@@ -102,13 +240,19 @@ def generic_stock_info(message, ticker):
                 ticker,
                 CONN,
                 cooldown_time=CONFIG.get_option('ProsperBot', 'generic_info', None, 30),
+                cooldown_collection=team_collection(message_info, connections.COOLDOWN_COLLECTION),
                 logger=api_config.LOGGER
             )
         elif mode == connections.Modes.coins:
             data = commands.generic_coin_info(
                 ticker,
                 CONN,
+                currency=(
+                    CONFIG.get_option('ProsperBot', 'coin_currencies', None, '') or
+                    CONFIG.get_option('ProsperBot', 'currency', None, 'USD')
+                ).replace(' ', '').upper().split(','),
                 cooldown_time=CONFIG.get_option('ProsperBot', 'generic_info', None, 30),
+                cooldown_collection=team_collection(message_info, connections.COOLDOWN_COLLECTION),
                 logger=api_config.LOGGER
             )
         else:
@@ -123,15 +267,29 @@ def generic_stock_info(message, ticker):
         api_config.LOGGER.error('Unable to resolve basic stock info for %s', ticker, exc_info=True)
         data = ''
 
+    if data and CONFIG.get_option('ProsperBot', 'sparklines', None, 'False') == 'True':
+        spark = commands.intraday_summary(
+            ticker,
+            mode.value,
+            width=int(CONFIG.get_option('ProsperBot', 'sparkline_width', None, 16)),
+            logger=api_config.LOGGER
+        )
+        data = ' '.join([data, spark]) if spark else data
+
+    if not data and CONFIG.get_option('ProsperBot', 'suggest_tickers', None, 'True') == 'True':
+        data = commands.ticker_suggestion(ticker, mode.value)
+
     if data:  # only emit if there is data
         api_config.LOGGER.debug(data)
-        message.send('`' + data + '`')
+        with metrics.timer('quote.send'):
+            message.send('`' + data + '`')
 
 @slackbot.bot.listen_to(r'^news \$*(.*)', re.IGNORECASE)
 def stock_news(message, ticker):
     """fetch relevant article for requested stock"""
     ticker = ticker.upper()
-    message_info = platform_utils.parse_slack_message_object(message)
+    with metrics.timer('news.parse'):
+        message_info = platform_utils.parse_slack_message_object(message)
     api_config.LOGGER.info(
         '#%s @%s -- Stock News %s',
         message_info['channel_name'],
@@ -139,11 +297,13 @@ def stock_news(message, ticker):
         ticker
     )
 
-    mode = connections.check_channel_mode(
-        message_info['channel'],
-        CONN,
-        logger=api_config.LOGGER
-    )
+    with metrics.timer('news.mode'):
+        mode = connections.check_channel_mode(
+            message_info['channel'],
+            CONN,
+            channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+            logger=api_config.LOGGER
+        )
     api_config.LOGGER.info('Channel mode: %s', mode.value)
     try:
         if mode == connections.Modes.stocks:
@@ -193,11 +353,391 @@ def stock_news(message, ticker):
 
     if quote:  # only emit if there is data
         api_config.LOGGER.debug(quote)
-        message.send(
-            '`' + quote + '`\n' +
-            link #+ ' ' + details
+        with metrics.timer('news.send'):
+            message.send(
+                '`' + quote + '`\n' +
+                link #+ ' ' + details
+            )
+
+@slackbot.bot.listen_to(r'^(?:movers|top)$', re.IGNORECASE)
+def movers(message):
+    """`movers`: top gainers/losers/volume across the configured universe"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Movers',
+        message_info['channel_name'],
+        message_info['user_name']
+    )
+    mode = connections.check_channel_mode(
+        message_info['channel'],
+        CONN,
+        channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+        logger=api_config.LOGGER
+    )
+    kind = mode.value if mode == connections.Modes.coins else 'stocks'
+    try:
+        response = commands.market_movers(
+            CONFIG.get_option('Movers', kind, None, '').replace(' ', '').split(','),
+            kind=kind,
+            currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+            count=int(CONFIG.get_option('Movers', 'count', None, 5)),
+            ttl=float(CONFIG.get_option('Movers', 'ttl', None, 60)),
+            logger=api_config.LOGGER
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to rank movers', exc_info=True)
+        response = 'ERROR - UNABLE TO RANK MOVERS -- {}'.format(repr(err))
+
+    with metrics.timer('movers.send'):
+        message.send('```' + response + '```')
+
+
+@slackbot.bot.listen_to(r'^compare\s+(.+)$', re.IGNORECASE)
+def compare(message, args):
+    """`compare MU INTC AMD 30d`: relative performance over the last N sessions"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Compare %s',
+        message_info['channel_name'],
+        message_info['user_name'],
+        args
+    )
+    mode = connections.check_channel_mode(
+        message_info['channel'],
+        CONN,
+        channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+        logger=api_config.LOGGER
+    )
+    tickers, days = commands.parse_compare_args(args.replace(',', ' ').split())
+    try:
+        response = commands.compare(
+            tickers,
+            days=days,
+            kind=mode.value if mode == connections.Modes.coins else 'stocks',
+            width=int(CONFIG.get_option('ProsperBot', 'sparkline_width', None, 16)),
+            logger=api_config.LOGGER
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to compare %s', tickers, exc_info=True)
+        response = 'ERROR - UNABLE TO COMPARE -- {}'.format(repr(err))
+
+    with metrics.timer('compare.send'):
+        message.send('```' + response + '```')
+
+
+@slackbot.bot.respond_to(r'^watchlist(?: (add|remove|clear)\b(.*))?$', re.IGNORECASE)
+def watchlist(message, action, tickers):
+    """`watchlist` table, or `watchlist add MU INTC` / `remove MU` / `clear`"""
+    with metrics.timer('watchlist.parse'):
+        message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Watchlist %s %s',
+        message_info['channel_name'],
+        message_info['user_name'],
+        action or 'show', tickers or ''
+    )
+
+    mode = connections.check_channel_mode(
+        message_info['channel'],
+        CONN,
+        channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+        logger=api_config.LOGGER
+    )
+    kind = mode.value if mode == connections.Modes.coins else 'stocks'
+    try:
+        if action:
+            response = commands.update_watchlist(
+                message_info['channel'],
+                action.lower(),
+                (tickers or '').replace(',', ' ').split(),
+                message_info['user_name'],
+                CONN,
+                kind=kind,
+                max_size=int(CONFIG.get_option('ProsperBot', 'watchlist_size', None, 25)),
+                watchlist_collection=team_collection(message_info, connections.WATCHLIST_COLLECTION),
+                logger=api_config.LOGGER
+            )
+        else:
+            response = commands.channel_watchlist(
+                message_info['channel'],
+                CONN,
+                kind=kind,
+                currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+                watchlist_collection=team_collection(message_info, connections.WATCHLIST_COLLECTION),
+                logger=api_config.LOGGER
+            )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to resolve watchlist', exc_info=True)
+        response = 'ERROR - UNABLE TO RESOLVE WATCHLIST -- {}'.format(repr(err))
+
+    with metrics.timer('watchlist.send'):
+        message.send('```' + response + '```')
+
+
+@slackbot.bot.respond_to(r'^digest (on|off)$', re.IGNORECASE)
+def digest_subscription(message, action):
+    """`digest on` / `digest off`: scheduled open/midday/close digests of the watchlist"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Digest %s',
+        message_info['channel_name'],
+        message_info['user_name'],
+        action
+    )
+    mode = connections.check_channel_mode(
+        message_info['channel'],
+        CONN,
+        channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+        logger=api_config.LOGGER
+    )
+    try:
+        response = commands.update_digest(
+            message_info['channel'],
+            action.lower(),
+            CONN,
+            kind=mode.value if mode == connections.Modes.coins else 'stocks',
+            watchlist_collection=team_collection(message_info, connections.WATCHLIST_COLLECTION),
+            team_id=message_info['team_id'],
+            logger=api_config.LOGGER
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to update digest', exc_info=True)
+        response = 'Unable to update digest: `{}`'.format(repr(err))
+
+    message.send('`' + response + '`')
+
+
+@slackbot.bot.respond_to(
+    r'^alert \$?(\S+?)(?: (above|below))? \$?([\d.,]+)$', re.IGNORECASE)
+def set_alert(message, ticker, direction, threshold):
+    """`alert $MU 50` / `alert $MU below 40`: announce when a price is crossed"""
+    message_info = platform_utils.parse_slack_message_object(message)
+    api_config.LOGGER.info(
+        '#%s @%s -- Price alert %s %s %s',
+        message_info['channel_name'],
+        message_info['user_name'],
+        ticker, direction, threshold
+    )
+    if ALERTS is None:
+        message.send('price alerts are not enabled')
+        return
+
+    mode = connections.check_channel_mode(
+        message_info['channel'],
+        CONN,
+        channel_mode_collection=team_collection(message_info, connections.CHANNEL_COLLECTION),
+        logger=api_config.LOGGER
+    )
+    try:
+        response = commands.set_price_alert(
+            ALERTS,
+            ticker,
+            threshold,
+            message_info['channel'],
+            message_info['user_name'],
+            kind=mode.value if mode == connections.Modes.coins else 'stocks',
+            direction=direction.lower() if direction else None,
+            currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+            max_per_channel=int(CONFIG.get_option('Alerts', 'max_per_channel', None, 25)),
+            team_id=message_info['team_id'],
+            logger=api_config.LOGGER
+        )
+    except Exception as err:
+        api_config.LOGGER.error('Unable to set alert for %s', ticker, exc_info=True)
+        response = 'Unable to set alert: `{}`'.format(repr(err))
+
+    message.send('`' + response + '`')
+
+
+@slackbot.bot.respond_to('^alerts$', re.IGNORECASE)
+def list_alerts(message):
+    """list price alerts set in this channel"""
+    if ALERTS is None:
+        message.send('price alerts are not enabled')
+        return
+    message_info = platform_utils.parse_slack_message_object(message)
+    message.send('```' + commands.list_price_alerts(ALERTS, message_info['channel']) + '```')
+
+
+@slackbot.bot.respond_to(r'^cancel alert (\S+)$', re.IGNORECASE)
+def cancel_alert(message, alert_id):
+    """`cancel alert 1a2b3c4d`"""
+    if ALERTS is None:
+        message.send('price alerts are not enabled')
+        return
+    message_info = platform_utils.parse_slack_message_object(message)
+    message.send('`' + commands.cancel_price_alert(
+        ALERTS, alert_id, message_info['channel'], logger=api_config.LOGGER) + '`')
+
+
+def post(team_id, channel, text):
+    """post into a channel from a background thread (alerts, digests)
+
+    Args:
+        team_id (str): workspace the channel belongs to (None: the only workspace)
+        channel (str): channel id
+        text (str): message body
+
+    Returns:
+        (bool): False when no connection reaches that workspace
+
+    """
+    client = SLACK_CLIENTS.get(team_id)
+    if client is None and len(SLACK_CLIENTS) == 1:
+        client = list(SLACK_CLIENTS.values())[0]
+    if client is None:
+        return False
+
+    if hasattr(client, 'post_message'):  # events API
+        client.post_message(channel, text)
+    else:
+        client.send_message(channel, text)
+    return True
+
+def announce_alert(alert, price):
+    """``alerts.AlertEngine`` notify hook: post into the alert's channel"""
+    text = '`' + alerts.announcement(alert, price) + '`'
+    if not post(alert.get('team_id'), alert['channel'], text):
+        api_config.LOGGER.warning('no workspace connection for alert %s', alert['alert_id'])
+
+def send_digest(subscription, text):
+    """``digest.DigestScheduler`` send hook"""
+    if not post(subscription.get('team_id'), subscription['channel'], '```' + text + '```'):
+        api_config.LOGGER.warning(
+            'no workspace connection for digest %s', subscription['channel'])
+
+def start_announcers(clients, logger=api_config.LOGGER):
+    """start price alerts and digests once workspace connections exist
+
+    Args:
+        clients (:obj:`list`): slackbot ``SlackClient``/``SlackWebDirectory`` per workspace
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    global ALERTS
+    for client in clients:
+        SLACK_CLIENTS[client.login_data['team']['id']] = client
+
+    digest.start_from_config(CONFIG, CONN, send_digest, logger=logger)
+
+    interval = float(CONFIG.get_option('Alerts', 'interval', None, 30))
+    if not interval:
+        return
+    ALERTS = alerts.AlertEngine(
+        CONN,
+        announce_alert,
+        currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+        logger=logger
+    ).start(interval)
+
+
+class WorkspaceBot(slackbot.bot.Bot):
+    """``slackbot.bot.Bot`` bound to one workspace token
+
+    Notes:
+        stock ``Bot()`` only reads ``slackbot_settings.API_TOKEN``.  Plugins are
+        registered on ``PluginsManager`` at class level, so every workspace
+        shares the same handlers (and through them the same caches/upstream pool)
+
+    Args:
+        api_token (str): bot token for the workspace
+
+    """
+    def __init__(self, api_token):
+        self._client = SlackClient(
+            api_token,
+            timeout=getattr(slack_settings, 'TIMEOUT', None),
+            bot_icon=getattr(slack_settings, 'BOT_ICON', None),
+            bot_emoji=getattr(slack_settings, 'BOT_EMOJI', None)
+        )
+        self._plugins = PluginsManager()
+        self._dispatcher = MessageDispatcher(
+            self._client, self._plugins, slack_settings.ERRORS_TO
         )
 
+    @property
+    def team_name(self):
+        """(str): workspace this bot is logged into"""
+        return self._client.login_data['team']['name']
+
+def connect_workspaces(api_tokens, logger=api_config.LOGGER):
+    """log into every workspace
+
+    Args:
+        api_tokens (:obj:`list`): one bot token per workspace
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`): connected ``WorkspaceBot`` objects
+
+    """
+    bots = []
+    for api_token in api_tokens:
+        bot = WorkspaceBot(api_token)
+        logger.info('--connected workspace %s', bot.team_name)
+        bots.append(bot)
+    return bots
+
+def run_workspaces(bots):
+    """serve every workspace from this process, one RTM loop thread each
+
+    Args:
+        bots (:obj:`list`): output of ``connect_workspaces()``
+
+    Raises:
+        RuntimeError: a workspace loop died (let systemd restart us)
+
+    """
+    metrics.REGISTRY.set_gauge(
+        'slack_worker_queue_depth',
+        lambda: sum(bot._dispatcher._pool.queue.qsize() for bot in bots)
+    )
+    threads = []
+    for bot in bots:
+        thread = threading.Thread(target=bot.run, name=bot.team_name, daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    while all(thread.is_alive() for thread in threads):
+        time.sleep(5)
+
+    dead = [thread.name for thread in threads if not thread.is_alive()]
+    raise RuntimeError('workspace loop(s) exited: {}'.format(', '.join(dead)))
+
+def run_events_api(api_tokens, host, port, insecure=False, logger=api_config.LOGGER):
+    """serve the Slack Events API instead of RTM
+
+    Args:
+        api_tokens (:obj:`list`): one bot token per workspace
+        host (str): interface to bind
+        port (int): port to bind
+        insecure (bool, optional): serve without ``[SlackBot] signing_secret``
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Raises:
+        InsecureEndpoint: no signing secret configured and not ``insecure``
+
+    """
+    directories = {}
+    receiver = slack_events.EventsReceiver(  # refuses to build unsigned before we log in anywhere
+        PluginsManager.commands,
+        directories,
+        signing_secret=CONFIG.get_option('SlackBot', 'signing_secret', None, ''),
+        insecure=insecure,
+        max_workers=int(CONFIG.get_option('SlackBot', 'event_workers', None, 32)),
+        logger=logger
+    )
+    for api_token in api_tokens:
+        directory = slack_events.SlackWebDirectory(api_token)
+        logger.info('--connected workspace %s', directory.login_data['team']['name'])
+        directories[directory.login_data['team']['id']] = directory
+    start_announcers(directories.values(), logger=logger)
+
+    metrics.REGISTRY.set_gauge('slack_worker_queue_depth', lambda: receiver.pending)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(slack_events.serve(receiver, host, port, logger=logger))
+    loop.run_forever()
+
 class ProsperSlackBot(cli.Application):
     """wrapper for slackbot Main()"""
     PROGNAME = PROGNAME
@@ -214,8 +754,36 @@ class ProsperSlackBot(cli.Application):
         help='debug mode, high verbosity for devs'
     )
 
+    workspaces = cli.Flag(
+        ['--workspaces'],
+        help='serve every token in [SlackBot] api_tokens from this process'
+    )
+
+    events_port = cli.SwitchAttr(
+        '--events-port',
+        int,
+        default=0,
+        help='serve the Slack Events API on this port instead of RTM (0 = RTM)'
+    )
+
+    insecure = cli.Flag(
+        ['--insecure'],
+        help='let --events-port run without [SlackBot] signing_secret (local testing only)'
+    )
+
+    events_host = cli.SwitchAttr(
+        '--events-host',
+        str,
+        default='127.0.0.1',
+        help='interface for --events-port'
+    )
+
     def main(self):
         """bot main"""
+        global CONN
+        startup = utils.StartupReport(begin=STARTUP_BEGIN)
+        startup.mark('import')
+
         if self.debug:
             self._log_builder.configure_debug_logger()
         else:
@@ -226,11 +794,92 @@ class ProsperSlackBot(cli.Application):
         logger.info('Hello World')
         api_config.LOGGER = logger
         api_config.CONFIG = CONFIG
+        log_pipeline.install_queue_logging(
+            logger,
+            max_queue=int(CONFIG.get_option('ProsperBot', 'log_queue_size', None, 10000)),
+            log=logger
+        )
+        startup.mark('config')
+
+        CONN = connections.build_connection(
+            'slackbot',
+            backend=CONFIG.get_option('ProsperBot', 'storage_backend', None, 'tinymongo'),
+            logger=logger
+        )
+        upstream.configure(
+            int(CONFIG.get_option('ProsperBot', 'upstream_concurrency', None, upstream.MAX_CONCURRENT)),
+            logger=logger
+        )
+        upstream.configure_source(CONFIG, logger=logger)
+        market_hours.configure(CONFIG, logger=logger)
+        tickstore.configure(CONFIG, logger=logger)
+        history.configure(CONFIG, logger=logger)
+        fx.start_refresher(
+            interval=float(CONFIG.get_option('ProsperBot', 'fx_refresh_minutes', None, 30)) * 60,
+            logger=logger
+        )
+        snapshot_path = caching.snapshot_path_for(CONFIG, PROGNAME, logger=logger)
+        caching.load_snapshot(snapshot_path, logger=logger)
+        caching.start_snapshots(
+            interval=float(CONFIG.get_option('ProsperBot', 'snapshot_seconds', None, 300)),
+            snapshot_path=snapshot_path,
+            logger=logger
+        )
+        symbols.start_refresher(
+            interval=float(CONFIG.get_option('ProsperBot', 'symbol_refresh_hours', None, 24)) * 3600,
+            logger=logger
+        )
+        prefetch.start_from_config(
+            CONFIG,
+            commands.prefetch_jobs(
+                currency=CONFIG.get_option('ProsperBot', 'currency', None, 'USD'),
+                news=CONFIG.get_option('Prefetch', 'news', None, 'False') == 'True'
+            ),
+            logger=logger
+        )
+        metrics.serve_from_config(CONFIG, logger=logger)
+        profiling.configure(
+            self._log_builder.log_path,
+            cooldown=CONFIG.get_option('ProsperBot', 'profile_cooldown', None, 300),
+            max_files=CONFIG.get_option('ProsperBot', 'profile_max_files', None, 20),
+            logger=logger
+        )
+        profiling.install_signal_handler(
+            int(CONFIG.get_option('ProsperBot', 'profile_seconds', None, 30)), logger=logger)
+        startup.mark('db')
 
         logger.error('STARTING PROSPERBOT -- SLACK %s', platform.node())
         try:
-            bot = slackbot.bot.Bot()
-            bot.run()
+            api_tokens = [CONFIG.get('SlackBot', 'api_token')]
+            if self.workspaces:
+                api_tokens = [
+                    token.strip() for token in
+                    CONFIG.get('SlackBot', 'api_tokens').split(',') if token.strip()
+                ]
+            configure_team_scope(api_tokens, logger=logger)
+
+            if self.events_port:
+                startup.mark('connect')
+                startup.log(logger)
+                run_events_api(
+                    api_tokens, self.events_host, self.events_port,
+                    insecure=self.insecure, logger=logger
+                )
+            elif self.workspaces:
+                logger.info('Serving %s workspaces', len(api_tokens))
+                bots = connect_workspaces(api_tokens, logger=logger)
+                start_announcers([bot._client for bot in bots], logger=logger)
+                startup.mark('connect')
+                startup.log(logger)
+                run_workspaces(bots)
+            else:
+                bot = slackbot.bot.Bot()  # connects to RTM on build
+                start_announcers([bot._client], logger=logger)
+                metrics.REGISTRY.set_gauge(
+                    'slack_worker_queue_depth', bot._dispatcher._pool.queue.qsize)
+                startup.mark('connect')
+                startup.log(logger)
+                bot.run()
         except Exception:
             logger.critical('Going down in flames!', exc_info=True)
 
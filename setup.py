@@ -128,7 +128,8 @@ setup(
         ('tests', include_all_subfiles('tests')),
         ('docs', include_all_subfiles('docs')),
         ('scripts', include_all_subfiles('scripts')),
-        ('services', include_all_subfiles('services'))
+        ('services', include_all_subfiles('services')),
+        ('benchmarks', include_all_subfiles('benchmarks'))
     ],
     package_data={
         '': ['LICENSE', 'README.rst'],
@@ -0,0 +1,152 @@
+"""test_alerts.py: validate price alert indexing, storage and firing"""
+from os import path
+
+import pytest
+import helpers
+
+import prosper_bots.alerts as alerts
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.connections as connections
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+def build_alert(ticker, direction, threshold, channel='C1', kind='stocks'):
+    return alerts.new_alert(kind, ticker, direction, threshold, channel, 'tester')
+
+class TestAlertBook:
+    """validate AlertBook behavior"""
+    def test_pop_triggered(self):
+        """only crossed thresholds fire, and each fires once"""
+        book = alerts.AlertBook()
+        above = [build_alert('MU', 'above', value) for value in (40, 45, 50)]
+        below = [build_alert('MU', 'below', value) for value in (30, 42, 44)]
+        for alert in above + below:
+            book.add(alert)
+
+        fired = book.pop_triggered('stocks', 'MU', 43.0)
+        assert sorted(alert['threshold'] for alert in fired) == [40, 44]
+        assert len(book) == 4
+
+        assert book.pop_triggered('stocks', 'MU', 43.0) == []
+        assert [alert['threshold'] for alert in book.pop_triggered('stocks', 'MU', 29)] == [30, 42]
+        assert book.pop_triggered('stocks', 'INTC', 29) == []
+
+    def test_pop_triggered_nan(self):
+        """a NaN price crosses nothing"""
+        book = alerts.AlertBook()
+        book.add(build_alert('MU', 'above', 50))
+        book.add(build_alert('MU', 'below', 40))
+
+        assert book.pop_triggered('stocks', 'MU', float('nan')) == []
+        assert len(book) == 2
+
+    def test_remove(self):
+        """removed alerts never fire; empty tickers stop being watched"""
+        book = alerts.AlertBook()
+        first = build_alert('MU', 'above', 50)
+        second = build_alert('MU', 'above', 50)
+        book.add(first)
+        book.add(second)
+        book.add(build_alert('BTC', 'below', 100, kind='coins'))
+
+        assert book.remove(first['alert_id']) == first
+        assert book.remove(first['alert_id']) is None
+        assert [alert['alert_id'] for alert in book.pop_triggered('stocks', 'MU', 60)] == \
+            [second['alert_id']]
+        assert book.tickers() == {'coins': ['BTC']}
+
+    def test_bad_direction(self):
+        """only above/below exist"""
+        with pytest.raises(ValueError):
+            build_alert('MU', 'sideways', 50)
+
+@pytest.mark.parametrize('backend', ['tinymongo', 'sqlite'])
+class TestAlertEngine:
+    """validate AlertEngine against recorded quotes (MU 43.77, INTC 44.36, BTC 11594.25)"""
+    @pytest.fixture
+    def engine(self, tmpdir, backend):
+        upstream.configure_source(helpers.CONFIG)
+        caching.QUOTES.clear()
+        caching.BAD_SYMBOLS.clear()
+        fired = []
+        db_conn = connections.build_connection('alerts', str(tmpdir), backend=backend)
+        engine = alerts.AlertEngine(
+            db_conn, lambda alert, price: fired.append((alert['ticker'], price)))
+        yield engine, fired
+        upstream.use_source(None)
+        caching.QUOTES.clear()
+
+    def test_set_and_fire(self, engine):
+        """alerts pick a direction from the current price and fire once crossed"""
+        engine, fired = engine
+        response = commands.set_price_alert(engine, 'mu', '$50', 'C1', 'tester')
+        assert 'goes above 50.00' in response
+        assert 'goes below 40.00' in commands.set_price_alert(engine, 'MU', '40', 'C1', 'tester')
+        commands.set_price_alert(engine, 'INTC', '45', 'C1', 'tester', direction='below')
+        commands.set_price_alert(engine, 'BTC', '10000', 'C2', 'tester', kind='coins')
+
+        assert 'MU above 50.00' in commands.list_price_alerts(engine, 'C1')
+        assert engine.poll_once() == 1
+        assert fired == [('INTC', 44.36)]
+
+        engine.book = alerts.AlertBook()  # pretend we restarted
+        assert engine.load() == 3
+        assert engine.poll_once() == 0
+
+    def test_cancel(self, engine):
+        """only the owning channel can cancel"""
+        engine, fired = engine
+        commands.set_price_alert(engine, 'MU', '50', 'C1', 'tester')
+        alert_id = engine.book.for_channel('C1')[0]['alert_id']
+
+        assert 'no alert' in commands.cancel_price_alert(engine, alert_id, 'C2')
+        assert 'cancelled' in commands.cancel_price_alert(engine, '[{}]'.format(alert_id), 'C1')
+        assert connections.find_alerts(engine.db_conn) == []
+        assert commands.list_price_alerts(engine, 'C1') == 'no price alerts set here'
+
+    def test_refusals(self, engine):
+        """junk tickers/prices and full channels are refused"""
+        engine, fired = engine
+        assert 'unable to read price' in commands.set_price_alert(engine, 'MU', 'lots', 'C1', 't')
+        assert commands.set_price_alert(engine, '$$$', '5', 'C1', 't').startswith('unable')
+        commands.set_price_alert(engine, 'MU', '50', 'C1', 't', max_per_channel=1)
+        assert 'already has 1' in commands.set_price_alert(
+            engine, 'MU', '60', 'C1', 't', max_per_channel=1)
+
+    def test_missing_price(self, engine, monkeypatch):
+        """null/NaN prices are skipped, not compared"""
+        import pandas as pd
+        engine, fired = engine
+        commands.set_price_alert(engine, 'MU', '50', 'C1', 'tester')
+        commands.set_price_alert(engine, 'MU', '40', 'C1', 'tester')
+        commands.set_price_alert(engine, 'INTC', '40', 'C1', 'tester')
+
+        monkeypatch.setattr(upstream, 'get_quote_rh', lambda batch, **kwargs: pd.DataFrame(
+            [{'symbol': ticker, 'current_price': None} for ticker in batch]))
+        assert alerts.fetch_prices(engine.book.tickers()) == {}
+        monkeypatch.setattr(upstream, 'get_quote_rh', lambda batch, **kwargs: pd.DataFrame([
+            {'symbol': 'MU', 'current_price': float('nan')},
+            {'symbol': 'INTC', 'current_price': 39.0},
+        ]))
+        assert engine.poll_once() == 1
+        assert fired == [('INTC', 39.0)]
+        assert len(engine.book) == 2
+
+    def test_notify_failure(self, engine):
+        """an alert that couldn't be announced stays stored and fires next tick"""
+        engine, fired = engine
+        commands.set_price_alert(engine, 'INTC', '45', 'C1', 'tester', direction='below')
+
+        def broken_notify(alert, price):
+            raise RuntimeError('webhook down')
+        notify, engine.notify = engine.notify, broken_notify
+        assert engine.poll_once() == 0
+        assert len(connections.find_alerts(engine.db_conn)) == 1
+
+        engine.notify = notify
+        assert engine.poll_once() == 1
+        assert fired == [('INTC', 44.36)]
+        assert connections.find_alerts(engine.db_conn) == []
@@ -0,0 +1,67 @@
+"""test_articles.py: validate the shared, URL-keyed article store"""
+from os import path
+
+import pytest
+import helpers
+
+import prosper_bots.articles as articles
+import prosper_bots.caching as caching
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+@pytest.fixture
+def source():
+    """recorded upstream (one MU article is also in INTC's feed) with clean caches"""
+    caching.NEWS.clear()
+    caching.ARTICLES.clear()
+    recorded = upstream.configure_source(helpers.CONFIG)
+    yield recorded
+    upstream.use_source(None)
+    caching.NEWS.clear()
+    caching.ARTICLES.clear()
+
+
+class CountingScore:
+    """stand-in sentiment pass: scores by title length, remembers what it saw"""
+    def __init__(self):
+        self.titles = []
+
+    def __call__(self, news_df):
+        self.titles.extend(news_df['title'])
+        news_df['compound'] = news_df['title'].str.len() / 100.0
+        return news_df
+
+
+class TestArticleStore:
+    """validate article_id()/store_feed()/feed()"""
+    def test_article_id(self):
+        """same story, same id"""
+        assert articles.article_id('https://News.Example.com/mu/a#comments') == \
+            articles.article_id(' https://news.example.com/mu/a ')
+        assert articles.article_id('https://news.example.com/mu/a') != \
+            articles.article_id('https://news.example.com/mu/b')
+
+    def test_overlapping_feeds(self, source):
+        """an article under two tickers is stored and scored once"""
+        score = CountingScore()
+        mu_feed = articles.store_feed('MU', source.company_news_rh('MU'), score, ttl=60)
+        intc_feed = articles.store_feed('intc', source.company_news_rh('INTC'), score, ttl=60)
+
+        assert len(mu_feed) == 3 and len(intc_feed) == 3
+        assert len(score.titles) == 5
+        assert score.titles.count('Micron posts record quarter, beats estimates') == 1
+        assert len(caching.ARTICLES.dump()) == 5
+
+        assert articles.feed('INTC') == intc_feed
+        assert isinstance(caching.NEWS.get('NEWS-INTC'), tuple)
+        assert articles.feed('AMD') is None
+
+    def test_evicted_article(self, source):
+        """a feed missing an article is a miss, not a partial answer"""
+        articles.store_feed('MU', source.company_news_rh('MU'), CountingScore(), ttl=60)
+        caching.ARTICLES.pop('ARTICLE-{}'.format(
+            articles.article_id('https://news.example.com/mu/conference')))
+
+        assert articles.feed('MU') is None
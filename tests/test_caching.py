@@ -0,0 +1,163 @@
+"""test_caching.py: validate behavior for caching"""
+from os import path
+import multiprocessing
+import time
+
+import pytest
+import prosper.common.prosper_config as p_config
+import helpers
+
+import prosper_bots.caching as caching
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+
+class FakeClock:
+    """hand-cranked clock for expiry tests"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """validate TTLCache behavior"""
+    def test_ttl_cache_expiry(self):
+        """values disappear after their ttl"""
+        clock = FakeClock()
+        cache = caching.TTLCache(default_ttl=10, clock=clock)
+        cache.set('MU', {'current_price': 50.0})
+
+        assert cache.get('MU') == {'current_price': 50.0}
+        assert 'MU' in cache
+
+        clock.now += 11
+        assert cache.get('MU') is None
+        assert 'MU' not in cache
+        assert len(cache) == 0
+
+    def test_ttl_cache_touch(self):
+        """touch() behaves like a cooldown gate"""
+        clock = FakeClock()
+        cache = caching.TTLCache(clock=clock)
+
+        assert cache.touch('BASIC_STOCKS-MU', ttl=30) is False
+        assert cache.touch('BASIC_STOCKS-MU', ttl=30) is True
+
+        clock.now += 31
+        assert cache.touch('BASIC_STOCKS-MU', ttl=30) is False
+
+    def test_ttl_cache_purge(self):
+        """purge drops only expired entries"""
+        clock = FakeClock()
+        cache = caching.TTLCache(default_ttl=10, clock=clock)
+        cache.set('short', 1, ttl=1)
+        cache.set('long', 2, ttl=100)
+
+        clock.now += 5
+        assert cache.purge() == 1
+        assert cache.get('long') == 2
+
+    def test_ttl_cache_remaining(self):
+        """remaining() counts down to 0"""
+        clock = FakeClock()
+        cache = caching.TTLCache(default_ttl=10, clock=clock)
+        cache.set('MU', 1)
+
+        clock.now += 4
+        assert cache.remaining('MU') == 6
+        clock.now += 10
+        assert cache.remaining('MU') == 0
+        assert cache.remaining('INTC') == 0
+
+    def test_ttl_cache_zero_ttl(self):
+        """ttl <= 0 disables caching"""
+        cache = caching.TTLCache(default_ttl=0)
+        cache.set('MU', 1)
+
+        assert cache.get('MU') is None
+
+    def test_ttl_cache_max_entries(self):
+        """full caches drop expired, then soonest-expiring, entries"""
+        clock = FakeClock()
+        cache = caching.TTLCache(default_ttl=10, clock=clock, max_entries=10)
+        for index in range(10):
+            cache.set(index, index, ttl=10 + index)
+        cache.set(0, 'refreshed', ttl=100)  # overwriting never evicts
+        assert len(cache) == 10
+
+        cache.set('MU', 1)
+        assert len(cache) == 10
+        assert 0 in cache and 1 not in cache and 2 in cache
+
+        clock.now += 30
+        cache.set('INTC', 2)
+        assert sorted(map(str, cache.dump())) == ['0', 'INTC']
+
+    def test_ttl_cache_share(self):
+        """shared caches keep contents and stay usable"""
+        manager = multiprocessing.Manager()
+        try:
+            cache = caching.TTLCache()
+            cache.set('MU', 1)
+            cache.share(manager)
+
+            assert cache.get('MU') == 1
+            assert cache.touch('BTC') is False
+            assert cache.touch('BTC') is True
+        finally:
+            manager.shutdown()
+
+
+class TestSnapshots:
+    """validate save_snapshot()/load_snapshot() behavior"""
+    def test_round_trip(self, tmpdir):
+        """live entries survive a restart, expired ones don't"""
+        snapshot_path = str(tmpdir.join('caches.pickle.gz'))
+        caching.QUOTES.clear()
+        caching.BAD_SYMBOLS.clear()
+        caching.QUOTES.set('STOCKS-MU', {'current_price': 50.0}, ttl=60)
+        caching.QUOTES.set('STOCKS-INTC', {'current_price': 40.0}, ttl=0.05)
+        caching.BAD_SYMBOLS.set('stocks/BUTTS', True)
+
+        assert caching.save_snapshot(snapshot_path) == 3
+        caching.QUOTES.clear()
+        caching.BAD_SYMBOLS.clear()
+        time.sleep(0.1)
+
+        try:
+            assert caching.load_snapshot(snapshot_path) == 2
+            assert caching.QUOTES.get('STOCKS-MU') == {'current_price': 50.0}
+            assert 'STOCKS-INTC' not in caching.QUOTES
+            assert 50 < caching.QUOTES.remaining('STOCKS-MU') <= 60
+            assert 'stocks/BUTTS' in caching.BAD_SYMBOLS
+        finally:
+            caching.QUOTES.clear()
+            caching.BAD_SYMBOLS.clear()
+
+    def test_snapshot_per_app(self, tmpdir):
+        """bots sharing a config snapshot to their own files"""
+        slack_path = caching.snapshot_path_for(helpers.CONFIG, 'ProsperSlackBot')
+        discord_path = caching.snapshot_path_for(helpers.CONFIG, 'ProsperDiscordBot')
+        assert slack_path != discord_path
+        assert path.dirname(slack_path) == caching.SNAPSHOT_DIR
+
+        config_path = tmpdir.join('bot.cfg')
+        config_path.write('[ProsperBot]\nsnapshot_path = {}\n'.format(tmpdir.join('snaps')))
+        snapshot_path = caching.snapshot_path_for(
+            p_config.ProsperConfig(str(config_path)), 'ProsperSlackBot')
+        assert snapshot_path == str(tmpdir.join('snaps', 'ProsperSlackBot.caches.pickle.gz'))
+
+        caching.save_snapshot(snapshot_path)
+        assert [item.basename for item in tmpdir.join('snaps').listdir()] == \
+            ['ProsperSlackBot.caches.pickle.gz']  # temp file renamed away
+
+    def test_missing_or_corrupt(self, tmpdir):
+        """a bad snapshot means a cold start, not a crash"""
+        snapshot_path = tmpdir.join('caches.pickle.gz')
+        assert caching.load_snapshot(str(snapshot_path)) == 0
+
+        snapshot_path.write('not a snapshot')
+        assert caching.load_snapshot(str(snapshot_path)) == 0
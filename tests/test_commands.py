@@ -1,20 +1,45 @@
 """test_commands.py: validate core responses for bots"""
 from os import path
 import platform
+import subprocess
+import sys
 import time
 
 from parse import *
 import pytest
+import helpers
 import tinymongo
 
 import prosper_bots.commands as commands
 import prosper_bots.exceptions as exceptions
+import prosper_bots.upstream as upstream
 import prosper_bots._version as version
 
 HERE = path.abspath(path.dirname(__file__))
 ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
 CACHE_PATH = path.join(HERE, 'cache')
 
+@pytest.fixture(autouse=True, scope='module')
+def recorded_upstream():
+    """replay tests/recording.json instead of calling live APIs"""
+    upstream.configure_source(helpers.CONFIG)
+    yield
+    upstream.use_source(None)
+
+
+def test_commands_lazy_imports():
+    """importing commands must not pull in the datareader/pandas stack"""
+    probe = subprocess.check_output(
+        [
+            sys.executable, '-c',
+            'import sys, prosper_bots.commands; '
+            'print(",".join(m for m in ("pandas", "nltk") if m in sys.modules))'
+        ],
+        cwd=path.dirname(ROOT),
+        universal_newlines=True
+    )
+
+    assert probe.strip() == ''
 
 class TestVersionInfo:
     """validate version_info() behavior"""
@@ -178,3 +203,107 @@ class TestStockNews:
 
         assert url == 'NO NEWS FOUND'
         assert score == ''
+
+class TestWatchlist:
+    """validate watchlist behavior"""
+    conn = tinymongo.TinyMongoClient(CACHE_PATH)['prosper']
+    channel = 'WATCHLIST_TEST'
+
+    def test_update_watchlist(self):
+        """add/remove/clear keep order and refuse junk"""
+        commands.update_watchlist(self.channel, 'clear', [], 'DummyUser', self.conn)
+
+        response = commands.update_watchlist(
+            self.channel, 'add', ['$mu,', 'INTC', 'MU'], 'DummyUser', self.conn)
+        assert response == 'watchlist: MU INTC'
+        assert commands.update_watchlist(
+            self.channel, 'add', ['5LUNCH'], 'DummyUser', self.conn).startswith('unable')
+        assert 'at most 2' in commands.update_watchlist(
+            self.channel, 'add', ['AMD'], 'DummyUser', self.conn, max_size=2)
+        assert commands.update_watchlist(
+            self.channel, 'remove', ['MU'], 'DummyUser', self.conn) == 'watchlist: INTC'
+        assert commands.update_watchlist(
+            self.channel, 'clear', [], 'DummyUser', self.conn) == 'watchlist: (empty)'
+        assert 'no watchlist yet' in commands.channel_watchlist(self.channel, self.conn)
+
+    def test_watchlist_snapshot(self):
+        """one ranked table, missing tickers called out"""
+        table = commands.watchlist_snapshot(['MU', 'INTC', 'AMD', 'XYZQ']).splitlines()
+
+        assert table[0].split() == ['#', 'TICKER', 'PRICE', 'CHG', 'CHG%']
+        assert [line.split()[1] for line in table[1:4]] == ['AMD', 'MU', 'INTC']
+        assert table[2].split()[2:] == ['43.77', '+0.61', '+1.41%']
+        assert table[-1] == 'no quote: XYZQ'
+
+        coins = commands.watchlist_snapshot(['BTC', 'ETH'], kind='coins').splitlines()
+        assert coins[1].split()[:3] == ['1', 'BTC', '11,594.25']
+
+    def test_watchlist_quote_columns(self):
+        """baskets ask upstream for ``previous_close``, datareader leaves it out by default"""
+        import prosper_bots.caching as caching
+        caching.QUOTES.clear()
+        assert 'previous_close' not in upstream.SOURCE.get_quote_rh(['MU', 'INTC'])
+
+        quote_df = commands.fetch_basket(['MU', 'INTC'])
+        table = commands.basket_table(quote_df)
+        assert list(table['change'].round(2)) == [0.61, -0.23]
+
+class TestSparkline:
+    """validate sparkline/intraday_summary behavior"""
+    def test_sparkline(self):
+        """equal time buckets, gaps carry the last price forward"""
+        import numpy as np
+        timestamps = np.array([0.0, 1.0, 2.0, 3.0, 8.0])
+        prices = np.array([1.0, 2.0, 3.0, 4.0, 8.0])
+
+        assert commands.sparkline(timestamps, prices, width=4) == '▁▂▂█'
+        assert commands.sparkline(timestamps, np.full(5, 2.0), width=3) == '▅▅▅'
+        assert commands.sparkline(timestamps[:1], prices[:1]) == ''
+
+    def test_intraday_summary(self, tmpdir):
+        """session low/high come from recorded ticks only"""
+        import prosper_bots.tickstore as tickstore
+        import prosper_bots.market_hours as market_hours
+
+        tickstore.STORE = tickstore.TickStore(str(tmpdir), capacity=16)
+        try:
+            opens = market_hours.session_start(time.time())
+            tickstore.STORE.append('stocks', 'MU', 99.0, timestamp=opens - 60)  # yesterday
+            for step, price in enumerate([43.16, 43.9, 43.5, 43.77]):
+                tickstore.STORE.append('stocks', 'MU', price, timestamp=opens + step * 60)
+
+            summary = commands.intraday_summary('MU', width=4)
+            assert summary.split()[1:] == ['L', '43.16', 'H', '43.9']
+            assert len(summary.split()[0]) == 4
+            assert commands.intraday_summary('INTC') == ''
+            assert commands.intraday_summary('BTC', kind='coins', currency='EUR') == ''
+        finally:
+            tickstore.STORE.close()
+            tickstore.STORE = None
+
+class TestMarketMovers:
+    """validate market_movers behavior"""
+    def test_market_movers(self):
+        """one ranked board from one bulk quote, reused within ttl"""
+        import prosper_bots.caching as caching
+        caching.QUOTES.clear()
+        source = upstream.SOURCE
+        before = source.calls['get_quote_cc']
+
+        board = commands.market_movers(['btc', 'ETH', '$$$'], count=1).splitlines()
+        assert board[0].split() == ['GAINERS', 'LOSERS', 'VOL24H', 'USD']
+        assert board[1].split() == ['BTC', '+2.10%', 'ETH', '-1.25%', 'ETH', '1.97B']
+        assert commands.market_movers(['BTC', 'ETH'], count=1) == '\n'.join(board)
+        assert source.calls['get_quote_cc'] == before + 2  # one replay per coin, once
+
+        assert commands.market_movers(['']).startswith('no coins universe')
+
+    def test_stock_movers(self):
+        """stocks rank on the day's share volume, which datareader only sends when asked"""
+        import prosper_bots.caching as caching
+        caching.QUOTES.clear()
+        assert 'volume' not in upstream.SOURCE.get_quote_rh(['MU', 'INTC', 'AMD'])
+
+        board = commands.market_movers(['MU', 'INTC', 'AMD'], kind='stocks', count=1)
+        assert board.splitlines()[1].split() == \
+            ['AMD', '+3.19%', 'INTC', '-0.52%', 'AMD', '82.4M']
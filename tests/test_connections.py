@@ -25,6 +25,32 @@ def test_build_connection():
 
     assert path.isfile(path.join(CACHE_PATH, 'test_source.json'))
 
+def test_build_connection_sqlite():
+    """validate sqlite backend for build_connection"""
+    dummy_conn = connections.build_connection(
+        'test_source',
+        source_path=CACHE_PATH,
+        backend='sqlite'
+    )
+
+    assert isinstance(dummy_conn, connections.SQLiteDatabase)
+
+    assert path.isfile(path.join(CACHE_PATH, 'test_source.sqlite'))
+
+def test_require_multiprocess_backend():
+    """sharded workers can't share a tinymongo file"""
+    connections.require_multiprocess_backend('tinymongo', 0)
+    connections.require_multiprocess_backend('sqlite', 4)
+    with pytest.raises(exceptions.UnsafeBackend):
+        connections.require_multiprocess_backend('tinymongo', 4)
+
+def test_team_collection():
+    """validate per-workspace collection names"""
+    assert connections.team_collection(connections.CHANNEL_COLLECTION) == \
+        connections.CHANNEL_COLLECTION
+    assert connections.team_collection(connections.CHANNEL_COLLECTION, 'T024BE7LD') == \
+        connections.CHANNEL_COLLECTION + '-T024BE7LD'
+
 class TestChannelMode:
     """validate behavior for set_channel_mode & check_channel_mode"""
     conn = tinymongo.TinyMongoClient(CACHE_PATH)['prosper']
@@ -121,3 +147,55 @@ class TestChannelMode:
                 'DummyUser',
                 self.conn
             )
+
+
+class TestSQLiteBackend:
+    """validate sqlite backend behaves like tinymongo for bot commands"""
+    conn = connections.SQLiteDatabase(':memory:')
+
+    def test_find_by_key(self):
+        """validate indexed and scanned filters agree"""
+        collection = self.conn[connections.CHANNEL_COLLECTION + '-T024BE7LD']
+        assert collection.key_field == 'channel_name'
+        collection.insert_many([
+            {'channel_name': 'find_by_key', 'channel_mode': 'test'},
+            {'channel_name': 'other_channel', 'channel_mode': 'test'},
+        ])
+
+        assert collection.find({'channel_name': 'find_by_key'}) == \
+            [{'channel_name': 'find_by_key', 'channel_mode': 'test'}]
+        assert len(collection.find({'channel_mode': 'test'})) == 2
+        assert collection.find_one({'channel_name': 'missing'}) is None
+
+        assert collection.delete_many({'channel_name': 'find_by_key'}) == 1
+        assert collection.count() == 1
+
+    def test_set_and_check_loop(self):
+        """validate channel modes round-trip"""
+        connections.set_channel_mode('SET_AND_CHECK', 'TEST', 'DummyUser', self.conn)
+        set_mode = connections.set_channel_mode('SET_AND_CHECK', 'TEST', 'DummyUser', self.conn)
+
+        assert set_mode == connections.Modes.test
+        assert connections.check_channel_mode('SET_AND_CHECK', self.conn) == \
+            connections.Modes.test
+
+    def test_cooldown(self):
+        """validate cooldown gate"""
+        assert not connections.cooldown('SQLITE-MU', self.conn, cooldown_time=30)
+        assert connections.cooldown('SQLITE-MU', self.conn, cooldown_time=30)
+
+    def test_watchlist(self):
+        """validate watchlists round-trip per channel and kind"""
+        assert connections.get_watchlist('WATCHLIST', self.conn) == []
+
+        connections.set_watchlist('WATCHLIST', ['MU', 'INTC'], 'DummyUser', self.conn)
+        connections.set_watchlist(
+            'WATCHLIST', ['BTC'], 'DummyUser', self.conn, watchlist_kind='coins')
+        connections.set_watchlist('WATCHLIST', ['MU', 'AMD'], 'DummyUser', self.conn)
+
+        assert connections.get_watchlist('WATCHLIST', self.conn) == ['MU', 'AMD']
+        assert connections.get_watchlist(
+            'WATCHLIST', self.conn, watchlist_kind=connections.Modes.coins) == ['BTC']
+
+        connections.set_watchlist('WATCHLIST', [], 'DummyUser', self.conn)
+        assert connections.get_watchlist('WATCHLIST', self.conn) == []
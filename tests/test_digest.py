@@ -0,0 +1,136 @@
+"""test_digest.py: validate scheduled digest building and fan-out"""
+from os import path
+from datetime import datetime
+
+import pytest
+import helpers
+
+import prosper_bots.commands as commands
+import prosper_bots.connections as connections
+import prosper_bots.digest as digest
+import prosper_bots.market_hours as market_hours
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+def eastern(*args):
+    """epoch seconds for a US/Eastern wall-clock time"""
+    return market_hours.from_eastern(datetime(*args))
+
+
+class FakeClock:
+    """clock that only moves when something sleeps"""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestSchedule:
+    """validate session parsing and next_run()"""
+    def test_parse_sessions(self):
+        """earliest first, blank disables"""
+        sessions = digest.parse_sessions('close=16:05, open=09:35')
+        assert sessions == (('open', (9, 35)), ('close', (16, 5)))
+        assert digest.parse_sessions('') == ()
+
+    def test_next_run(self):
+        """same day when a slot is left, else the next trading day"""
+        assert digest.next_run(eastern(2018, 7, 9, 10, 0)) == \
+            (eastern(2018, 7, 9, 12, 30), 'midday')
+        assert digest.next_run(eastern(2018, 7, 6, 17, 0)) == \
+            (eastern(2018, 7, 9, 9, 35), 'open')  # friday -> monday
+        assert digest.next_run(eastern(2018, 7, 3, 17, 0)) == \
+            (eastern(2018, 7, 5, 9, 35), 'open')  # skips the 4th
+        assert digest.next_run(eastern(2018, 7, 9, 10, 0), ()) == (None, None)
+
+
+class TestTokenBucket:
+    """validate TokenBucket behavior"""
+    def test_burst_then_rate(self):
+        """bursts go straight out, the rest are spaced at ``rate``"""
+        clock = FakeClock()
+        bucket = digest.TokenBucket(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(5)]
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3:] == [pytest.approx(0.5), pytest.approx(0.5)]
+        clock.now += 10
+        assert bucket.acquire() == 0.0
+
+
+class TestDigestScheduler:
+    """validate DigestScheduler.run_once() against recorded quotes"""
+    @pytest.fixture
+    def scheduler(self, tmpdir, monkeypatch):
+        upstream.configure_source(helpers.CONFIG)
+        db_conn = connections.build_connection('digest', str(tmpdir), backend='sqlite')
+        fetched = []
+        fetch_basket = commands.fetch_basket
+
+        def counting_fetch(tickers, **kwargs):
+            fetched.append((kwargs.get('kind'), list(tickers)))
+            return fetch_basket(tickers, **kwargs)
+        monkeypatch.setattr(commands, 'fetch_basket', counting_fetch)
+
+        sent = []
+        clock = FakeClock()
+        scheduler = digest.DigestScheduler(
+            db_conn,
+            lambda subscription, text: sent.append((subscription['channel'], text)),
+            news=False,
+            bucket=digest.TokenBucket(rate=1.0, burst=1, clock=clock, sleep=clock.sleep)
+        )
+        yield scheduler, fetched, sent, clock
+        upstream.use_source(None)
+
+    def test_fan_out(self, scheduler):
+        """one fetch per kind for every channel, one post per channel"""
+        scheduler, fetched, sent, clock = scheduler
+        db_conn = scheduler.db_conn
+        for channel, tickers in (('C1', ['MU', 'INTC']), ('C2', ['MU', 'AMD']), ('C3', [])):
+            connections.set_watchlist(channel, tickers, 'tester', db_conn)
+            commands.update_digest(channel, 'on', db_conn)
+        connections.set_watchlist('C1', ['BTC'], 'tester', db_conn, watchlist_kind='coins')
+        commands.update_digest('C1', 'on', db_conn, kind='coins')
+
+        assert scheduler.run_once('open') == 3
+        assert sorted(fetched) == [('coins', ['BTC']), ('stocks', ['AMD', 'INTC', 'MU'])]
+        assert len(clock.slept) == 2  # burst of 1, then throttled
+
+        by_channel = {}
+        for channel, text in sent:
+            by_channel.setdefault(channel, []).append(text)
+        assert sorted(by_channel) == ['C1', 'C2']
+        c2 = by_channel['C2'][0].splitlines()
+        assert c2[0] == 'open stocks digest'
+        assert [line.split()[1] for line in c2[2:]] == ['AMD', 'MU']
+
+    def test_stock_digest_columns(self, scheduler):
+        """stock digests need ``previous_close``, which datareader only sends when asked"""
+        scheduler, fetched, sent, clock = scheduler
+        assert 'previous_close' not in upstream.SOURCE.get_quote_rh(['MU', 'AMD'])
+        connections.set_watchlist('C1', ['MU', 'AMD'], 'tester', scheduler.db_conn)
+        commands.update_digest('C1', 'on', scheduler.db_conn)
+
+        assert scheduler.run_once('close') == 1
+        lines = sent[0][1].splitlines()
+        assert lines[2].split()[1:] == ['AMD', '13.25', '+0.41', '+3.19%']
+        assert lines[3].split()[1:] == ['MU', '43.77', '+0.61', '+1.41%']
+
+    def test_unsubscribe(self, scheduler):
+        """off means no more posts"""
+        scheduler, fetched, sent, clock = scheduler
+        connections.set_watchlist('C1', ['MU'], 'tester', scheduler.db_conn)
+        assert 'try `watchlist add' not in commands.update_digest('C1', 'on', scheduler.db_conn)
+        assert commands.update_digest('C1', 'off', scheduler.db_conn) == 'stocks digests off'
+        assert 'unknown' in commands.update_digest('C1', 'maybe', scheduler.db_conn)
+
+        assert scheduler.run_once() == 0
+        assert fetched == []
@@ -0,0 +1,98 @@
+"""test_fx.py: validate local currency conversion for coin quotes"""
+from os import path
+
+import pytest
+import helpers
+
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.exceptions as exceptions
+import prosper_bots.fx as fx
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+@pytest.fixture
+def source():
+    """recorded upstream (BTC 11594.25 USD, EUR 0.8165, JPY 110.75) with clean caches"""
+    caching.QUOTES.clear()
+    caching.BAD_SYMBOLS.clear()
+    recorded = upstream.configure_source(helpers.CONFIG)
+    yield recorded
+    upstream.use_source(None)
+    caching.QUOTES.clear()
+
+
+class TestRates:
+    """validate rates()/matrix()/convert() behavior"""
+    def test_matrix(self, source):
+        """one refresh serves every pair"""
+        grid = fx.matrix(['USD', 'EUR', 'JPY'])
+
+        assert grid[0, 1] == pytest.approx(0.8165)
+        assert grid[1, 0] == pytest.approx(1 / 0.8165)
+        assert grid[1, 2] == pytest.approx(110.75 / 0.8165)
+        assert grid.diagonal() == pytest.approx([1.0, 1.0, 1.0])
+        fx.rates(['GBP', 'EUR'])
+        assert source.calls['fx_rates'] == 1
+
+    def test_convert_grid(self, source):
+        """coins x currencies in one go"""
+        grid = fx.convert([100.0, 2.0], 'USD', ['EUR', 'JPY'])
+
+        assert grid.shape == (2, 2)
+        assert grid[0] == pytest.approx([81.65, 11075.0])
+        assert grid[1] == pytest.approx([1.633, 221.5])
+
+    def test_unknown_currency(self, source):
+        """junk currencies raise, and aren't retried on every refresh"""
+        with pytest.raises(exceptions.UnknownCurrency):
+            fx.rates(['EUR', 'LOL'])
+        assert 'LOL' not in fx.CURRENCIES
+
+    def test_unknown_currency_remembered(self, source):
+        """a typo'd currency costs one upstream refresh per rate ttl, not one per ask"""
+        for _ in range(3):
+            with pytest.raises(exceptions.UnknownCurrency):
+                fx.rates(['LOL'])
+        assert not commands._fx_rate_known('LOL')
+        assert source.calls['fx_rates'] == 1
+
+        caching.QUOTES.clear()  # good currencies still refresh as usual
+        fx.rates(['EUR'])
+        assert source.calls['fx_rates'] == 2
+
+
+class TestCoinQuotes:
+    """validate coin quotes converted from one base quote"""
+    def test_fetch_converts(self, source):
+        """EUR and JPY quotes cost no extra coin calls"""
+        usd = commands.fetch_coin_quote('BTC')
+        eur = commands.fetch_coin_quote('BTC', currency='EUR')
+        commands.fetch_coin_quote('BTC', currency='JPY')
+
+        assert source.calls['get_quote_cc'] == 1
+        assert eur['last'] == pytest.approx(usd['last'] * 0.8165)
+        assert eur['change_pct'] == usd['change_pct']
+        assert caching.QUOTES.get('COINS-BTCEUR') == eur
+
+    def test_coin_grid(self, source):
+        """unknown coins drop out of the grid"""
+        grid, quotes = commands.coin_grid(['btc', 'eth', 'xyzq'], ['USD', 'EUR'])
+
+        assert list(grid.index) == ['BTC', 'ETH']
+        assert grid.loc['ETH', 'EUR'] == pytest.approx(1040.12 * 0.8165)
+        assert 'COINS-ETHUSD' in caching.QUOTES
+
+    def test_generic_coin_info(self, source, tmpdir):
+        """several currencies in one reply"""
+        import tinymongo
+        db_conn = tinymongo.TinyMongoClient(str(tmpdir))['prosper']
+        response = commands.generic_coin_info(
+            'BTC', db_conn, currency=['USD', 'EUR', 'JPY'], cooldown_time=0)
+
+        assert response == 'Bitcoin 11594.25 USD 9466.71 EUR 1284063.19 JPY +2.10%'
+        assert commands.generic_coin_info(
+            'BTC', db_conn, currency=['USD', 'LOL'], cooldown_time=0) == ''
+        assert 'coins/BTC' not in caching.BAD_SYMBOLS
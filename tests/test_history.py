@@ -0,0 +1,93 @@
+"""test_history.py: validate the daily-close store and compare math"""
+from os import path
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+import helpers
+
+import prosper_bots.commands as commands
+import prosper_bots.history as history
+import prosper_bots.market_hours as market_hours
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+AS_OF = date(2018, 1, 19)  # recorded quotes are from this session
+
+
+@pytest.fixture
+def source():
+    """recorded upstream (closes through 2018-01-19)"""
+    recorded = upstream.configure_source(helpers.CONFIG)
+    yield recorded
+    upstream.use_source(None)
+
+
+class TestSessions:
+    """validate session calendar helpers"""
+    def test_last_close_day(self):
+        """before the close it's the previous session"""
+        friday_noon = market_hours.from_eastern(datetime(2018, 1, 19, 12, 0))
+        monday_close = market_hours.from_eastern(datetime(2018, 1, 22, 16, 1))
+        assert history.last_close_day('stocks', friday_noon) == date(2018, 1, 18)
+        assert history.last_close_day('stocks', friday_noon + 86400) == date(2018, 1, 19)
+        assert history.last_close_day('stocks', monday_close) == date(2018, 1, 22)
+
+    def test_sessions(self):
+        """stocks skip weekends/holidays, coins don't"""
+        assert history.sessions('stocks', date(2018, 1, 16), 2) == \
+            [date(2018, 1, 12), date(2018, 1, 16)]  # MLK day
+        assert len(history.sessions('coins', date(2018, 1, 16), 5)) == 5
+
+
+class TestHistoryStore:
+    """validate HistoryStore.closes() against recorded history"""
+    def test_fetch_only_missing(self, source, tmpdir):
+        """one fetch per ticker, then served from disk"""
+        store = history.HistoryStore(str(tmpdir))
+        closes = store.closes('stocks', ['mu', 'intc'], 20, as_of=AS_OF)
+
+        assert sorted(closes) == ['INTC', 'MU']
+        assert len(closes['MU']) == 20
+        assert closes['MU']['close'][-1] == 43.77
+        assert source.calls['daily_closes'] == 2
+
+        store.closes('stocks', ['MU'], 10, as_of=AS_OF)
+        reopened = history.HistoryStore(str(tmpdir))
+        assert len(reopened.closes('stocks', ['MU'], 20, as_of=AS_OF)['MU']) == 20
+        assert source.calls['daily_closes'] == 2
+
+    def test_merge_drops_open_session(self, tmpdir):
+        """rows after ``as_of`` aren't final and aren't kept"""
+        store = history.HistoryStore(str(tmpdir))
+        store.merge('coins', 'BTC', [('2018-01-18', 1.0), ('2018-01-19', 2.0)], AS_OF)
+        merged = store.merge(
+            'coins', 'BTC', [('2018-01-19', 3.0), ('2018-01-20', 4.0)], AS_OF)
+
+        assert list(merged['close']) == [1.0, 3.0]
+
+
+class TestCompare:
+    """validate performance()/compare()"""
+    def test_performance(self):
+        """returns, drawdowns and correlation in one pass"""
+        prices = np.array([[10.0, 20.0], [12.0, 18.0], [9.0, 19.0], [11.0, 22.0]])
+        normalized, returns, drawdowns, correlation = history.performance(prices)
+
+        assert normalized[0] == pytest.approx([1.0, 1.0])
+        assert returns == pytest.approx([0.1, 0.1])
+        assert drawdowns == pytest.approx([-0.25, -0.1])
+        assert correlation.shape == (2, 2)
+        assert correlation[0, 1] == pytest.approx(correlation[1, 0])
+
+    def test_compare(self, source, tmpdir):
+        """table in the order asked for, unknown tickers noted"""
+        tickers, days = commands.parse_compare_args(['amd', '$MU', '30d', 'zzzz'])
+        assert (tickers, days) == (['AMD', 'MU', 'ZZZZ'], 30)
+
+        lines = commands.compare(
+            tickers, days, as_of=AS_OF, store=history.HistoryStore(str(tmpdir))).splitlines()
+        assert lines[0] == '30 sessions 2017-12-06 to 2018-01-19'
+        assert [line.split()[0] for line in lines[2:4]] == ['AMD', 'MU']
+        assert lines[5].split() == ['CORR', 'AMD', 'MU']
+        assert lines[-1] == 'no history for ZZZZ'
@@ -0,0 +1,176 @@
+"""test_log_pipeline.py: validate behavior for log_pipeline"""
+from os import path
+import io
+import logging
+import sys
+import threading
+import time
+
+import pytest
+import prosper.common.prosper_logging as prosper_logging
+
+import prosper_bots.log_pipeline as log_pipeline
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+
+class SlowWebhookHandler(logging.Handler):
+    """stand-in for ProsperLogger's webhook handlers"""
+    webhook_url = 'https://example.com/webhook'
+
+    def __init__(self, delay=0.0):
+        super().__init__(logging.ERROR)
+        self.delay = delay
+        self.posts = []
+        self.gate = threading.Event()
+
+    def emit(self, record):
+        self.gate.wait(5)
+        time.sleep(self.delay)
+        self.posts.append(self.format(record))
+
+
+class RecordingDiscordHandler(prosper_logging.HackyDiscordHandler):
+    """ProsperLogger's discord handler, posting to a list instead of discord"""
+    def __init__(self):
+        webhook = prosper_logging.DiscordWebhook()
+        webhook.api_keys(1234, 'test-key')
+        super().__init__(webhook)
+        self.setLevel(logging.ERROR)
+        self.posts = []
+
+    def send_msg_to_webhook(self, message):
+        self.posts.append(message)
+
+
+class CountingStream(io.StringIO):
+    """StringIO that counts flushes"""
+    flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+def build_logger(name, *handlers):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in handlers:
+        logger.addHandler(handler)
+    return logger
+
+
+class TestQueueLogging:
+    """validate install_queue_logging behavior"""
+    def test_logging_never_waits_on_webhook(self):
+        """a stuck webhook doesn't block callers or file writes"""
+        stream = CountingStream()
+        webhook = SlowWebhookHandler()
+        logger = build_logger('test_log_pipeline_slow', logging.StreamHandler(stream), webhook)
+        fanout = log_pipeline.install_queue_logging(logger)
+        assert logger.handlers == [fanout]
+
+        start = time.perf_counter()
+        logger.error('STARTING PROSPERBOT -- %s', 'TEST')
+        for index in range(50):
+            logger.info('message %s', index)
+        assert time.perf_counter() - start < 0.5
+
+        try:
+            raise KeyError('MU')
+        except KeyError:
+            logger.error('boom', exc_info=True)
+
+        webhook.gate.set()
+        fanout.close()
+
+        lines = stream.getvalue().splitlines()
+        assert lines[0] == 'STARTING PROSPERBOT -- TEST'
+        assert 'message 49' in lines
+        assert stream.flushes < 50  # one flush per batch, not per record
+
+        assert len(webhook.posts) <= 2
+        joined = '\n'.join(webhook.posts)
+        assert 'STARTING PROSPERBOT -- TEST' in joined
+        assert "KeyError: 'MU'" in joined
+        assert 'message 1' not in joined  # INFO stays out of the webhook queue
+
+    def test_discord_handler_batched(self):
+        """HackyDiscordHandler (no ``webhook_url``) is batched like other webhooks"""
+        discord = RecordingDiscordHandler()
+        assert log_pipeline.is_webhook_handler(discord)
+        logger = build_logger('test_log_pipeline_discord', discord)
+        fanout = log_pipeline.install_queue_logging(logger)
+        listener = fanout.listeners[0]
+
+        records = [
+            logger.makeRecord(logger.name, logging.ERROR, __file__, 0, 'down %s', (index,), None)
+            for index in range(3)
+        ]
+        listener.handle_batch([fanout.prepare(record) for record in records])
+        fanout.close()
+
+        assert len(discord.posts) == 1
+        assert discord.posts[0].startswith('3 messages')
+        assert 'ERROR: down 2' in discord.posts[0]
+
+    def test_discord_burst_split(self):
+        """a burst past discord's limit goes out as several posts, nothing cut off"""
+        discord = RecordingDiscordHandler()
+        logger = build_logger('test_log_pipeline_burst', discord)
+        fanout = log_pipeline.install_queue_logging(logger)
+        listener = fanout.listeners[0]
+
+        records = [
+            logger.makeRecord(
+                logger.name, logging.ERROR, __file__, 0, 'down %s %s', (index, 'x' * 80), None)
+            for index in range(60)
+        ]
+        records.append(logger.makeRecord(
+            logger.name, logging.CRITICAL, __file__, 0, 'huge %s', ('y' * 5000,), None))
+        listener.handle_batch([fanout.prepare(record) for record in records])
+        fanout.close()
+
+        assert len(discord.posts) > 1
+        assert all(len(post) <= log_pipeline.WEBHOOK_MESSAGE_LIMIT for post in discord.posts)
+        joined = ''.join(discord.posts)
+        assert all('ERROR: down {} '.format(index) in joined for index in range(60))
+        assert joined.count('y') == 5000
+
+    def test_prepare_leaves_record_alone(self):
+        """other handlers still get the caller's args and exc_info"""
+        fanout = log_pipeline.QueueFanoutHandler([])
+        try:
+            raise KeyError('MU')
+        except KeyError:
+            record = logging.getLogger('test_log_pipeline_copy').makeRecord(
+                'test', logging.ERROR, __file__, 0, 'quote %s', ('MU',), sys.exc_info())
+
+        prepared = fanout.prepare(record)
+        assert prepared is not record
+        assert prepared.msg == 'quote MU' and prepared.args is None
+        assert "KeyError: 'MU'" in prepared.exc_text
+        assert record.msg == 'quote %s' and record.args == ('MU',)
+        assert record.exc_info is not None
+
+    def test_full_queue_drops(self):
+        """full queues drop instead of blocking"""
+        webhook = SlowWebhookHandler()
+        logger = build_logger('test_log_pipeline_full', webhook)
+        fanout = log_pipeline.install_queue_logging(logger, max_queue=2, batch_size=1)
+
+        for index in range(10):
+            logger.error('flood %s', index)
+        assert fanout.dropped >= 5
+
+        webhook.gate.set()
+        fanout.close()
+
+    def test_install_is_idempotent(self):
+        """installing twice keeps one fanout"""
+        logger = build_logger('test_log_pipeline_twice', logging.StreamHandler(io.StringIO()))
+        fanout = log_pipeline.install_queue_logging(logger)
+
+        assert log_pipeline.install_queue_logging(logger) is fanout
+        fanout.close()
@@ -0,0 +1,89 @@
+"""test_market_hours.py: validate behavior for market_hours"""
+from os import path
+from datetime import date, datetime
+
+import pytest
+import helpers
+
+import prosper_bots.market_hours as market_hours
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+def eastern(*args):
+    """epoch seconds for a US/Eastern wall-clock time"""
+    return market_hours.from_eastern(datetime(*args))
+
+class TestCalendar:
+    """validate trading calendar"""
+    def test_nyse_holidays_2018(self):
+        """published 2018 NYSE holidays"""
+        assert market_hours.nyse_holidays(2018) == {
+            date(2018, 1, 1), date(2018, 1, 15), date(2018, 2, 19), date(2018, 3, 30),
+            date(2018, 5, 28), date(2018, 7, 4), date(2018, 9, 3), date(2018, 11, 22),
+            date(2018, 12, 25),
+        }
+
+    def test_observed_holidays(self):
+        """weekend holidays move, Saturday new year doesn't"""
+        holidays = market_hours.nyse_holidays(2022)
+        assert date(2022, 6, 20) in holidays  # Juneteenth on a Sunday
+        assert date(2022, 12, 26) in holidays  # Christmas on a Sunday
+        assert date(2021, 12, 31) not in market_hours.nyse_holidays(2021)
+
+    def test_dst(self):
+        """eastern time follows daylight saving"""
+        assert market_hours.to_eastern(1531150200) == datetime(2018, 7, 9, 11, 30)  # EDT
+        assert market_hours.to_eastern(1515515400) == datetime(2018, 1, 9, 11, 30)  # EST
+
+
+class TestMarketState:
+    """validate session boundaries"""
+    @pytest.mark.parametrize('when,state', [
+        ((2018, 7, 9, 9, 29), 'extended'),
+        ((2018, 7, 9, 9, 30), 'regular'),
+        ((2018, 7, 9, 16, 0), 'extended'),
+        ((2018, 7, 9, 20, 0), 'closed'),
+        ((2018, 7, 9, 3, 59), 'closed'),
+        ((2018, 7, 3, 13, 30), 'extended'),  # early close
+        ((2018, 7, 4, 12, 0), 'closed'),  # holiday
+        ((2018, 7, 7, 12, 0), 'closed'),  # saturday
+    ])
+    def test_market_state(self, when, state):
+        """regular/extended/closed"""
+        assert market_hours.market_state(eastern(*when)) == state
+
+    def test_seconds_until_open(self):
+        """friday night waits for monday pre-market"""
+        friday_night = eastern(2018, 7, 6, 20, 0)
+        assert market_hours.seconds_until_open(friday_night) == 56 * 3600
+        assert market_hours.seconds_until_open(eastern(2018, 7, 9, 12, 0)) == 0
+
+    def test_session_start(self):
+        """sessions start at 4am eastern, DST or not"""
+        assert market_hours.session_start(eastern(2018, 7, 9, 15, 0)) == eastern(2018, 7, 9, 4, 0)
+        assert market_hours.session_start(eastern(2018, 1, 9, 3, 0)) == eastern(2018, 1, 9, 4, 0)
+
+
+class TestPolicies:
+    """validate TTL policies"""
+    def test_market_hours_policy(self):
+        """short in session, long but capped when closed"""
+        policy = market_hours.MarketHoursTTLPolicy(15, 60, 6 * 3600)
+
+        assert policy.ttl(eastern(2018, 7, 9, 12, 0)) == 15
+        assert policy.ttl(eastern(2018, 7, 9, 18, 0)) == 60
+        assert policy.ttl(eastern(2018, 7, 7, 12, 0)) == 6 * 3600
+        assert policy.ttl(eastern(2018, 7, 9, 3, 0)) == 3600  # until pre-market
+
+    def test_fixed_policy(self):
+        """coins ignore the calendar"""
+        policy = market_hours.FixedTTLPolicy(15)
+        assert policy.ttl(eastern(2018, 7, 7, 12, 0)) == policy.ttl(eastern(2018, 7, 9, 12, 0)) == 15
+
+    def test_configure(self):
+        """[CacheTTL] overrides defaults"""
+        market_hours.configure(helpers.CONFIG)
+
+        assert market_hours.STOCK_QUOTES.regular_ttl == 15
+        assert market_hours.COIN_QUOTES.ttl() == 15
@@ -0,0 +1,121 @@
+"""test_metrics.py: validate behavior for metrics"""
+from os import path
+import asyncio
+import urllib.request
+
+import pytest
+
+import prosper_bots.metrics as metrics
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+
+class TestLatencyHistogram:
+    """validate LatencyHistogram behavior"""
+    def test_percentiles(self):
+        """percentiles land within one bucket of the real value"""
+        histogram = metrics.LatencyHistogram()
+        for millis in range(1, 101):
+            histogram.observe(millis / 1000.0)
+
+        assert histogram.count == 100
+        assert histogram.mean == pytest.approx(0.0505)
+        assert 0.050 <= histogram.percentile(50) <= 0.050 * 1.2
+        assert 0.099 <= histogram.percentile(99) <= 0.100
+        assert histogram.percentile(100) == histogram.max == 0.1
+
+    def test_empty(self):
+        """no samples reports zero"""
+        assert metrics.LatencyHistogram().percentile(99) == 0.0
+
+
+class TestMetricsRegistry:
+    """validate MetricsRegistry behavior"""
+    def test_timer_feeds_registry(self):
+        """StageTimer records samples and escaping errors"""
+        registry = metrics.MetricsRegistry()
+        with registry.timer('stock.fetch') as fetch_timer:
+            pass
+        with pytest.raises(KeyError):
+            with registry.timer('stock.fetch'):
+                raise KeyError('MU')
+        registry.incr('stock.cache_hit')
+
+        stats = registry.snapshot()
+        assert stats['stock.fetch']['count'] == 2
+        assert stats['stock.fetch']['errors'] == 1
+        assert float(str(fetch_timer)) >= 0
+
+        report = registry.report()
+        assert report[0].split()[0] == 'stage'
+        assert report[1].split()[:3] == ['stock.fetch', '2', '1']
+        assert report[-1].split() == ['stock.cache_hit', '1']
+
+    def test_error_without_sample(self):
+        """errors counted outside a timer still show up"""
+        registry = metrics.MetricsRegistry()
+        registry.error('news.fetch')
+
+        assert registry.snapshot() == {'news.fetch': {'count': 0, 'errors': 1}}
+        assert registry.report()[1].split()[:3] == ['news.fetch', '0', '1']
+
+    def test_module_timer(self):
+        """metrics.timer() reports into REGISTRY"""
+        metrics.REGISTRY.reset()
+        with metrics.timer('quote.send'):
+            pass
+
+        assert metrics.REGISTRY.snapshot()['quote.send']['count'] == 1
+        assert 'quote.send' in metrics.stats_report()
+
+
+class TestPrometheus:
+    """validate the /metrics endpoint"""
+    def build_registry(self):
+        registry = metrics.MetricsRegistry()
+        for _ in range(4):
+            registry.observe('stock.fetch', 0.05)
+        registry.incr('stock.cache_hit', 3)
+        registry.set_gauge('slack_worker_queue_depth', lambda: 7)
+        return registry
+
+    def test_render_prometheus(self):
+        """summaries, counters, ratios and gauges all render"""
+        text = metrics.render_prometheus(self.build_registry())
+
+        assert 'prosperbot_stage_seconds_count{stage="stock.fetch"} 4' in text
+        assert 'prosperbot_stage_seconds{stage="stock.fetch",quantile="0.5"}' in text
+        assert 'prosperbot_stage_seconds{stage="stock.fetch",quantile="0.95"}' in text
+        assert 'quantile="0.50"' not in text
+        assert 'prosperbot_stage_errors_total{stage="stock.fetch"} 0' in text
+        assert 'prosperbot_events_total{event="stock.cache_hit"} 3' in text
+        assert 'prosperbot_cache_hit_ratio{command="stock"} 0.75' in text
+        assert 'prosperbot_slack_worker_queue_depth 7.0' in text
+
+    def test_serve_metrics(self):
+        """endpoint serves the registry over HTTP"""
+        server = metrics.serve_metrics(0, registry=self.build_registry())
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+            with urllib.request.urlopen(url) as req:
+                body = req.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert 'prosperbot_stage_seconds_count{stage="stock.fetch"} 4' in body
+
+    def test_watch_loop_lag(self):
+        """loop lag lands in a gauge"""
+        registry = metrics.MetricsRegistry()
+        loop = asyncio.new_event_loop()
+        try:
+            task = loop.create_task(metrics.watch_loop_lag(
+                interval=0.01, gauge_name='discord_loop_lag_seconds', loop=loop, registry=registry))
+            loop.run_until_complete(asyncio.sleep(0.05))
+            task.cancel()
+        finally:
+            loop.close()
+
+        assert registry.gauge_values()['discord_loop_lag_seconds'] >= 0
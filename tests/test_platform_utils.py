@@ -13,3 +13,13 @@ import prosper_bots.exceptions as exceptions
 HERE = path.abspath(path.dirname(__file__))
 ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
 CACHE_PATH = path.join(HERE, 'cache')
+
+def test_is_admin():
+    """validate admin list parsing: ids only, blank lets nobody in"""
+    assert not platform_utils.is_admin('U024BE7LH', '')
+    assert not platform_utils.is_admin('U024BE7LH', ' , ')
+    assert not platform_utils.is_admin('', '')
+    assert platform_utils.is_admin('U024BE7LH', 'U0G9QF9C6, U024BE7LH')
+    assert platform_utils.is_admin(81384788765712384, '81384788765712384')  # discord ids
+    assert not platform_utils.is_admin('U024BE7LH', 'U0G9QF9C6')
+    assert not platform_utils.is_admin('Lockefox', 'U0G9QF9C6')
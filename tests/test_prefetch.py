@@ -0,0 +1,210 @@
+"""test_prefetch.py: validate hot-ticker tracking and quote prefetching"""
+from os import path
+
+import pytest
+import helpers
+
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.exceptions as exceptions
+import prosper_bots.metrics as metrics
+import prosper_bots.prefetch as prefetch
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+class FakeClock:
+    """hand-cranked clock for decay/budget tests"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHotTickers:
+    """validate HotTickers behavior"""
+    def test_decay(self):
+        """scores halve every half_life"""
+        clock = FakeClock()
+        hot = prefetch.HotTickers(half_life=60, clock=clock)
+        for _ in range(4):
+            hot.hit('stocks', 'mu')
+
+        assert hot.score('stocks', 'MU') == pytest.approx(4.0)
+        clock.now += 60
+        assert hot.score('stocks', 'MU') == pytest.approx(2.0)
+        hot.hit('stocks', 'MU')
+        assert hot.score('stocks', 'MU') == pytest.approx(3.0)
+
+    def test_top(self):
+        """hottest first, cold tickers filtered"""
+        clock = FakeClock()
+        hot = prefetch.HotTickers(half_life=60, clock=clock)
+        for ticker, hits in (('MU', 5), ('INTC', 3), ('AMD', 1)):
+            for _ in range(hits):
+                hot.hit('stocks', ticker)
+        hot.hit('coins', 'BTC')
+
+        top = hot.top(2)
+        assert [(kind, ticker) for kind, ticker, _ in top] == [('stocks', 'MU'), ('stocks', 'INTC')]
+        assert [ticker for _, ticker, _ in hot.top(10, min_score=2)] == ['MU', 'INTC']
+
+        hot.forget('stocks', 'MU')
+        assert hot.top(1)[0][1] == 'INTC'
+
+    def test_capacity(self):
+        """coldest keys are dropped once tracking passes 2x capacity"""
+        clock = FakeClock()
+        hot = prefetch.HotTickers(half_life=60, capacity=3, clock=clock)
+        hot.hit('stocks', 'MU', weight=10)
+        for index in range(6):
+            clock.now += 1
+            hot.hit('stocks', 'T{}'.format(index))
+
+        assert len(hot) == 3
+        assert hot.score('stocks', 'MU') > 9
+
+
+def expiring(*tickers):
+    """cached quotes about to expire (inside the prefetch lead)"""
+    for ticker in tickers:
+        caching.QUOTES.set('STOCKS-{}'.format(ticker), {'ticker': ticker}, ttl=2)
+
+
+class TestPrefetcher:
+    """validate Prefetcher behavior"""
+    @pytest.fixture
+    def setup(self):
+        """fresh quote cache, counter and a fake refresher, market open"""
+        clock = FakeClock()
+        caching.QUOTES.clear()
+        caching.BAD_SYMBOLS.clear()
+        hot = prefetch.HotTickers(clock=clock)
+        calls = []
+
+        def refresh(ticker, logger=None):
+            calls.append(ticker)
+            caching.QUOTES.set('STOCKS-{}'.format(ticker), {'ticker': ticker}, ttl=15)
+
+        prefetcher = prefetch.Prefetcher(
+            {'stocks': [('QUOTES', 'STOCKS-{}', refresh)]},
+            hot=hot,
+            top_k=2,
+            min_score=2,
+            lead=3,
+            max_calls_per_minute=3,
+            market_state=lambda timestamp: 'regular',
+            clock=clock
+        )
+        yield prefetcher, hot, clock, calls
+        caching.QUOTES.clear()
+
+    def test_refresh_hot_only(self, setup):
+        """only top_k tickers above min_score get fetched"""
+        prefetcher, hot, clock, calls = setup
+        for ticker, hits in (('MU', 5), ('INTC', 3), ('AMD', 2), ('NVDA', 1)):
+            for _ in range(hits):
+                hot.hit('stocks', ticker)
+        expiring('MU', 'INTC', 'AMD', 'NVDA')
+
+        assert prefetcher.run_once() == 2
+        assert calls == ['MU', 'INTC']
+        assert caching.QUOTES.remaining('STOCKS-MU') > 10
+
+        assert prefetcher.run_once() == 0  # still fresh
+
+    def test_missing_left_to_requests(self, setup):
+        """entries already gone are fetched by the next request, not prefetched"""
+        prefetcher, hot, clock, calls = setup
+        hot.hit('stocks', 'MU', weight=5)
+
+        assert prefetcher.run_once() == 0
+        assert calls == []
+
+    def test_closed_market(self, setup):
+        """stocks aren't refreshed while the market is closed, coins are"""
+        prefetcher, hot, clock, calls = setup
+        prefetcher._market_state = lambda timestamp: 'closed'
+        prefetcher.jobs['coins'] = [('QUOTES', 'COINS-{}USD', lambda ticker, logger=None: None)]
+        hot.hit('stocks', 'MU', weight=5)
+        hot.hit('coins', 'BTC', weight=5)
+        expiring('MU')
+        caching.QUOTES.set('COINS-BTCUSD', {'ticker': 'BTC'}, ttl=2)
+
+        assert prefetcher.run_once() == 1
+        assert calls == []
+
+    def test_failure_backoff(self, setup):
+        """a failing refresh waits retry_backoff, doubling, before the next try"""
+        prefetcher, hot, clock, calls = setup
+        attempts = []
+
+        def refresh(ticker, logger=None):
+            attempts.append(clock.now)
+            raise ConnectionError('upstream down')
+
+        prefetcher.jobs = {'stocks': [('QUOTES', 'STOCKS-{}', refresh)]}
+        prefetcher.retry_backoff = 30
+        hot.hit('stocks', 'MU', weight=5)
+        expiring('MU')
+
+        prefetcher.run_once()
+        clock.now += 1
+        prefetcher.run_once()
+        assert len(attempts) == 1
+
+        clock.now += 30
+        prefetcher.run_once()
+        clock.now += 31
+        prefetcher.run_once()
+        assert len(attempts) == 2  # second failure waits 60s
+        assert 'stocks/MU' not in caching.BAD_SYMBOLS
+
+    def test_budget(self, setup):
+        """never more than max_calls_per_minute upstream calls"""
+        prefetcher, hot, clock, calls = setup
+        prefetcher.top_k = 10
+        for ticker in ('MU', 'INTC', 'AMD', 'AAPL'):
+            hot.hit('stocks', ticker, weight=5)
+        expiring('MU', 'INTC', 'AMD', 'AAPL')
+
+        assert prefetcher.run_once() == 3
+        assert len(calls) == 3
+        assert metrics.REGISTRY.counters['prefetch.throttled'] >= 1
+
+        clock.now += 61
+        assert prefetcher.run_once() == 1
+
+    def test_bad_symbol(self, setup):
+        """a ticker upstream rejects is negative-cached and forgotten"""
+        prefetcher, hot, clock, calls = setup
+
+        def refresh(ticker, logger=None):
+            raise exceptions.EmptyQuoteReturned(ticker)
+
+        prefetcher.jobs = {'stocks': [('QUOTES', 'STOCKS-{}', refresh)]}
+        hot.hit('stocks', 'BUTTS', weight=5)
+        expiring('BUTTS')
+
+        assert prefetcher.run_once() == 0
+        assert hot.score('stocks', 'BUTTS') == 0
+        assert 'stocks/BUTTS' in caching.BAD_SYMBOLS
+        caching.BAD_SYMBOLS.clear()
+
+def test_prefetch_jobs():
+    """commands.prefetch_jobs() fills the same keys the commands read"""
+    upstream.configure_source(helpers.CONFIG)
+    caching.QUOTES.clear()
+    try:
+        jobs = commands.prefetch_jobs()
+        cache_name, key_template, refresh_func = jobs['stocks'][0]
+        refresh_func('MU')
+
+        assert getattr(caching, cache_name).get(key_template.format('MU'))['name']
+        assert len(jobs['stocks']) == 1
+        assert len(commands.prefetch_jobs(news=True)['stocks']) == 2
+    finally:
+        upstream.use_source(None)
+        caching.QUOTES.clear()
@@ -0,0 +1,98 @@
+"""test_profiling.py: validate behavior for profiling"""
+from os import path
+import threading
+import time
+
+import pytest
+
+import prosper_bots.exceptions as exceptions
+import prosper_bots.profiling as profiling
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+@pytest.fixture(autouse=True)
+def no_cooldown(monkeypatch):
+    """every test starts with an idle profiler and no cooldown"""
+    monkeypatch.setattr(profiling, 'COOLDOWN', 0)
+    monkeypatch.setattr(profiling, '_LAST_START', [None])
+
+def busy_work(seconds):
+    """spin the CPU so samples land here"""
+    stop = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < stop:
+        total += 1
+    return total
+
+
+class TestSamplingProfiler:
+    """validate SamplingProfiler behavior"""
+    def test_collapsed_stacks(self):
+        """hot function shows up in root-first collapsed stacks"""
+        worker = threading.Thread(target=busy_work, args=(0.2,), name='busy')
+        with profiling.SamplingProfiler(interval=0.001) as profiler:
+            worker.start()
+            worker.join()
+
+        busy_lines = [line for line in profiler.collapsed() if line.startswith('busy;')]
+        assert busy_lines
+        stack, count = busy_lines[0].rsplit(' ', 1)
+        assert stack.split(';')[-1].startswith('test_profiling:busy_work:')
+        assert int(count) > 0
+        assert profiler.samples > 0
+
+    def test_profile_call(self, tmpdir):
+        """single call is profiled on the calling thread only"""
+        result, profile_file, elapsed = profiling.profile_call(
+            'stock-$MU', busy_work, 0.1, output_path=str(tmpdir))
+
+        assert result > 0
+        assert elapsed >= 0.1
+        assert path.basename(profile_file).startswith('profile-stock-_MU-')
+        with open(profile_file) as profile_fh:
+            stacks = profile_fh.read()
+        assert 'test_profiling:busy_work' in stacks
+        assert 'profiler' not in stacks
+
+    def test_profile_process_one_at_a_time(self, tmpdir):
+        """overlapping process profiles are refused"""
+        done = []
+        thread = profiling.profile_process_async(
+            0.2, callback=lambda profile_file, error: done.append((profile_file, error)),
+            output_path=str(tmpdir)
+        )
+        time.sleep(0.05)
+        with pytest.raises(RuntimeError):
+            profiling.profile_process(0.1, output_path=str(tmpdir))
+
+        thread.join()
+        assert done and done[0][1] is None
+        assert path.isfile(done[0][0])
+
+    def test_profile_call_cooldown(self, tmpdir, monkeypatch):
+        """a second profile inside the cooldown is refused"""
+        monkeypatch.setattr(profiling, 'COOLDOWN', 60)
+        profiling.profile_call('first', busy_work, 0.01, output_path=str(tmpdir))
+
+        with pytest.raises(exceptions.ProfilerBusy):
+            profiling.profile_call('second', busy_work, 0.01, output_path=str(tmpdir))
+        with pytest.raises(exceptions.ProfilerBusy):
+            profiling.profile_process(0.01, output_path=str(tmpdir))
+        assert len(tmpdir.listdir()) == 1
+
+    def test_profile_files_capped(self, tmpdir, monkeypatch):
+        """only the newest MAX_FILES profiles are kept"""
+        monkeypatch.setattr(profiling, 'MAX_FILES', 2)
+        for index in range(4):
+            stale = tmpdir.join('profile-old{}-1-20180119T000000.folded'.format(index))
+            stale.write('stack 1\n')
+            stale.setmtime(1516320000 + index)
+        tmpdir.join('notes.txt').write('keep me')
+
+        _, profile_file, _ = profiling.profile_call(
+            'stock-MU', busy_work, 0.01, output_path=str(tmpdir))
+
+        names = sorted(item.basename for item in tmpdir.listdir())
+        assert names == [
+            'notes.txt', 'profile-old3-1-20180119T000000.folded', path.basename(profile_file)]
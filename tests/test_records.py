@@ -0,0 +1,65 @@
+"""test_records.py: validate compact quote/article records"""
+from os import path
+import pickle
+
+import pandas as pd
+import pytest
+import helpers
+
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.records as records
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+class TestRecord:
+    """validate Record behavior"""
+    frame = pd.DataFrame([
+        {'symbol': 'BTC', 'name': 'Bitcoin', 'last': 11594.25, 'more_info': 'dropped'},
+        {'symbol': 'ETH', 'name': 'Ethereum', 'last': 1040.12, 'more_info': 'dropped'},
+    ])
+
+    def test_from_frame(self):
+        """kept fields only, plain Python values, missing ones None"""
+        btc, eth = records.CoinQuote.from_frame(self.frame)
+
+        assert btc['last'] == 11594.25 and type(btc['last']) is float
+        assert eth.symbol == 'ETH'
+        assert btc['volume'] is None
+        assert not hasattr(btc, '__dict__')
+        with pytest.raises(KeyError):
+            btc['more_info']
+
+    def test_mapping(self):
+        """reads like the dict it replaces"""
+        btc = records.CoinQuote.from_frame(self.frame)[0]
+
+        assert 'last' in btc and 'volume' not in btc
+        assert btc.get('volume', 0.0) == 0.0
+        assert dict(btc)['name'] == 'Bitcoin'
+        converted = btc.copy()
+        converted['last'] = 1.0
+        assert btc['last'] == 11594.25
+
+    def test_pickle(self):
+        """survives shared caches and snapshots"""
+        btc = records.CoinQuote.from_frame(self.frame)[0]
+        assert pickle.loads(pickle.dumps(btc)) == btc
+        assert btc != records.CoinQuote(symbol='BTC')
+
+
+class TestQuoteBoundary:
+    """validate quotes leave upstream as records"""
+    def test_fetch_stock_quote(self):
+        """cached quote is the record"""
+        upstream.configure_source(helpers.CONFIG)
+        try:
+            quote = commands.fetch_stock_quote('mu')
+        finally:
+            upstream.use_source(None)
+
+        assert isinstance(quote, records.StockQuote)
+        assert quote['current_price'] == 43.77
+        assert caching.QUOTES.get('STOCKS-MU') is quote
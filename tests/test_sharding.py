@@ -0,0 +1,40 @@
+"""test_sharding.py: validate behavior for sharding"""
+from os import path
+import time
+
+import pytest
+
+import prosper_bots.sharding as sharding
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+
+class TestAssignShards:
+    """validate assign_shards behavior"""
+    def test_assign_shards_round_robin(self):
+        """every shard lands on exactly one worker"""
+        assignments = sharding.assign_shards(5, 2)
+
+        assert assignments == [[0, 2, 4], [1, 3]]
+
+    def test_assign_shards_too_many_workers(self):
+        """can't have idle workers"""
+        with pytest.raises(ValueError):
+            sharding.assign_shards(2, 3)
+
+
+class TestHealth:
+    """validate report_health/summarize_health behavior"""
+    def test_health_roundtrip(self):
+        """reports show up in summary"""
+        board = {}
+        sharding.report_health(board, 0, shards='0,2', guilds=12)
+        sharding.report_health(board, 1, shards='1', guilds=3)
+        board[1]['last_beat'] = time.time() - 600
+
+        lines = sharding.summarize_health(board, stale_after=60)
+
+        assert len(lines) == 2
+        assert 'OK' in lines[0] and 'guilds=12' in lines[0]
+        assert 'STALE' in lines[1]
@@ -0,0 +1,176 @@
+"""test_slack_events.py: validate behavior for slack_events"""
+from os import path
+import asyncio
+import hashlib
+import hmac
+import json
+import re
+import time
+
+import pytest
+
+import prosper_bots.exceptions as exceptions
+import prosper_bots.platform_utils as platform_utils
+import prosper_bots.slack_events as slack_events
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+with open(path.join(HERE, 'slack_events.json')) as events_fh:
+    RECORDED_EVENTS = json.load(events_fh)
+
+
+class FakeDirectory:
+    """offline SlackWebDirectory: canned lookups, replies collected in a list"""
+    bot_id = 'U0PROSPERBOT'
+    login_data = {
+        'team': {'id': 'T0PROSPER', 'name': 'prosper'},
+        'self': {'id': 'U0PROSPERBOT', 'name': 'prosperbot'},
+    }
+    channels = {'C0STOCKS': {'name': 'stocks'}}
+    users = {'U0TRADER': {'name': 'trader'}}
+
+    def __init__(self):
+        self.sent = []
+
+    def post_message(self, channel, text):
+        self.sent.append((channel, text))
+
+
+def build_receiver(signing_secret=''):
+    """receiver wired to plain test handlers"""
+    directory = FakeDirectory()
+    seen = []
+
+    def stock_handler(message, ticker):
+        info = platform_utils.parse_slack_message_object(message)
+        seen.append(('stock', ticker, info['channel_name'], info['team_id']))
+        message.send('`{}`'.format(ticker))
+
+    def version_handler(message):
+        seen.append(('version',))
+        message.send('version')
+
+    plugins = {
+        'listen_to': {re.compile(r'\$(.*)\s?'): stock_handler},
+        'respond_to': {re.compile('version', re.IGNORECASE): version_handler},
+    }
+    receiver = slack_events.EventsReceiver(
+        plugins, {'T0PROSPER': directory},
+        signing_secret=signing_secret, insecure=not signing_secret
+    )
+    return receiver, directory, seen
+
+async def post_event(port, payload, headers=None):
+    """local stand-in for Slack: POST one recorded event"""
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    extra = ''.join('{}: {}\r\n'.format(key, value) for key, value in (headers or {}).items())
+    writer.write(
+        'POST /slack/events HTTP/1.1\r\nHost: localhost\r\n'
+        'Content-Type: application/json\r\nContent-Length: {}\r\n{}\r\n'.format(
+            len(body), extra).encode() + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, response_body = raw.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(response_body.decode())
+
+def replay(receiver, events, headers_func=None):
+    """serve ``receiver`` on a free port and post ``events`` at it"""
+    loop = asyncio.new_event_loop()
+    try:
+        server = loop.run_until_complete(slack_events.serve(receiver, port=0))
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        for event in events:
+            headers = headers_func(event) if headers_func else None
+            responses.append(loop.run_until_complete(post_event(port, event, headers)))
+        while receiver.pending:
+            loop.run_until_complete(asyncio.sleep(0.01))
+        server.close()
+    finally:
+        loop.close()
+    return responses
+
+
+class TestEventsReceiver:
+    """validate EventsReceiver against recorded payloads"""
+    def test_url_verification(self):
+        """challenge is echoed back"""
+        receiver, _, _ = build_receiver()
+        [(status, response)] = replay(receiver, RECORDED_EVENTS[:1])
+
+        assert status == 200
+        assert response['challenge'] == RECORDED_EVENTS[0]['challenge']
+
+    def test_recorded_events(self):
+        """events are acked and routed to the right handlers"""
+        receiver, directory, seen = build_receiver()
+        responses = replay(receiver, RECORDED_EVENTS[1:])
+
+        assert [status for status, _ in responses] == [200, 200, 200]
+        assert ('stock', 'MU', 'stocks', 'T0PROSPER') in seen
+        assert ('version',) in seen
+        assert len(seen) == 2  # bot_message ignored
+        assert ('C0STOCKS', '`MU`') in directory.sent
+
+    def test_retries_dropped(self):
+        """slack retries of one event_id only run once"""
+        receiver, _, seen = build_receiver()
+        replay(receiver, [RECORDED_EVENTS[1], RECORDED_EVENTS[1]])
+
+        assert len(seen) == 1
+
+    def test_signature_required(self):
+        """unsigned requests are refused when a secret is configured"""
+        secret = 'shhh'
+        receiver, _, seen = build_receiver(signing_secret=secret)
+
+        def sign(event):
+            timestamp = str(int(time.time()))
+            base = b'v0:' + timestamp.encode() + b':' + json.dumps(event).encode()
+            return {
+                'X-Slack-Request-Timestamp': timestamp,
+                'X-Slack-Signature': 'v0=' + hmac.new(
+                    secret.encode(), base, hashlib.sha256).hexdigest()
+            }
+
+        [(unsigned_status, _)] = replay(receiver, RECORDED_EVENTS[1:2])
+        [(signed_status, _)] = replay(receiver, RECORDED_EVENTS[2:3], headers_func=sign)
+
+        assert unsigned_status == 401
+        assert signed_status == 200
+        assert seen == [('version',)]
+
+    def test_secret_or_insecure(self):
+        """no signing secret means no receiver, unless asked for explicitly"""
+        with pytest.raises(exceptions.InsecureEndpoint):
+            slack_events.EventsReceiver({}, {})
+        assert slack_events.EventsReceiver({}, {}, insecure=True).signing_secret == ''
+
+    def test_body_capped(self):
+        """oversized bodies are refused before they're read"""
+        receiver, _, seen = build_receiver()
+
+        async def claim(port, length):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(
+                'POST /slack/events HTTP/1.1\r\nContent-Length: {}\r\n\r\n{{}}'.format(
+                    length).encode())
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+            return int(raw.split()[1])
+
+        loop = asyncio.new_event_loop()
+        try:
+            server = loop.run_until_complete(slack_events.serve(receiver, port=0))
+            port = server.sockets[0].getsockname()[1]
+            assert loop.run_until_complete(claim(port, slack_events.MAX_BODY_BYTES + 1)) == 413
+            assert loop.run_until_complete(claim(port, 2)) == 200
+            server.close()
+        finally:
+            loop.close()
+        assert seen == []
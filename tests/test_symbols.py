@@ -0,0 +1,118 @@
+"""test_symbols.py: validate behavior for symbols"""
+from os import path
+import json
+
+import pytest
+import helpers
+
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.exceptions as exceptions
+import prosper_bots.symbols as symbols
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+RECORDING_PATH = path.join(HERE, 'recording.json')
+
+@pytest.fixture
+def symbol_index(tmpdir):
+    """symbol index built from the recording"""
+    upstream.use_source(upstream.RecordedSource(RECORDING_PATH))
+    caching.BAD_SYMBOLS.clear()
+    index_path = str(tmpdir.join('symbols.json'))
+    symbols.refresh(index_path)
+    yield index_path
+    symbols.INDEXES.clear()
+    caching.BAD_SYMBOLS.clear()
+    upstream.configure_source(helpers.CONFIG)
+
+
+class TestSymbolIndex:
+    """validate SymbolIndex behavior"""
+    index = symbols.SymbolIndex(['mu', 'MU', 'AAPL', 'AMD', 'AMZN', 'INTC'])
+
+    def test_lookup(self):
+        """bisect membership and prefix scan"""
+        assert self.index.symbols == ['AAPL', 'AMD', 'AMZN', 'INTC', 'MU']
+        assert 'MU' in self.index
+        assert 'MUU' not in self.index
+        assert self.index.startswith('AM') == ['AMD', 'AMZN']
+
+    def test_suggest(self):
+        """typos get close matches"""
+        assert self.index.suggest('APPL')[0] == 'AAPL'
+        assert self.index.suggest('ZZZZZZ') == []
+
+
+class TestCheckTicker:
+    """validate check_ticker gates"""
+    @pytest.mark.parametrize('token', ['5 LUNCH', '$$', '', '5'])
+    def test_shape(self, token):
+        """junk never looks like a ticker"""
+        assert not symbols.looks_like_ticker(token)
+        assert symbols.check_ticker(token) == (False, 'shape')
+
+    def test_index(self, symbol_index):
+        """unknown tickers are dropped once an index is loaded"""
+        assert symbols.check_ticker('MU') == (True, '')
+        assert symbols.check_ticker('BUTTS') == (False, 'unknown')
+        assert symbols.check_ticker('LTC', 'coins') == (True, '')
+
+        symbols.INDEXES.clear()
+        assert symbols.check_ticker('BUTTS') == (True, '')
+        symbols.load(symbol_index)
+        assert symbols.check_ticker('BUTTS') == (False, 'unknown')
+
+        with open(symbol_index) as index_fh:
+            assert json.load(index_fh)['coins'] == ['BTC', 'ETH', 'LTC']
+
+    def test_negative_cache(self, symbol_index):
+        """symbols upstream rejected are skipped"""
+        source = upstream.SOURCE
+        assert commands.generic_stock_info('NVDA', None, cooldown_time=0) == ''
+        assert commands.generic_stock_info('NVDA', None, cooldown_time=0) == ''
+
+        assert source.calls['get_quote_rh'] == 1
+        assert symbols.check_ticker('NVDA') == (False, 'known_bad')
+
+    def test_format_error_not_cached(self, symbol_index):
+        """a bad info_mask isn't a bad ticker"""
+        assert commands.generic_stock_info(
+            'MU', None, cooldown_time=0, info_mask=['name', 'last_trade_price']) == ''
+        assert symbols.check_ticker('MU') == (True, '')
+
+    def test_bad_symbol_errors(self):
+        """only explicit "no such symbol" answers are negative-cached"""
+        import prosper.datareader.exceptions as pdr_exceptions
+
+        class Response(object):
+            status_code = 404
+
+        not_found = Exception('404 Client Error')
+        not_found.response = Response()
+        assert symbols.is_bad_symbol_error(not_found)
+        assert symbols.is_bad_symbol_error(pdr_exceptions.SymbolNotSupported())
+        assert symbols.is_bad_symbol_error(exceptions.RecordingNotFound('MU'))
+        assert symbols.is_bad_symbol_error(exceptions.EmptyQuoteReturned('MU'))
+
+        Response.status_code = 503
+        assert not symbols.is_bad_symbol_error(not_found)
+        assert not symbols.is_bad_symbol_error(KeyError('last_trade_price'))
+        assert not symbols.is_bad_symbol_error(IndexError('list index out of range'))
+
+    def test_ticker_suggestion(self, symbol_index):
+        """did-you-mean only for unknown tickers"""
+        assert commands.ticker_suggestion('APPL') == 'unknown ticker APPL -- did you mean AAPL?'
+        assert commands.ticker_suggestion('MU') == ''
+
+
+def test_parse_symbol_directory():
+    """nasdaqtrader.com layout"""
+    text = '\n'.join([
+        'Nasdaq Traded|Symbol|Security Name|Test Issue',
+        'Y|AAPL|Apple Inc. - Common Stock|N',
+        'Y|ZVZZT|NASDAQ TEST STOCK|Y',
+        'File Creation Time: 0719201822:00||',
+    ])
+    assert upstream.parse_symbol_directory(text) == ['AAPL']
@@ -0,0 +1,103 @@
+"""test_tickstore.py: validate per-ticker mmap tick rings"""
+from os import path
+
+import numpy as np
+import pytest
+import helpers
+
+import prosper_bots.caching as caching
+import prosper_bots.commands as commands
+import prosper_bots.tickstore as tickstore
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+
+
+class TestTickRing:
+    """validate TickRing behavior"""
+    def test_wraps_oldest_first(self, tmpdir):
+        """a full ring drops the oldest ticks and reads back in order"""
+        ring = tickstore.TickRing(str(tmpdir.join('MU.ticks')), capacity=4)
+        for step in range(6):
+            ring.append(1000.0 + step, 40.0 + step, 100.0 * step)
+
+        assert ring.written == 6
+        assert len(ring) == 4
+        older, newer = ring.views()
+        assert list(older['timestamp']) == [1002.0, 1003.0]
+        assert list(newer['timestamp']) == [1004.0, 1005.0]
+        assert list(ring.history()['price']) == [42.0, 43.0, 44.0, 45.0]
+        assert list(ring.history(since=1004.0)['volume']) == [400.0, 500.0]
+        del older, newer
+        ring.close()
+
+    def test_views_are_zero_copy(self, tmpdir):
+        """views alias the mapping: later appends show up without re-reading"""
+        ring_path = str(tmpdir.join('MU.ticks'))
+        ring = tickstore.TickRing(ring_path, capacity=4)
+        ring.append(1000.0, 40.0)
+        _, newer = ring.views()
+        assert newer.base is not None
+        assert np.isnan(newer['volume'][0])
+
+        reader = tickstore.TickRing(ring_path, writable=False)
+        ring.append(1001.0, 41.0)
+        assert list(reader.history()['price']) == [40.0, 41.0]
+        del newer
+        reader.close()
+        ring.close()
+
+    def test_reopen(self, tmpdir):
+        """existing files keep their ticks and capacity"""
+        ring_path = str(tmpdir.join('MU.ticks'))
+        ring = tickstore.TickRing(ring_path, capacity=4)
+        ring.append(1000.0, 40.0)
+        ring.close()
+
+        ring = tickstore.TickRing(ring_path, capacity=100)
+        assert ring.capacity == 4
+        assert list(ring.history()['price']) == [40.0]
+        ring.close()
+
+    def test_not_a_ring(self, tmpdir):
+        """random files are refused"""
+        junk = tmpdir.join('junk.ticks')
+        junk.write_binary(b'\0' * 64)
+        with pytest.raises(ValueError):
+            tickstore.TickRing(str(junk))
+
+
+class TestTickStore:
+    """validate TickStore and record() behavior"""
+    def test_store(self, tmpdir):
+        """rings are per kind/ticker and closed past max_open"""
+        store = tickstore.TickStore(str(tmpdir), capacity=8, max_open=1)
+        store.append('stocks', 'mu', 43.77, timestamp=1000.0)
+        store.append('coins', 'MU', 1.0, timestamp=1000.0)
+        store.append('stocks', 'MU', 43.80, timestamp=1001.0)
+
+        assert list(store.history('stocks', 'MU')['price']) == [43.77, 43.80]
+        assert len(store.history('stocks', 'INTC')) == 0
+        assert tmpdir.join('coins', 'MU.ticks').check()
+        store.close()
+
+    def test_record_disabled(self):
+        """record() is a no-op until configured"""
+        tickstore.STORE = None
+        tickstore.record('stocks', 'MU', 43.77)
+
+    def test_fetch_records(self, tmpdir):
+        """fetched quotes land in the store"""
+        upstream.configure_source(helpers.CONFIG)
+        caching.QUOTES.clear()
+        tickstore.STORE = tickstore.TickStore(str(tmpdir), capacity=8)
+        try:
+            commands.fetch_stock_quote('MU')
+            commands.fetch_coin_quote('BTC')
+            assert list(tickstore.STORE.history('stocks', 'MU')['price']) == [43.77]
+            assert list(tickstore.STORE.history('coins', 'BTC')['price']) == [11594.25]
+        finally:
+            tickstore.STORE.close()
+            tickstore.STORE = None
+            upstream.use_source(None)
+            caching.QUOTES.clear()
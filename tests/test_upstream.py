@@ -0,0 +1,129 @@
+"""test_upstream.py: validate behavior for upstream"""
+from os import path
+import threading
+import time
+
+import pytest
+import helpers
+
+import prosper_bots.exceptions as exceptions
+import prosper_bots.upstream as upstream
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+RECORDING_PATH = path.join(HERE, 'recording.json')
+
+
+class TestCoalesce:
+    """validate _coalesce() behavior"""
+    def test_coalesce_single_flight(self):
+        """concurrent callers for one key share one fetch"""
+        calls = []
+        def slow_fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'quote'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                upstream._coalesce(('get_quote_rh', ('MU',)), slow_fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ['quote'] * 5
+
+    def test_coalesce_error(self):
+        """errors reach the caller and don't stick around"""
+        def bad_fetch():
+            raise KeyError('BUTTS')
+
+        with pytest.raises(KeyError):
+            upstream._coalesce(('get_quote_rh', ('BUTTS',)), bad_fetch)
+
+        assert upstream._coalesce(('get_quote_rh', ('BUTTS',)), lambda: 'ok') == 'ok'
+
+
+class TestRecordedSource:
+    """validate RecordedSource behavior"""
+    def test_recorded_quotes(self):
+        """recorded payloads come back datareader-shaped"""
+        source = upstream.RecordedSource(RECORDING_PATH)
+
+        stock_df = source.get_quote_rh(['MU'])
+        assert stock_df.loc[0, 'name'] == 'Micron Technology, Inc. Common Stock'
+
+        coin_df = source.get_quote_cc(['BTC'], currency='USD', to_yahoo=True)
+        assert coin_df.loc['BTC', 'name'] == 'Bitcoin'
+        assert coin_df.loc['BTC', 'change_pct'] == '+2.10%'
+
+        news_df = source.company_news_rh('MU')
+        assert len(news_df) == 3
+        assert source.calls['company_news_rh'] == 1
+
+    def test_recorded_quote_keys(self):
+        """stocks only carry ``keys`` columns, datareader's summary by default"""
+        source = upstream.RecordedSource(RECORDING_PATH)
+
+        assert list(source.get_quote_rh(['MU']).columns) == upstream.SUMMARY_KEYS
+        assert 'previous_close' in source.get_quote_rh(['MU'], keys=upstream.QUOTE_KEYS)
+        with pytest.raises(KeyError):
+            source.get_quote_rh(['MU'], keys=['symbol', 'dividend_yield'])
+
+    def test_recording_matches_datareader(self):
+        """recorded stock rows are what upstream asks datareader for, nothing more"""
+        source = upstream.RecordedSource(RECORDING_PATH)
+
+        for ticker, row in source.recording['get_quote_rh'].items():
+            assert list(row) == upstream.QUOTE_KEYS, ticker
+            change = (row['current_price'] - row['previous_close']) / row['previous_close']
+            assert row['change_pct'] == '{:+.2%}'.format(change), ticker
+
+    def test_recorded_coin_columns(self):
+        """coins only get yahoo-style columns when asked, like datareader"""
+        source = upstream.RecordedSource(RECORDING_PATH)
+
+        raw_df = source.get_quote_cc(['BTC', 'ETH'], currency='USD')
+        assert list(raw_df.index) == [0, 1]
+        assert raw_df.loc[0, 'PRICE'] == 11594.25
+        assert raw_df.loc[1, 'CHANGEPCT24HOUR'] == -1.25
+        assert 'VOLUME24HOUR' in raw_df.columns
+        assert 'last' not in raw_df.columns
+
+        yahoo_df = source.get_quote_cc(['BTC', 'ETH'], currency='USD', to_yahoo=True)
+        assert list(yahoo_df.index) == ['BTC', 'ETH']
+        assert yahoo_df.loc['ETH', 'last'] == 1040.12
+        assert 'VOLUME24HOUR' not in yahoo_df.columns
+
+    def test_recorded_missing(self):
+        """unrecorded requests look like a missing feed"""
+        source = upstream.RecordedSource(RECORDING_PATH)
+
+        with pytest.raises(exceptions.RecordingNotFound):
+            source.get_quote_rh(['BUTTS'])
+        with pytest.raises(KeyError):
+            source.company_news_rh('BUTTS')
+
+    def test_recorded_injection(self):
+        """latency and errors are injected on request"""
+        source = upstream.RecordedSource(RECORDING_PATH, latency=0.05, error_rate=1.0, seed=1)
+
+        start = time.time()
+        with pytest.raises(exceptions.InjectedUpstreamError):
+            source.get_quote_rh(['MU'])
+        assert time.time() - start >= 0.05
+
+    def test_configure_source(self):
+        """config picks the recorded source"""
+        try:
+            source = upstream.configure_source(helpers.CONFIG)
+
+            assert isinstance(source, upstream.RecordedSource)
+            assert upstream.get_quote_rh('MU').loc[0, 'symbol'] == 'MU'
+        finally:
+            upstream.use_source(None)
@@ -0,0 +1,32 @@
+"""test_utils.py: validate behavior for utils"""
+from os import path
+import time
+
+import pytest
+
+import prosper_bots.utils as utils
+
+HERE = path.abspath(path.dirname(__file__))
+ROOT = path.abspath(path.join(path.dirname(HERE), 'prosper_bots'))
+
+
+class TestStartupReport:
+    """validate StartupReport behavior"""
+    def test_startup_report_phases(self):
+        """phases are back-to-back and add up to total"""
+        report = utils.StartupReport()
+        time.sleep(0.01)
+        report.mark('import')
+        report.mark('config')
+
+        assert list(report.phases.keys()) == ['import', 'config']
+        assert report.phases['import'] >= 0.01
+        assert report.total == pytest.approx(sum(report.phases.values()))
+
+    def test_startup_report_str(self):
+        """report renders every phase"""
+        report = utils.StartupReport(begin=time.perf_counter() - 1.0)
+        report.mark('import')
+
+        assert str(report).startswith('import=1.')
+        assert 'total=' in str(report)